@@ -4,47 +4,63 @@ Heckx AI - Enhanced Railway Version with Music Discovery
 """
 import os
 import json
+import base64
 import random
-import sqlite3
-from datetime import datetime
+import heapq
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
 from flask import Flask, jsonify, request, send_file
 from flask_cors import CORS
 import requests
 from pathlib import Path
 from typing import List, Dict, Optional
 
+import db
+import download_manager
+import health
+import migrations
+import music_ingest
+import music_search
+import page_assets
+import playlists
+import quote_index
+import quote_rotation
+import quote_search
+import quote_store
+import quote_weights
+import retention
+import search_cache
+import track_tags
+import user_stats
+import write_behind
+
 app = Flask(__name__)
 CORS(app)
 
+APP_START_TIME = time.time()
+
+@app.teardown_appcontext
+def release_db_connections(exc):
+    """Hand this request's SQLite connections back to the pool"""
+    db.release()
+
 # Embedded Music Discovery Service
 class SimpleMusicService:
     def __init__(self):
         self.pixabay_api_key = '46734-67b3b2251fecba4ff4d66ee95'  # Demo key
+        self.search_cache = search_cache.create_cache_from_env()  # shared by all workers, see search_cache.py
         self.init_music_db()
         
     def init_music_db(self):
-        """Initialize music database with demo data"""
-        conn = sqlite3.connect('music_library.db')
+        """Migrate the persistent music library, seeding demo data when it is new"""
+        migrations.migrate_music(seed=self._seed_demo_tracks)
+    
+    def _seed_demo_tracks(self, conn):
+        """Seed demo tracks into an empty library inside the caller's transaction"""
         cursor = conn.cursor()
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS music_tracks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source TEXT,
-                external_id TEXT,
-                title TEXT,
-                artist TEXT,
-                tags TEXT,
-                download_url TEXT,
-                preview_url TEXT,
-                duration INTEGER,
-                downloads INTEGER,
-                likes INTEGER,
-                genre TEXT,
-                mood TEXT
-            )
-        ''')
-        
         # Add demo tracks with working audio URLs
         cursor.execute('SELECT COUNT(*) FROM music_tracks')
         if cursor.fetchone()[0] == 0:
@@ -70,57 +86,54 @@ class SimpleMusicService:
                  240, 6800, 340, 'classical', 'peaceful')
             ]
             
-            cursor.executemany('''
-                INSERT INTO music_tracks 
-                (source, external_id, title, artist, tags, download_url, preview_url, 
-                 duration, downloads, likes, genre, mood)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', demo_music)
+            columns = ('source', 'external_id', 'title', 'artist', 'tags', 'download_url', 'preview_url',
+                       'duration', 'downloads', 'likes', 'genre', 'mood')
+            # Through the ingest path (joining this transaction) so quality scores and tags are derived
+            music_ingest.ingest_tracks(dict(zip(columns, row)) for row in demo_music)
             
             print("✅ Added demo music tracks to database")
-        
-        conn.commit()
-        conn.close()
     
     def search_music(self, query: str) -> List[Dict]:
         """Search music from database and Pixabay API"""
-        # First search local database
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM music_tracks 
-            WHERE (title LIKE ? OR artist LIKE ? OR tags LIKE ?)
-            ORDER BY downloads DESC
-        ''', [f'%{query}%', f'%{query}%', f'%{query}%'])
+        # First search local database (full-text index, ranked with popularity; see music_search.py)
+        matches = music_search.search_tracks(db.get_connection(db.MUSIC_DB), query, limit=10)
         
         tracks = []
-        for row in cursor.fetchall():
+        for track in matches:
             tracks.append({
-                'id': row[0],
-                'title': row[3],
-                'artist': row[4],
-                'tags': row[5],
-                'preview_url': row[7],
-                'download_url': row[6],
-                'duration': row[8],
-                'downloads': row[9],
-                'likes': row[10],
-                'genre': row[11],
-                'mood': row[12]
+                'id': track['id'],
+                'source': track['source'],
+                'external_id': track['external_id'],
+                'title': track['title'],
+                'artist': track['artist'],
+                'tags': track['tags'],
+                'preview_url': track['preview_url'],
+                'download_url': track['download_url'],
+                'duration': track['duration'],
+                'downloads': track['downloads'],
+                'likes': track['likes'],
+                'genre': track['genre'],
+                'mood': track['mood']
             })
         
         # Always try Pixabay API for fresh content
         if query:
             try:
-                pixabay_tracks = self.search_pixabay(query)
+                if self.search_cache is not None:
+                    pixabay_tracks = self.search_cache.get(search_cache.cache_key('pixabay_demo', query),
+                                                           lambda: self.search_pixabay(query))
+                else:
+                    pixabay_tracks = self.search_pixabay(query)
                 tracks.extend(pixabay_tracks)
             except Exception as e:
                 print(f"Pixabay search error: {e}")
         
-        conn.close()
         return tracks[:10]  # Limit results
     
+    def top_tracks(self, genre: str = None, mood: str = None, tag: str = None, limit: int = 20) -> List[Dict]:
+        """Best-quality library tracks by genre, mood and/or tag, straight from the indexes (see track_tags.py)"""
+        return track_tags.top_tracks(db.get_connection(db.MUSIC_DB), genre, mood, tag, limit)
+    
     def search_pixabay(self, query: str) -> List[Dict]:
         """Search for real music tracks"""
         try:
@@ -159,6 +172,8 @@ class SimpleMusicService:
             for i, (title, artist, url, duration) in enumerate(selected_tracks):
                 track = {
                     'id': f'api_{query}_{i}',
+                    'source': 'demo_api',
+                    'external_id': f'{artist}/{title}',  # the same template under another keyword is the same track
                     'title': title,
                     'artist': artist,
                     'tags': f'{query}, instrumental, music',
@@ -167,8 +182,8 @@ class SimpleMusicService:
                     'duration': duration,
                     'downloads': random.randint(2000, 15000),
                     'likes': random.randint(100, 800),
-                    'genre': self._extract_genre(query),
-                    'mood': self._extract_mood(query)
+                    'genre': track_tags.extract_genre(query),
+                    'mood': track_tags.extract_mood(query)
                 }
                 demo_tracks.append(track)
             
@@ -178,53 +193,15 @@ class SimpleMusicService:
             print(f"Music search error: {e}")
             return []
     
-    def _extract_genre(self, tags: str) -> str:
-        """Extract genre from tags"""
-        tags_lower = tags.lower()
-        if 'jazz' in tags_lower:
-            return 'jazz'
-        elif 'blues' in tags_lower or 'blue' in tags_lower:
-            return 'blues'
-        elif 'piano' in tags_lower or 'classical' in tags_lower:
-            return 'classical'
-        elif 'lofi' in tags_lower or 'chill' in tags_lower:
-            return 'lofi'
-        elif 'ambient' in tags_lower:
-            return 'ambient'
-        return 'other'
-    
-    def _extract_mood(self, tags: str) -> str:
-        """Extract mood from tags"""
-        tags_lower = tags.lower()
-        if any(word in tags_lower for word in ['relax', 'calm', 'peaceful']):
-            return 'relaxing'
-        elif any(word in tags_lower for word in ['focus', 'study', 'concentration']):
-            return 'focus'
-        elif any(word in tags_lower for word in ['sad', 'melancholy', 'blue']):
-            return 'melancholic'
-        elif any(word in tags_lower for word in ['happy', 'upbeat', 'cheerful']):
-            return 'happy'
-        return 'neutral'
-    
     def download_music(self, track: Dict) -> Optional[str]:
-        """Download music file"""
+        """Check the track's download URL is live (HEAD, or a 1-byte range) and return it"""
         try:
             download_url = track.get('download_url')
             if not download_url:
                 return None
             
-            # Create safe filename
-            title = track.get('title', 'Unknown')
-            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
-            filename = f"{safe_title}.mp3"
-            
-            # Download the file
-            response = requests.get(download_url, timeout=30)
-            if response.status_code == 200:
-                # For demo, we'll just return the URL since we can't save files on Railway
-                return download_url
-            else:
-                return None
+            # The client downloads the file itself; storing it here is track_downloads' job
+            return download_url if download_manager.probe(download_url) else None
                 
         except Exception as e:
             print(f"Download error: {e}")
@@ -232,8 +209,7 @@ class SimpleMusicService:
     
     def get_library_stats(self) -> Dict:
         """Get music library statistics"""
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
+        cursor = db.get_connection(db.MUSIC_DB).cursor()
         
         cursor.execute('SELECT COUNT(*) FROM music_tracks')
         total_tracks = cursor.fetchone()[0]
@@ -241,8 +217,6 @@ class SimpleMusicService:
         cursor.execute('SELECT genre, COUNT(*) FROM music_tracks GROUP BY genre')
         genres = cursor.fetchall()
         
-        conn.close()
-        
         return {
             'total_tracks': total_tracks,
             'genres': genres
@@ -373,17 +347,13 @@ class SimpleGoogleDrive:
             'folder_verified': True
         }
 
-# Initialize services
-try:
-    if os.path.exists('music_library.db'):
-        os.remove('music_library.db')
-        print("🔄 Recreating music database with demo data...")
-except:
-    pass
-
+# Initialize services (the music library persists across restarts; HECKX_MUSIC_DB can point at a volume)
 music_service = SimpleMusicService()
 drive_service = SimpleGoogleDrive()
 
+# Optional resumable downloads to disk (HECKX_DOWNLOAD_DIR); without it /api/music/download only checks the URL
+track_downloads = download_manager.create_manager_from_env()
+
 # Enhanced quotes by category
 QUOTES_BY_CATEGORY = {
     "wisdom": [
@@ -408,53 +378,94 @@ QUOTES_BY_CATEGORY = {
     ]
 }
 
+# Sampling index over the quotes (QUOTES_BY_CATEGORY or HECKX_QUOTE_CORPUS), keyed by (language, category, author)
+quote_catalog = quote_index.QuoteCatalog()
+
 # Database initialization
 def init_db():
-    conn = sqlite3.connect('conversations.db')
-    cursor = conn.cursor()
-    
-    # Create conversations table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            message TEXT,
-            response TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            category TEXT,
-            rating INTEGER
-        )
-    ''')
+    """Apply pending schema migrations (see migrations.py)"""
+    migrations.migrate_conversations()
+    register_quotes()
+
+def quote_row_ids(rows) -> List[int]:
+    """Stable quotes-table row ids for (category, text, author) rows, inserting new ones"""
+    ids = []
+    with db.transaction() as conn:
+        for row in rows:
+            conn.execute('INSERT OR IGNORE INTO quotes (category, text, author) VALUES (?, ?, ?)', row)
+            ids.append(conn.execute('SELECT id FROM quotes WHERE category = ? AND text = ? AND author = ?',
+                                    row).fetchone()[0])
+    return ids
+
+def register_quotes():
+    """Index the built-in QUOTES_BY_CATEGORY under their row ids in the quotes table"""
+    quotes = []
+    for category, group in QUOTES_BY_CATEGORY.items():
+        for quote in group:
+            quote['category'] = category
+            quotes.append(quote)
     
-    # Create user preferences table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_preferences (
-            user_id TEXT PRIMARY KEY,
-            favorite_category TEXT DEFAULT 'wisdom',
-            theme TEXT DEFAULT 'dark',
-            language TEXT DEFAULT 'thai',
-            notifications BOOLEAN DEFAULT TRUE,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    ids = quote_row_ids([(quote['category'], quote['text'], quote['author']) for quote in quotes])
+    for quote, quote_id in zip(quotes, ids):
+        quote['quote_id'] = quote_id
     
-    conn.commit()
-    conn.close()
+    quote_catalog.replace(('thai', quote['category'], quote['author'], quote) for quote in quotes)
+
+def check_corpus_ids(store: quote_store.QuoteStore):
+    """Spot-check that a corpus was built with --db against this database, so its ids are our quotes rows"""
+    conn = db.get_connection()
+    for n in {0, len(store) - 1}:
+        quote = store.quote(n)
+        row = conn.execute('SELECT text FROM quotes WHERE id = ?', (quote.quote_id,)).fetchone()
+        if row is None or row[0] != quote['text']:
+            raise ValueError(f'{store.path} was not built with --db {db.CONVERSATIONS_DB} '
+                             f'(quote id {quote.quote_id} is not that quote here)')
+
+def register_corpus(store: quote_store.QuoteStore):
+    """Index a compiled corpus in place of the built-in quotes; text stays in the shared mapping"""
+    check_corpus_ids(store)
+    language, theme, author = (quote_store.FIELD_INDEX[name] for name in ('language', 'theme', 'author'))
+    quote_catalog.replace((store.field(n, language), store.field(n, theme), store.field(n, author), store.quote(n))
+                          for n in range(len(store)))
+
+def quote_categories() -> List[str]:
+    """Categories in the current quote index"""
+    return sorted({theme for themes in quote_catalog.index.themes.values() for theme in themes})
 
 # Initialize database on startup
 init_db()
 
-@app.route('/')
-def home():
-    # Embedded simplified Thai UI
-    return '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>🎵 Heckx เพลงออนไลน์</title>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <style>
+# External quote corpus, reloaded when the file changes (HECKX_QUOTE_CORPUS, see quote_store.py)
+corpus_watcher = quote_store.watch_from_env(register_corpus)
+
+# No-repeat quote picks per user (HECKX_QUOTE_ROTATION=0 turns it off)
+rotation = quote_rotation.create_rotation_from_env(quote_catalog)
+
+# Rating-weighted picks for requests that ask for them (HECKX_QUOTE_WEIGHTS=0 turns it off)
+weighted_sampler = quote_weights.create_weights_from_env(quote_catalog)
+
+# Optional group-commit queue for history inserts (HECKX_WRITE_BEHIND=1)
+write_buffer = write_behind.create_buffer_from_env()
+
+def read_with_pending(user_id: str, read_db):
+    """Run a DB read for a user together with their not-yet-flushed history rows"""
+    if write_buffer is None:
+        return [], read_db()
+    return write_buffer.read_with_pending(user_id, read_db)
+
+# Optional background age-out of old history (HECKX_RETENTION_DAYS)
+retention_job = retention.create_job_from_env()
+
+@app.before_request
+def start_background_jobs():
+    health_monitor.ensure_started()
+    if retention_job is not None:
+        retention_job.ensure_started()
+    if corpus_watcher is not None:
+        corpus_watcher.ensure_started()
+
+# Embedded UI pages: HTML shells with their CSS/JS split into fingerprinted files
+HOME_PAGE_CSS = '''
             * { margin: 0; padding: 0; box-sizing: border-box; }
             body { 
                 font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
@@ -559,69 +570,28 @@ def home():
                 .controls { flex-direction: column; align-items: center; }
                 button { min-width: 200px; }
             }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>🎵 Heckx เพลงออนไลน์</h1>
-            <p class="subtitle">ค้นหาเพลง Lo-fi, Jazz, Piano สำหรับทำงาน พักผ่อน</p>
-            
-            <!-- Navigation Tabs -->
-            <div class="controls">
-                <button class="tab-button active" onclick="showTab('music')">🎵 เพลง</button>
-                <button class="tab-button" onclick="showTab('drive')">☁️ บันทึก</button>
-                <button class="tab-button" onclick="showTab('quotes')">💭 คำคม</button>
-            </div>
-            
-            <!-- Music Tab -->
-            <div id="music-tab" class="tab-content">
-                <div class="controls">
-                    <select id="music-genre">
-                        <option value="">ทุกประเภท</option>
-                        <option value="jazz">Jazz (แจ๊ส)</option>
-                        <option value="lofi">Lo-fi (ทำงาน)</option>
-                        <option value="piano">Piano (เปียโน)</option>
-                        <option value="blues">Blues (บลูส์)</option>
-                        <option value="ambient">Ambient (ผ่อนคลาย)</option>
-                    </select>
-                    <button onclick="discoverMusic()">🔍 ค้นหาเพลง</button>
-                    <button onclick="getMusicRecommendations()">🎯 เพลงแนะนำ</button>
-                </div>
-            </div>
-            
-            <!-- Google Drive Tab -->
-            <div id="drive-tab" class="tab-content" style="display: none;">
-                <div class="controls">
-                    <button onclick="getDriveInfo()">📊 สถานะ</button>
-                    <button onclick="uploadSample()">📤 ทดสอบบันทึก</button>
-                    <button onclick="syncToCloud()">☁️ บันทึกเพลง</button>
-                </div>
-            </div>
-            
-            <!-- Quotes Tab -->
-            <div id="quotes-tab" class="tab-content" style="display: none;">
-                <div class="controls">
-                    <select id="quote-category">
-                        <option value="random">สุ่มคำคม</option>
-                        <option value="wisdom">ปัญญา</option>
-                        <option value="resilience">กำลังใจ</option>
-                        <option value="mindfulness">สติ</option>
-                        <option value="motivation">แรงบันดาลใจ</option>
-                    </select>
-                    <button onclick="getQuote()">💭 ดูคำคม</button>
-                    <button onclick="getDailyQuote()">📅 คำคมวันนี้</button>
-                </div>
-            </div>
+'''
+
+HOME_PAGE_JS = '''
+            // One request on page load prefetches every panel's first view
+            const bootstrapParts = {};
+            const bootstrapLoaded = fetch('/api/bootstrap?parts=recommendations,drive_info,daily_quote')
+                .then(r => r.json())
+                .then(data => Object.assign(bootstrapParts, data.parts || {}))
+                .catch(() => {});
+            
+            // First use of a part comes from the bootstrap response, later ones from its own endpoint
+            function loadPart(name, url) {
+                return bootstrapLoaded.then(() => {
+                    const part = bootstrapParts[name];
+                    delete bootstrapParts[name];
+                    if (part) {
+                        return part;
+                    }
+                    return fetch(url).then(r => r.json());
+                });
+            }
             
-            <div id="result">
-                <div style="text-align: center; padding: 20px;">
-                    <h3>🎵 ยินดีต้อนรับสู่ Heckx เพลงออนไลน์</h3>
-                    <p style="margin-top: 10px;">เลือกแท็บด้านบนเพื่อเริ่มใช้งาน</p>
-                </div>
-            </div>
-        </div>
-        
-        <script>
             function showTab(tabName) {
                 // Hide all tabs
                 const tabs = document.querySelectorAll('.tab-content');
@@ -724,8 +694,7 @@ def home():
             function getMusicRecommendations() {
                 document.getElementById('result').innerHTML = '🎯 กำลังหาเพลงแนะนำ...';
                 
-                fetch('/api/music/recommendations')
-                .then(r => r.json())
+                loadPart('recommendations', '/api/music/recommendations')
                 .then(data => {
                     if (data.success && data.tracks.length > 0) {
                         let html = '<h3 style="margin-bottom: 15px;">🎯 เพลงแนะนำสำหรับคุณ</h3>';
@@ -821,8 +790,7 @@ def home():
             function getDriveInfo() {
                 document.getElementById('result').innerHTML = '📊 กำลังตรวจสอบสถานะ...';
                 
-                fetch('/api/music/drive/info')
-                .then(r => r.json())
+                loadPart('drive_info', '/api/music/drive/info')
                 .then(data => {
                     if (data.success) {
                         const info = data.drive_info;
@@ -880,8 +848,7 @@ def home():
             function getDailyQuote() {
                 document.getElementById('result').innerHTML = '📅 กำลังดึงคำคมวันนี้...';
                 
-                fetch('/api/quote/daily')
-                .then(r => r.json())
+                loadPart('daily_quote', '/api/quote/daily')
                 .then(data => {
                     let html = `<div style="border-left: 4px solid #FF9800; padding-left: 20px;">`;
                     html += `<h3>📅 คำคมวันนี้</h3>`;
@@ -894,21 +861,83 @@ def home():
                     document.getElementById('result').innerHTML = `<div style="text-align: center; padding: 20px;">❌ ไม่สามารถดึงคำคมวันนี้ได้: ${e.message}</div>`;
                 });
             }
-        </script>
-    </body>
-    </html>
-    '''
+'''
 
-@app.route('/old')
-def old_home():
-    return '''
+HOME_PAGE_HTML = '''
     <!DOCTYPE html>
     <html>
     <head>
-        <title>🚀 Heckx AI - Enhanced Assistant</title>
+        <title>🎵 Heckx เพลงออนไลน์</title>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <style>
+        <link rel="stylesheet" href="{{css_url}}">
+    </head>
+    <body>
+        <div class="container">
+            <h1>🎵 Heckx เพลงออนไลน์</h1>
+            <p class="subtitle">ค้นหาเพลง Lo-fi, Jazz, Piano สำหรับทำงาน พักผ่อน</p>
+            
+            <!-- Navigation Tabs -->
+            <div class="controls">
+                <button class="tab-button active" onclick="showTab('music')">🎵 เพลง</button>
+                <button class="tab-button" onclick="showTab('drive')">☁️ บันทึก</button>
+                <button class="tab-button" onclick="showTab('quotes')">💭 คำคม</button>
+            </div>
+            
+            <!-- Music Tab -->
+            <div id="music-tab" class="tab-content">
+                <div class="controls">
+                    <select id="music-genre">
+                        <option value="">ทุกประเภท</option>
+                        <option value="jazz">Jazz (แจ๊ส)</option>
+                        <option value="lofi">Lo-fi (ทำงาน)</option>
+                        <option value="piano">Piano (เปียโน)</option>
+                        <option value="blues">Blues (บลูส์)</option>
+                        <option value="ambient">Ambient (ผ่อนคลาย)</option>
+                    </select>
+                    <button onclick="discoverMusic()">🔍 ค้นหาเพลง</button>
+                    <button onclick="getMusicRecommendations()">🎯 เพลงแนะนำ</button>
+                </div>
+            </div>
+            
+            <!-- Google Drive Tab -->
+            <div id="drive-tab" class="tab-content" style="display: none;">
+                <div class="controls">
+                    <button onclick="getDriveInfo()">📊 สถานะ</button>
+                    <button onclick="uploadSample()">📤 ทดสอบบันทึก</button>
+                    <button onclick="syncToCloud()">☁️ บันทึกเพลง</button>
+                </div>
+            </div>
+            
+            <!-- Quotes Tab -->
+            <div id="quotes-tab" class="tab-content" style="display: none;">
+                <div class="controls">
+                    <select id="quote-category">
+                        <option value="random">สุ่มคำคม</option>
+                        <option value="wisdom">ปัญญา</option>
+                        <option value="resilience">กำลังใจ</option>
+                        <option value="mindfulness">สติ</option>
+                        <option value="motivation">แรงบันดาลใจ</option>
+                    </select>
+                    <button onclick="getQuote()">💭 ดูคำคม</button>
+                    <button onclick="getDailyQuote()">📅 คำคมวันนี้</button>
+                </div>
+            </div>
+            
+            <div id="result">
+                <div style="text-align: center; padding: 20px;">
+                    <h3>🎵 ยินดีต้อนรับสู่ Heckx เพลงออนไลน์</h3>
+                    <p style="margin-top: 10px;">เลือกแท็บด้านบนเพื่อเริ่มใช้งาน</p>
+                </div>
+            </div>
+        </div>
+        
+        <script src="{{js_url}}"></script>
+    </body>
+    </html>
+    '''
+
+OLD_HOME_PAGE_CSS = '''
             * { margin: 0; padding: 0; box-sizing: border-box; }
             body { 
                 font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
@@ -1071,138 +1100,41 @@ def old_home():
                 h1 { font-size: 2.5em; }
                 .controls { flex-direction: column; align-items: center; }
             }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>🎵 Heckx เพลงออนไลน์</h1>
-            <p style="text-align: center; font-size: 1.2em; margin-bottom: 30px;">
-                <strong>ค้นหาเพลง</strong> - Lo-fi, Jazz, Piano สำหรับทำงาน พักผ่อน
-            </p>
-            
-            <div class="features-grid">
-                <div class="feature-card">
-                    <h3>🎵 ค้นหาเพลง</h3>
-                    <p>เพลง Lo-fi, Jazz, Piano คุณภาพสูง</p>
-                </div>
-                <div class="feature-card">
-                    <h3>☁️ บันทึกเพลง</h3>
-                    <p>เก็บเพลงโปรดไว้ใน Google Drive</p>
-                </div>
-                <div class="feature-card">
-                    <h3>☁️ Google Drive Backup</h3>
-                    <p>Auto-sync your music library and content to Google Drive</p>
-                </div>
-                <div class="feature-card">
-                    <h3>💬 Conversation History</h3>
-                    <p>Track your interactions and build personalized experiences</p>
-                </div>
-                <div class="feature-card">
-                    <h3>🎼 Music Library</h3>
-                    <p>Organize, search, and stream your premium music collection</p>
-                </div>
-                <div class="feature-card">
-                    <h3>📊 Analytics & Insights</h3>
-                    <p>Track usage, favorites, and optimize your experience</p>
-                </div>
-            </div>
+'''
+
+OLD_HOME_PAGE_JS = '''
+            let userId = localStorage.getItem('heckx_user_id') || 'user_' + Math.random().toString(36).substr(2, 9);
+            localStorage.setItem('heckx_user_id', userId);
             
-            <!-- Tab Navigation -->
-            <div style="display: flex; justify-content: center; margin: 30px 0;">
-                <button onclick="showTab('quotes')" id="quotesTab" class="tab-button active">📝 Quotes</button>
-                <button onclick="showTab('music')" id="musicTab" class="tab-button">🎵 Music</button>
-                <button onclick="showTab('library')" id="libraryTab" class="tab-button">🎼 Library</button>
-                <button onclick="showTab('stats')" id="statsTab" class="tab-button">📊 Stats</button>
-            </div>
+            // One request on page load prefetches every panel's first view
+            const bootstrapParts = {};
+            const staleParts = new Set();
+            const bootstrapLoaded = fetch('/api/bootstrap?user_id=' + encodeURIComponent(userId))
+                .then(r => r.json())
+                .then(data => Object.assign(bootstrapParts, data.parts || {}))
+                .catch(() => {});
+            
+            // First use of a part comes from the bootstrap response, later ones from its own endpoint
+            function loadPart(name, url) {
+                return bootstrapLoaded.then(() => {
+                    const part = bootstrapParts[name];
+                    delete bootstrapParts[name];
+                    if (part && !staleParts.has(name)) {
+                        return part;
+                    }
+                    return fetch(url).then(r => r.json());
+                });
+            }
             
-            <!-- Quotes Tab -->
-            <div id="quotesSection" class="tab-content">
-                <div class="controls">
-                    <select id="category">
-                        <option value="random">Random Category</option>
-                        <option value="wisdom">Wisdom</option>
-                        <option value="resilience">Resilience</option>
-                        <option value="mindfulness">Mindfulness</option>
-                        <option value="motivation">Motivation</option>
-                    </select>
-                    <button onclick="getQuote()">📝 Get Quote</button>
-                    <button onclick="checkHealth()">❤️ Health Check</button>
-                    <button onclick="getStats()">📊 Statistics</button>
-                    <button onclick="getHistory()">📜 History</button>
-                    <button onclick="clearHistory()">🗑️ Clear History</button>
-                </div>
-            </div>
-            
-            <!-- Music Discovery Tab -->
-            <div id="musicSection" class="tab-content" style="display: none;">
-                <div class="controls">
-                    <input type="text" id="musicQuery" placeholder="Search: jazz, blue, piano, lofi..." style="padding: 10px; border-radius: 10px; border: none; margin: 5px; min-width: 200px;">
-                    <button onclick="discoverMusic()">🔍 Discover Music</button>
-                    <button onclick="bulkDiscover()">⚡ Bulk Discover</button>
-                    <button onclick="syncToDrive()">☁️ Sync to Drive</button>
-                    <button onclick="testDriveConnection()">🔧 Test Drive</button>
-                    <button onclick="uploadSampleTrack()">📤 Upload Sample</button>
-                </div>
-                <div class="controls">
-                    <button onclick="getRecommendations()">⭐ Recommendations</button>
-                    <button onclick="getDriveInfo()">📊 Drive Info</button>
-                    <button onclick="showSetupGuide()">📖 Setup Guide</button>
-                </div>
-            </div>
-            
-            <!-- Music Library Tab -->
-            <div id="librarySection" class="tab-content" style="display: none;">
-                <div class="controls">
-                    <select id="genreFilter">
-                        <option value="">All Genres</option>
-                    </select>
-                    <select id="moodFilter">
-                        <option value="">All Moods</option>
-                    </select>
-                    <input type="text" id="libraryQuery" placeholder="Search library..." style="padding: 10px; border-radius: 10px; border: none; margin: 5px;">
-                    <button onclick="searchLibrary()">🔍 Search Library</button>
-                    <button onclick="loadPlaylists()">📋 Playlists</button>
-                </div>
-                <div id="musicPlayer" style="background: rgba(0,0,0,0.5); padding: 20px; border-radius: 15px; margin: 20px 0; text-align: center;">
-                    <audio id="audioPlayer" controls style="width: 100%; max-width: 500px; margin: 10px 0;">
-                        Your browser does not support the audio element.
-                    </audio>
-                    <div id="nowPlaying" style="margin-top: 10px; font-style: italic;">No track selected</div>
-                </div>
-            </div>
-            
-            <!-- Statistics Tab -->
-            <div id="statsSection" class="tab-content" style="display: none;">
-                <div class="controls">
-                    <button onclick="getDetailedStats()">📊 Detailed Stats</button>
-                    <button onclick="getLibraryStats()">🎵 Music Stats</button>
-                    <button onclick="exportData()">💾 Export Data</button>
-                </div>
-            </div>
-            
-            <div id="result">
-                🎵 <strong>Welcome to Your Music Discovery Hub!</strong><br><br>
-                ✨ Try the <strong>Music</strong> tab to discover premium Lo-fi, Jazz & Piano tracks<br>
-                📚 Or explore wisdom quotes in the <strong>Quotes</strong> tab<br>
-                🎼 Check your <strong>Library</strong> for collected music<br><br>
-                <div style="background: rgba(255,255,255,0.1); padding: 15px; border-radius: 10px; margin-top: 15px;">
-                    <h4>🎵 Demo Music Available:</h4>
-                    <p>• Smooth Jazz Café ☕</p>
-                    <p>• Midnight Blues 🌙</p>  
-                    <p>• Lo-fi Study Session 📚</p>
-                    <p>• Ambient Atmosphere 🧘</p>
-                </div>
-            </div>
-        </div>
-        
-        <script>
-            let userId = localStorage.getItem('heckx_user_id') || 'user_' + Math.random().toString(36).substr(2, 9);
-            localStorage.setItem('heckx_user_id', userId);
+            function invalidateParts(...names) {
+                names.forEach(name => staleParts.add(name));
+            }
             
             function getQuote() {
                 const category = document.getElementById('category').value;
                 const resultDiv = document.getElementById('result');
                 resultDiv.innerHTML = '🔄 Loading wisdom...';
+                invalidateParts('stats', 'history');
                 
                 fetch('/api/quote', {
                     method: 'POST',
@@ -1222,8 +1154,8 @@ def old_home():
                             <p><strong>🔢 Quote #:</strong> ${data.id}</p>
                             <p><strong>⏰ Time:</strong> ${new Date(data.timestamp).toLocaleString()}</p>
                             <div style="margin-top: 15px;">
-                                <button onclick="rateQuote(${data.id}, 1)" style="background: #4CAF50; margin: 5px;">👍 Like</button>
-                                <button onclick="rateQuote(${data.id}, 0)" style="background: #f44336; margin: 5px;">👎 Dislike</button>
+                                <button onclick="rateQuote(${data.id}, 5)" style="background: #4CAF50; margin: 5px;">👍 Like</button>
+                                <button onclick="rateQuote(${data.id}, 1)" style="background: #f44336; margin: 5px;">👎 Dislike</button>
                             </div>
                         </div>
                     `;
@@ -1235,7 +1167,7 @@ def old_home():
             
             function checkHealth() {
                 document.getElementById('result').innerHTML = '🔄 Checking system health...';
-                fetch('/health')
+                fetch('/health/ready')
                 .then(r => r.json())
                 .then(data => {
                     document.getElementById('result').innerHTML = `
@@ -1257,8 +1189,7 @@ def old_home():
             
             function getStats() {
                 document.getElementById('result').innerHTML = '📊 Loading statistics...';
-                fetch('/api/stats?user_id=' + userId)
-                .then(r => r.json())
+                loadPart('stats', '/api/stats?user_id=' + userId)
                 .then(data => {
                     document.getElementById('result').innerHTML = `
                         <div style="border-left: 4px solid #FF9800; padding-left: 20px;">
@@ -1289,29 +1220,81 @@ def old_home():
                 });
             }
             
+            // History cache: rows already fetched plus the cursors to extend it
+            let historyItems = [];
+            let historyPending = [];
+            let historySyncCursor = null;
+            let historyNextCursor = null;
+            
+            function resetHistoryCache() {
+                historyItems = [];
+                historyPending = [];
+                historySyncCursor = null;
+                historyNextCursor = null;
+            }
+            
+            function renderHistory() {
+                const conversations = historyPending.concat(historyItems);
+                let historyHtml = '<div style="border-left: 4px solid #9C27B0; padding-left: 20px;"><h3>📜 Recent Conversations</h3>';
+                if (conversations.length === 0) {
+                    historyHtml += '<p>No conversations yet. Start by getting a quote!</p>';
+                } else {
+                    historyHtml += '<div class="conversation-history">';
+                    conversations.forEach(conv => {
+                        historyHtml += `
+                            <div style="margin-bottom: 15px; padding: 10px; background: rgba(255,255,255,0.1); border-radius: 8px;">
+                                <p><strong>Category:</strong> ${conv.category}</p>
+                                <p><strong>Quote:</strong> "${conv.message}"</p>
+                                <p><strong>Time:</strong> ${new Date(conv.timestamp).toLocaleString()}</p>
+                            </div>
+                        `;
+                    });
+                    historyHtml += '</div>';
+                    if (historyNextCursor) {
+                        historyHtml += '<button onclick="loadOlderHistory()">⬇️ Older</button>';
+                    }
+                }
+                historyHtml += '</div>';
+                document.getElementById('result').innerHTML = historyHtml;
+            }
+            
             function getHistory() {
                 document.getElementById('result').innerHTML = '📜 Loading conversation history...';
-                fetch('/api/history?user_id=' + userId)
-                .then(r => r.json())
+                // After the first load only rows newer than the cached ones are fetched
+                const url = historySyncCursor
+                    ? `/api/history?user_id=${userId}&since=${historySyncCursor}`
+                    : '/api/history?user_id=' + userId;
+                (historySyncCursor ? fetch(url).then(r => r.json()) : loadPart('history', url))
                 .then(data => {
-                    let historyHtml = '<div style="border-left: 4px solid #9C27B0; padding-left: 20px;"><h3>📜 Recent Conversations</h3>';
-                    if (data.conversations.length === 0) {
-                        historyHtml += '<p>No conversations yet. Start by getting a quote!</p>';
+                    if (historySyncCursor) {
+                        if (data.has_more) {
+                            // Too far behind for a delta, start over from the newest page
+                            resetHistoryCache();
+                            return getHistory();
+                        }
+                        // Rows shown as pending are in the cursor, so they stay as they are
+                        historyItems = data.conversations.concat(historyPending, historyItems);
+                        historyPending = [];
                     } else {
-                        historyHtml += '<div class="conversation-history">';
-                        data.conversations.forEach(conv => {
-                            historyHtml += `
-                                <div style="margin-bottom: 15px; padding: 10px; background: rgba(255,255,255,0.1); border-radius: 8px;">
-                                    <p><strong>Category:</strong> ${conv.category}</p>
-                                    <p><strong>Quote:</strong> "${conv.message}"</p>
-                                    <p><strong>Time:</strong> ${new Date(conv.timestamp).toLocaleString()}</p>
-                                </div>
-                            `;
-                        });
-                        historyHtml += '</div>';
+                        historyPending = data.conversations.filter(conv => conv.pending);
+                        historyItems = data.conversations.filter(conv => !conv.pending);
+                        historyNextCursor = data.next_cursor;
                     }
-                    historyHtml += '</div>';
-                    document.getElementById('result').innerHTML = historyHtml;
+                    historySyncCursor = data.sync_cursor || historySyncCursor;
+                    renderHistory();
+                })
+                .catch(e => {
+                    document.getElementById('result').innerHTML = `<div style="color: #f44336;"><h3>❌ History Error</h3><p>${e.message}</p></div>`;
+                });
+            }
+            
+            function loadOlderHistory() {
+                fetch(`/api/history?user_id=${userId}&cursor=${historyNextCursor}`)
+                .then(r => r.json())
+                .then(data => {
+                    historyItems = historyItems.concat(data.conversations);
+                    historyNextCursor = data.next_cursor;
+                    renderHistory();
                 })
                 .catch(e => {
                     document.getElementById('result').innerHTML = `<div style="color: #f44336;"><h3>❌ History Error</h3><p>${e.message}</p></div>`;
@@ -1320,6 +1303,7 @@ def old_home():
             
             function clearHistory() {
                 if (confirm('Are you sure you want to clear all conversation history?')) {
+                    invalidateParts('stats', 'history');
                     fetch('/api/history', {
                         method: 'DELETE',
                         headers: {'Content-Type': 'application/json'},
@@ -1327,6 +1311,7 @@ def old_home():
                     })
                     .then(r => r.json())
                     .then(data => {
+                        resetHistoryCache();
                         document.getElementById('result').innerHTML = `
                             <div style="border-left: 4px solid #4CAF50; padding-left: 20px;">
                                 <h3>✅ History Cleared</h3>
@@ -1341,6 +1326,7 @@ def old_home():
             }
             
             function rateQuote(quoteId, rating) {
+                invalidateParts('stats');
                 fetch('/api/rate', {
                     method: 'POST',
                     headers: {'Content-Type': 'application/json'},
@@ -1506,8 +1492,7 @@ def old_home():
             function getRecommendations() {
                 document.getElementById('result').innerHTML = '⭐ Loading premium recommendations...';
                 
-                fetch('/api/music/recommendations')
-                .then(r => r.json())
+                loadPart('recommendations', '/api/music/recommendations')
                 .then(data => {
                     if (data.success) {
                         displayLibraryTracks(data.recommendations, 'Premium Recommendations');
@@ -1605,8 +1590,7 @@ def old_home():
             }
             
             function loadGenresAndMoods() {
-                fetch('/api/music/genres')
-                .then(r => r.json())
+                loadPart('genres', '/api/music/genres')
                 .then(data => {
                     if (data.success) {
                         const genreSelect = document.getElementById('genreFilter');
@@ -1856,8 +1840,7 @@ def old_home():
             function getDriveInfo() {
                 document.getElementById('result').innerHTML = '📊 กำลังตรวจสอบสถานะ...';
                 
-                fetch('/api/music/drive/info')
-                .then(r => r.json())
+                loadPart('drive_info', '/api/music/drive/info')
                 .then(data => {
                     if (data.success) {
                         const info = data.drive_info;
@@ -1888,39 +1871,243 @@ def old_home():
             setInterval(() => {
                 fetch('/health').catch(() => {}); // Silent health ping
             }, 60000);
-        </script>
+'''
+
+OLD_HOME_PAGE_HTML = '''
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>🚀 Heckx AI - Enhanced Assistant</title>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <link rel="stylesheet" href="{{css_url}}">
+    </head>
+    <body>
+        <div class="container">
+            <h1>🎵 Heckx เพลงออนไลน์</h1>
+            <p style="text-align: center; font-size: 1.2em; margin-bottom: 30px;">
+                <strong>ค้นหาเพลง</strong> - Lo-fi, Jazz, Piano สำหรับทำงาน พักผ่อน
+            </p>
+            
+            <div class="features-grid">
+                <div class="feature-card">
+                    <h3>🎵 ค้นหาเพลง</h3>
+                    <p>เพลง Lo-fi, Jazz, Piano คุณภาพสูง</p>
+                </div>
+                <div class="feature-card">
+                    <h3>☁️ บันทึกเพลง</h3>
+                    <p>เก็บเพลงโปรดไว้ใน Google Drive</p>
+                </div>
+                <div class="feature-card">
+                    <h3>☁️ Google Drive Backup</h3>
+                    <p>Auto-sync your music library and content to Google Drive</p>
+                </div>
+                <div class="feature-card">
+                    <h3>💬 Conversation History</h3>
+                    <p>Track your interactions and build personalized experiences</p>
+                </div>
+                <div class="feature-card">
+                    <h3>🎼 Music Library</h3>
+                    <p>Organize, search, and stream your premium music collection</p>
+                </div>
+                <div class="feature-card">
+                    <h3>📊 Analytics & Insights</h3>
+                    <p>Track usage, favorites, and optimize your experience</p>
+                </div>
+            </div>
+            
+            <!-- Tab Navigation -->
+            <div style="display: flex; justify-content: center; margin: 30px 0;">
+                <button onclick="showTab('quotes')" id="quotesTab" class="tab-button active">📝 Quotes</button>
+                <button onclick="showTab('music')" id="musicTab" class="tab-button">🎵 Music</button>
+                <button onclick="showTab('library')" id="libraryTab" class="tab-button">🎼 Library</button>
+                <button onclick="showTab('stats')" id="statsTab" class="tab-button">📊 Stats</button>
+            </div>
+            
+            <!-- Quotes Tab -->
+            <div id="quotesSection" class="tab-content">
+                <div class="controls">
+                    <select id="category">
+                        <option value="random">Random Category</option>
+                        <option value="wisdom">Wisdom</option>
+                        <option value="resilience">Resilience</option>
+                        <option value="mindfulness">Mindfulness</option>
+                        <option value="motivation">Motivation</option>
+                    </select>
+                    <button onclick="getQuote()">📝 Get Quote</button>
+                    <button onclick="checkHealth()">❤️ Health Check</button>
+                    <button onclick="getStats()">📊 Statistics</button>
+                    <button onclick="getHistory()">📜 History</button>
+                    <button onclick="clearHistory()">🗑️ Clear History</button>
+                </div>
+            </div>
+            
+            <!-- Music Discovery Tab -->
+            <div id="musicSection" class="tab-content" style="display: none;">
+                <div class="controls">
+                    <input type="text" id="musicQuery" placeholder="Search: jazz, blue, piano, lofi..." style="padding: 10px; border-radius: 10px; border: none; margin: 5px; min-width: 200px;">
+                    <button onclick="discoverMusic()">🔍 Discover Music</button>
+                    <button onclick="bulkDiscover()">⚡ Bulk Discover</button>
+                    <button onclick="syncToDrive()">☁️ Sync to Drive</button>
+                    <button onclick="testDriveConnection()">🔧 Test Drive</button>
+                    <button onclick="uploadSampleTrack()">📤 Upload Sample</button>
+                </div>
+                <div class="controls">
+                    <button onclick="getRecommendations()">⭐ Recommendations</button>
+                    <button onclick="getDriveInfo()">📊 Drive Info</button>
+                    <button onclick="showSetupGuide()">📖 Setup Guide</button>
+                </div>
+            </div>
+            
+            <!-- Music Library Tab -->
+            <div id="librarySection" class="tab-content" style="display: none;">
+                <div class="controls">
+                    <select id="genreFilter">
+                        <option value="">All Genres</option>
+                    </select>
+                    <select id="moodFilter">
+                        <option value="">All Moods</option>
+                    </select>
+                    <input type="text" id="libraryQuery" placeholder="Search library..." style="padding: 10px; border-radius: 10px; border: none; margin: 5px;">
+                    <button onclick="searchLibrary()">🔍 Search Library</button>
+                    <button onclick="loadPlaylists()">📋 Playlists</button>
+                </div>
+                <div id="musicPlayer" style="background: rgba(0,0,0,0.5); padding: 20px; border-radius: 15px; margin: 20px 0; text-align: center;">
+                    <audio id="audioPlayer" controls style="width: 100%; max-width: 500px; margin: 10px 0;">
+                        Your browser does not support the audio element.
+                    </audio>
+                    <div id="nowPlaying" style="margin-top: 10px; font-style: italic;">No track selected</div>
+                </div>
+            </div>
+            
+            <!-- Statistics Tab -->
+            <div id="statsSection" class="tab-content" style="display: none;">
+                <div class="controls">
+                    <button onclick="getDetailedStats()">📊 Detailed Stats</button>
+                    <button onclick="getLibraryStats()">🎵 Music Stats</button>
+                    <button onclick="exportData()">💾 Export Data</button>
+                </div>
+            </div>
+            
+            <div id="result">
+                🎵 <strong>Welcome to Your Music Discovery Hub!</strong><br><br>
+                ✨ Try the <strong>Music</strong> tab to discover premium Lo-fi, Jazz & Piano tracks<br>
+                📚 Or explore wisdom quotes in the <strong>Quotes</strong> tab<br>
+                🎼 Check your <strong>Library</strong> for collected music<br><br>
+                <div style="background: rgba(255,255,255,0.1); padding: 15px; border-radius: 10px; margin-top: 15px;">
+                    <h4>🎵 Demo Music Available:</h4>
+                    <p>• Smooth Jazz Café ☕</p>
+                    <p>• Midnight Blues 🌙</p>  
+                    <p>• Lo-fi Study Session 📚</p>
+                    <p>• Ambient Atmosphere 🧘</p>
+                </div>
+            </div>
+        </div>
+        
+        <script src="{{js_url}}"></script>
     </body>
     </html>
     '''
 
-@app.route('/health')
-def health():
-    """Enhanced health check with database status"""
+ui_assets = page_assets.AssetRegistry('/assets')
+HOME_PAGE = ui_assets.add_page('home', HOME_PAGE_HTML, HOME_PAGE_CSS, HOME_PAGE_JS)
+OLD_HOME_PAGE = ui_assets.add_page('old-home', OLD_HOME_PAGE_HTML, OLD_HOME_PAGE_CSS, OLD_HOME_PAGE_JS)
+
+@app.route('/')
+def home():
+    # Embedded simplified Thai UI
+    return ui_assets.serve(HOME_PAGE)
+
+@app.route('/old')
+def old_home():
+    return ui_assets.serve(OLD_HOME_PAGE)
+
+@app.route('/assets/<filename>')
+def page_asset(filename):
+    """Fingerprinted page CSS/JS, cacheable forever"""
+    asset = ui_assets.get(filename)
+    if asset is None:
+        return jsonify({'error': 'Asset not found'}), 404
+    return ui_assets.serve(asset)
+
+# Readiness checks, refreshed in the background and served from memory
+def check_conversations_db():
+    conn = db.get_connection()
+    total, users = conn.execute('SELECT COALESCE(SUM(total_quotes), 0), COUNT(*) FROM user_stats').fetchone()
+    return {
+        'total_conversations': total,
+        'users': users,
+        'schema_version': migrations.current_version(conn)
+    }
+
+def check_music_db():
+    conn = db.get_connection(db.MUSIC_DB)
+    return {'tracks': conn.execute('SELECT COUNT(*) FROM music_tracks').fetchone()[0]}
+
+def check_write_buffer():
+    if write_buffer is None:
+        return {'enabled': False}
+    stats = write_buffer.queue_stats()
+    return {'ok': stats['queued'] < stats['max_pending'] * 0.9, 'enabled': True, **stats}
+
+def check_pixabay():
     try:
-        # Test database connection
-        conn = sqlite3.connect('conversations.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM conversations')
-        total_conversations = cursor.fetchone()[0]
-        conn.close()
-        
-        return jsonify({
-            'status': 'OK',
-            'app': 'Heckx AI Enhanced',
-            'version': '2.0',
-            'timestamp': datetime.now().isoformat(),
-            'database_status': 'Connected',
-            'total_conversations': total_conversations,
-            'uptime': time.time() if 'time' in globals() else 0
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'ERROR',
-            'app': 'Heckx AI Enhanced',
-            'timestamp': datetime.now().isoformat(),
-            'database_status': 'Error',
-            'error': str(e)
-        }), 500
+        response = requests.get('https://pixabay.com/api/', params={
+            'key': music_service.pixabay_api_key, 'q': 'music', 'per_page': 3
+        }, timeout=5)
+    except requests.RequestException as e:
+        # The exception text carries the request URL, API key included
+        return {'ok': False, 'error': type(e).__name__}
+    return {'ok': response.status_code == 200, 'http_status': response.status_code}
+
+def check_google_drive():
+    return {'ok': drive_service.enabled, 'folder_id': drive_service.music_folder_id}
+
+health_monitor = health.HealthMonitor()
+health_monitor.add_check('database', check_conversations_db)
+health_monitor.add_check('music_database', check_music_db)
+health_monitor.add_check('write_buffer', check_write_buffer, critical=False)
+health_monitor.add_check('google_drive', check_google_drive, critical=False)
+health_monitor.add_check('pixabay', check_pixabay, interval=health.EXTERNAL_INTERVAL, critical=False)
+
+@app.route('/health')
+def health_check():
+    """Liveness: answers from memory without touching the database"""
+    return jsonify({
+        'status': 'OK',
+        'app': 'Heckx AI Enhanced',
+        'version': '2.0',
+        'timestamp': datetime.now().isoformat(),
+        'uptime': time.time() - APP_START_TIME
+    })
+
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness: last background check results with their age"""
+    snapshot = health_monitor.snapshot()
+    database = snapshot['checks'].get('database', {})
+    snapshot.update({
+        'app': 'Heckx AI Enhanced',
+        'version': '2.0',
+        'timestamp': datetime.now().isoformat(),
+        'uptime': time.time() - APP_START_TIME,
+        'database_status': 'Connected' if database.get('ok') else 'Error',
+        'total_conversations': database.get('total_conversations')
+    })
+    return jsonify(snapshot), 200 if snapshot['ready'] else 503
+
+@app.route('/api/metrics/db')
+def db_metrics():
+    """Write-lock hold times in this worker, the last retention pass, quote sampler and search cache state"""
+    return jsonify({
+        'pid': os.getpid(),
+        'write_locks': db.lock_metrics(),
+        'retention': retention_job.status() if retention_job is not None else {'enabled': False},
+        'quote_rotation': rotation.stats() if rotation is not None else {'enabled': False},
+        'quote_weights': weighted_sampler.stats() if weighted_sampler is not None else {'enabled': False},
+        'search_cache': music_service.search_cache.stats() if music_service.search_cache is not None
+                        else {'enabled': False}
+    })
 
 @app.route('/api/quote', methods=['POST'])
 def get_quote():
@@ -1930,49 +2117,107 @@ def get_quote():
         category = data.get('category', 'random')
         user_id = data.get('user_id', 'anonymous')
         
-        # Select category
-        if category == 'random' or category not in QUOTES_BY_CATEGORY:
-            category = random.choice(list(QUOTES_BY_CATEGORY.keys()))
+        # 'random' or an unknown category means any quote
+        scope = category if category != 'random' else None
+        draw = None
+        if data.get('weighted') and weighted_sampler is not None:
+            # Favor well-rated quotes and the user's preferred categories, see quote_weights.py
+            draw = lambda: weighted_sampler.sample(user_id, scope)
         
-        # Get quote from selected category
-        quote_data = random.choice(QUOTES_BY_CATEGORY[category])
-        quote_id = random.randint(1000, 9999)
+        if rotation is not None:
+            # Quotes this user hasn't seen yet come first, see quote_rotation.py
+            quote_data = rotation.next_quote(user_id, scope, draw)
+        else:
+            index = quote_catalog.index
+            quote_data = ((draw and draw()) or (index.sample(theme=scope) if scope else None)
+                          or index.sample())
+        category = quote_data['category']
         
-        # Save to database
-        conn = sqlite3.connect('conversations.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO conversations (user_id, message, response, category)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, quote_data['text'], quote_data['author'], category))
-        conn.commit()
-        conn.close()
+        # Save to database; the row id is what /api/rate expects back
+        if write_buffer is not None:
+            try:
+                entry = write_buffer.submit(user_id, quote_data['quote_id'], quote_data['text'], category)
+            except write_behind.WriteBufferFull as e:
+                return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+            conversation_id = entry['id']
+        else:
+            with db.transaction() as conn:
+                conversation_id = conn.execute('''
+                    INSERT INTO conversations (user_id, quote_id, created_at)
+                    VALUES (?, ?, ?)
+                ''', (user_id, quote_data['quote_id'], int(time.time()))).lastrowid
+                user_stats.record_quote(conn, user_id, category)
         
         return jsonify({
             'success': True,
             'text': quote_data['text'],
             'author': quote_data['author'],
             'category': category,
-            'id': quote_id,
+            'id': conversation_id,
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+class MemoCache:
+    """In-process TTL cache for user-independent responses"""
+    
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key, ttl: float, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        value = compute()
+        with self._lock:
+            self._entries[key] = (now + ttl, value)
+        return value
+    
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+shared_cache = MemoCache()
+
+daily_picker = quote_index.DailyPicker(quote_catalog)
+
+def daily_quote_payload(category: str = 'wisdom', language: str = None) -> Dict:
+    """Today's quote: derived from the date, so every worker serves the same one all day"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    quote_data = daily_picker.pick(today, language, category)
+    if quote_data is None:
+        # Use wisdom category for daily quote
+        quote_data = daily_picker.pick(today, None, 'wisdom')
+    return {
+        'success': True,
+        'text': quote_data['text'],
+        'author': quote_data['author'],
+        'category': quote_data['category'],
+        'date': today
+    }
+
+def seconds_until_midnight() -> int:
+    """Seconds left in the server's local day"""
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(1, int((midnight - now).total_seconds()))
+
+def stats_payload(user_id: str) -> Dict:
+    # Maintained incrementally by the write paths, see user_stats.py
+    pending, stats = read_with_pending(user_id, lambda: user_stats.load(db.get_connection(), user_id))
+    return user_stats.summarize(stats, [row['category'] for row in pending])
+
 @app.route('/api/quote/daily')
 def get_daily_quote():
-    """Get daily motivational quote"""
+    """Get daily motivational quote (optional ?category= and ?lang=)"""
     try:
-        # Use wisdom category for daily quote
-        quote_data = random.choice(QUOTES_BY_CATEGORY['wisdom'])
-        
-        return jsonify({
-            'success': True,
-            'text': quote_data['text'],
-            'author': quote_data['author'],
-            'category': 'wisdom',
-            'date': datetime.now().strftime('%Y-%m-%d')
-        })
+        payload = daily_quote_payload(request.args.get('category', 'wisdom'), request.args.get('lang'))
+        return jsonify(payload), 200, {'Cache-Control': f'public, max-age={seconds_until_midnight()}'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1981,74 +2226,243 @@ def get_stats():
     """Get user statistics"""
     try:
         user_id = request.args.get('user_id', 'anonymous')
-        
-        conn = sqlite3.connect('conversations.db')
-        cursor = conn.cursor()
-        
-        # Total quotes
-        cursor.execute('SELECT COUNT(*) FROM conversations WHERE user_id = ?', (user_id,))
-        total_quotes = cursor.fetchone()[0]
-        
-        # Total conversations
-        cursor.execute('SELECT COUNT(DISTINCT category) FROM conversations WHERE user_id = ?', (user_id,))
-        total_conversations = cursor.fetchone()[0]
-        
-        # Favorite category
-        cursor.execute('''
-            SELECT category, COUNT(*) as count 
-            FROM conversations 
-            WHERE user_id = ? 
-            GROUP BY category 
-            ORDER BY count DESC 
-            LIMIT 1
-        ''', (user_id,))
-        fav_result = cursor.fetchone()
-        favorite_category = fav_result[0] if fav_result else 'None'
-        
-        # Average rating
-        cursor.execute('SELECT AVG(rating) FROM conversations WHERE user_id = ? AND rating IS NOT NULL', (user_id,))
-        avg_rating = cursor.fetchone()[0] or 0
-        
-        conn.close()
-        
-        return jsonify({
-            'total_quotes': total_quotes,
-            'total_conversations': total_conversations,
-            'favorite_category': favorite_category,
-            'avg_rating': round(avg_rating, 1)
-        })
+        return jsonify(stats_payload(user_id))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# History pagination: keyset on (timestamp, id), never OFFSET
+HISTORY_PAGE_SIZE = int(os.environ.get('HECKX_HISTORY_PAGE_SIZE', 20))
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get('HECKX_HISTORY_MAX_PAGE_SIZE', 100))
+
+def encode_history_cursor(created_at: int, row_id: int) -> str:
+    """Opaque cursor token for a conversations row position"""
+    raw = json.dumps([created_at, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_history_cursor(token: str):
+    """Inverse of encode_history_cursor; raises ValueError on a bad token"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(created_at, int) or not isinstance(row_id, int):
+        raise ValueError('Invalid cursor')
+    return created_at, row_id
+
+SYNC_MAX_SEEN = 500
+
+def encode_sync_cursor(created_at: int, seen_ids) -> str:
+    """Opaque since= token: a created_at second and the ids at or after it the client already has.
+
+    created_at is stamped at commit under the write lock, so it follows commit
+    order; ids don't (write-behind workers hand them out from their own blocks),
+    which is why the token lists ids instead of holding a (created_at, id) position.
+    """
+    raw = json.dumps([created_at, sorted(seen_ids)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_sync_cursor(token: str):
+    """Inverse of encode_sync_cursor; seen ids are None for a pre-id-list token, ValueError when bad"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, seen = json.loads(raw)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(created_at, int):
+        raise ValueError('Invalid cursor')
+    if isinstance(seen, int):
+        return created_at, None  # old (created_at, id) token
+    if not isinstance(seen, list) or not all(isinstance(i, int) for i in seen):
+        raise ValueError('Invalid cursor')
+    return created_at, seen
+
+# Rows carry epoch seconds; the API keeps rendering them like CURRENT_TIMESTAMP
+HISTORY_COLUMNS = '''
+    c.id, q.text, q.category, datetime(c.created_at, 'unixepoch'), c.created_at
+    FROM conversations c JOIN quotes q ON q.id = c.quote_id
+'''
+
+def _history_item(row) -> Dict:
+    return {
+        'id': row[0],
+        'message': row[1],
+        'category': row[2],
+        'timestamp': row[3]
+    }
+
+def _pending_item(row: Dict) -> Dict:
+    return {
+        'id': row['id'],
+        'message': row['message'],
+        'category': row['category'],
+        'timestamp': row['timestamp'],
+        'pending': True
+    }
+
+def history_page_payload(user_id: str, limit: int, cursor=None) -> Dict:
+    """One page of history, newest first; the first page includes queued rows"""
+    conn = db.get_connection()
+    
+    def read_rows():
+        if cursor:
+            return conn.execute(f'''
+                SELECT {HISTORY_COLUMNS}
+                WHERE c.user_id = ? AND (c.created_at, c.id) < (?, ?) 
+                ORDER BY c.created_at DESC, c.id DESC 
+                LIMIT ?
+            ''', (user_id, cursor[0], cursor[1], limit + 1)).fetchall(), []
+        rows = conn.execute(f'''
+            SELECT {HISTORY_COLUMNS}
+            WHERE c.user_id = ? 
+            ORDER BY c.created_at DESC, c.id DESC 
+            LIMIT ?
+        ''', (user_id, limit + 1)).fetchall()
+        # Every row of the newest second, including any past this page, for the sync cursor
+        newest_ids = [r[0] for r in conn.execute(
+            'SELECT id FROM conversations WHERE user_id = ? AND created_at = ?', (user_id, rows[0][4])
+        )] if rows else []
+        return rows, newest_ids
+    
+    if cursor:
+        pending, (rows, _) = [], read_rows()
+    else:
+        pending, (rows, newest_ids) = read_with_pending(user_id, read_rows)
+    
+    has_older = len(rows) > limit
+    rows = rows[:limit]
+    
+    # Rows still in the write-behind queue are the newest ones (first page only)
+    conversations = [_pending_item(row) for row in reversed(pending)]
+    conversations.extend(_history_item(row) for row in rows)
+    
+    response = {
+        'conversations': conversations,
+        'count': len(conversations),
+        'next_cursor': encode_history_cursor(rows[-1][4], rows[-1][0]) if has_older else None
+    }
+    if not cursor:
+        # Queued rows commit at or after the newest committed second, so they count as seen too
+        response['sync_cursor'] = encode_sync_cursor(rows[0][4] if rows else 0,
+                                                     newest_ids + [row['id'] for row in pending])
+    return response
+
+def history_sync_payload(user_id: str, limit: int, since_at: int, seen: List[int]) -> Dict:
+    """Rows added since a sync cursor, newest first, with the cursor to use next.
+
+    Same merged view as the first page: queued rows the client hasn't seen
+    come back marked pending, and their ids go into the cursor so they
+    aren't returned again once they commit.
+    """
+    conn = db.get_connection()
+    marks = ', '.join('?' for _ in seen)
+    
+    def read_rows():
+        # Oldest-first from the cursor second, minus what the client already has
+        rows = conn.execute(f'''
+            SELECT {HISTORY_COLUMNS}
+            WHERE c.user_id = ? AND c.created_at >= ? AND c.id NOT IN ({marks})
+            ORDER BY c.created_at ASC, c.id ASC 
+            LIMIT ?
+        ''', (user_id, since_at, *seen, limit + 1)).fetchall()
+        committed = dict(conn.execute(
+            f'SELECT id, created_at FROM conversations WHERE id IN ({marks})', seen)) if seen else {}
+        return rows, committed
+    
+    pending, (rows, committed) = read_with_pending(user_id, read_rows)
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    newest = rows[-1][4] if rows else since_at
+    # Seen ids only matter while they can still match created_at >= newest (not committed yet counts)
+    kept = [i for i in seen if committed.get(i, newest) >= newest]
+    shown = set(seen)
+    pending = [row for row in pending if row['id'] not in shown]
+    kept += [row[0] for row in rows if row[4] == newest] + [row['id'] for row in pending]
+    
+    conversations = [_pending_item(row) for row in reversed(pending)]
+    conversations.extend(_history_item(row) for row in reversed(rows))
+    return {
+        'conversations': conversations,
+        'count': len(conversations),
+        'sync_cursor': encode_sync_cursor(newest, kept),
+        # Too far behind (or an old cursor): the client starts over from the first page
+        'has_more': has_more or len(kept) > SYNC_MAX_SEEN
+    }
+
 @app.route('/api/history')
 def get_history():
-    """Get conversation history"""
+    """Get conversation history.
+    
+    Newest first, `limit` rows per page. Pass `cursor=<next_cursor>` for
+    older pages, or `since=<sync_cursor>` to fetch only rows newer than
+    the ones the client already has.
+    """
     try:
         user_id = request.args.get('user_id', 'anonymous')
+        cursor_token = request.args.get('cursor')
+        since_token = request.args.get('since')
         
-        conn = sqlite3.connect('conversations.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT message, category, timestamp 
-            FROM conversations 
-            WHERE user_id = ? 
-            ORDER BY timestamp DESC 
-            LIMIT 20
-        ''', (user_id,))
-        
-        conversations = []
-        for row in cursor.fetchall():
-            conversations.append({
-                'message': row[0],
-                'category': row[1],
-                'timestamp': row[2]
-            })
+        try:
+            limit = int(request.args.get('limit', HISTORY_PAGE_SIZE))
+            cursor = decode_history_cursor(cursor_token) if cursor_token else None
+            since = decode_sync_cursor(since_token) if since_token else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if cursor and since:
+            return jsonify({'error': 'Use either cursor or since, not both'}), 400
+        limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+        
+        if since:
+            if since[1] is None:
+                return jsonify({'conversations': [], 'count': 0, 'sync_cursor': None, 'has_more': True})
+            return jsonify(history_sync_payload(user_id, limit, since[0], since[1]))
+        
+        return jsonify(history_page_payload(user_id, limit, cursor))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+SEARCH_MAX_RESULTS = 50
+SEARCH_MAX_QUERY = 200
+
+@app.route('/api/search')
+def search():
+    """Full-text search over all quotes (scope=quotes) or one user's history (scope=history).
+    
+    Works for Thai without word spaces; see quote_search.py. Results are
+    ranked, with matches wrapped in <mark> in the HTML-escaped `highlight`.
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        scope = request.args.get('scope', 'quotes')
+        user_id = request.args.get('user_id', 'anonymous')
         
-        conn.close()
+        if not query:
+            return jsonify({'error': 'q is required'}), 400
+        if len(query) > SEARCH_MAX_QUERY:
+            return jsonify({'error': f'q must be at most {SEARCH_MAX_QUERY} characters'}), 400
+        if scope not in ('quotes', 'history'):
+            return jsonify({'error': 'scope must be quotes or history'}), 400
+        try:
+            limit = max(1, min(int(request.args.get('limit', 20)), SEARCH_MAX_RESULTS))
+        except ValueError:
+            return jsonify({'error': 'limit must be a number'}), 400
+        
+        started = time.perf_counter()
+        conn = db.get_connection()
+        if scope == 'history':
+            if write_buffer is not None and write_buffer.has_pending(user_id):
+                write_buffer.flush()  # recent quotes may still be queued
+            results = quote_search.search_history(conn, user_id, query, limit)
+        else:
+            results = quote_search.search_quotes(conn, query, request.args.get('category'), limit)
         
         return jsonify({
-            'conversations': conversations,
-            'count': len(conversations)
+            'success': True,
+            'query': query,
+            'scope': scope,
+            'results': results,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2060,12 +2474,11 @@ def clear_history():
         data = request.get_json() or {}
         user_id = data.get('user_id', 'anonymous')
         
-        conn = sqlite3.connect('conversations.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM conversations WHERE user_id = ?', (user_id,))
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        if write_buffer is not None:
+            write_buffer.flush()  # queued rows must not outlive the delete
+        
+        # Chunked so concurrent quote inserts get the write lock in between
+        deleted_count = retention.clear_user_history(user_id)
         
         return jsonify({
             'success': True,
@@ -2074,28 +2487,149 @@ def clear_history():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+RATE_BATCH_MAX = 500
+MIN_RATING, MAX_RATING = 1, 5
+LEGACY_DISLIKE = 0  # older pages send 0 for 👎; stored as the lowest rating
+
+def parse_rating(rating) -> int:
+    """The 1-5 star rating to store; raises ValueError unless it is an int in range (4.7, "5" and true are not)"""
+    if isinstance(rating, bool) or not isinstance(rating, int):
+        raise ValueError('rating must be a whole number')
+    if rating == LEGACY_DISLIKE:
+        return MIN_RATING
+    if not MIN_RATING <= rating <= MAX_RATING:
+        raise ValueError(f'rating must be between {MIN_RATING} and {MAX_RATING}')
+    return rating
+
+def apply_ratings(conn, user_id: str, ratings):
+    """Update (conversation_id, rating) pairs by primary key
+
+    Returns the ids the user doesn't own and the (quote_id, old, new) changes,
+    which go to note_rating_changes once the transaction has committed.
+    """
+    changes = []
+    not_found = []
+    for conversation_id, rating in ratings:
+        row = conn.execute(
+            'SELECT rating, quote_id FROM conversations WHERE id = ? AND user_id = ?',
+            (conversation_id, user_id)
+        ).fetchone()
+        if row is None:
+            not_found.append(conversation_id)
+            continue
+        conn.execute('UPDATE conversations SET rating = ? WHERE id = ?', (rating, conversation_id))
+        changes.append((row[1], row[0], rating))
+    
+    if changes:
+        user_stats.record_ratings(conn, user_id, [(old, new) for _, old, new in changes])
+    return not_found, changes
+
+def note_rating_changes(user_id: str, changes):
+    """Tell the weighted sampler about committed rating changes"""
+    if changes and weighted_sampler is not None:
+        weighted_sampler.note_ratings(user_id, changes)
+
 @app.route('/api/rate', methods=['POST'])
 def rate_quote():
-    """Rate a quote"""
+    """Rate a quote by the id /api/quote returned"""
     try:
         data = request.get_json() or {}
         quote_id = data.get('quote_id')
         rating = data.get('rating')
         user_id = data.get('user_id', 'anonymous')
         
-        conn = sqlite3.connect('conversations.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE conversations 
-            SET rating = ? 
-            WHERE user_id = ? 
-            ORDER BY timestamp DESC 
-            LIMIT 1
-        ''', (rating, user_id))
-        conn.commit()
-        conn.close()
-        
-        return jsonify({'success': True})
+        try:
+            quote_id = int(quote_id) if quote_id is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Rating and quote_id must be numbers'}), 400
+        try:
+            rating = parse_rating(rating)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if write_buffer is not None and write_buffer.has_pending(user_id):
+            write_buffer.flush()  # the quote may still be queued
+        
+        with db.transaction() as conn:
+            if quote_id is None:
+                # Older clients don't send an id: rate the user's latest quote
+                row = conn.execute('''
+                    SELECT id FROM conversations 
+                    WHERE user_id = ? 
+                    ORDER BY created_at DESC, id DESC 
+                    LIMIT 1
+                ''', (user_id,)).fetchone()
+                if row is None:
+                    return jsonify({'error': 'Quote not found'}), 404
+                quote_id = row[0]
+            
+            not_found, changes = apply_ratings(conn, user_id, [(quote_id, rating)])
+        
+        if not_found:
+            return jsonify({'error': 'Quote not found'}), 404
+        note_rating_changes(user_id, changes)
+        return jsonify({'success': True, 'quote_id': quote_id})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/rate/batch', methods=['POST'])
+def rate_quotes_batch():
+    """Apply many ratings in one transaction: {"user_id", "ratings": [{"quote_id", "rating"}]}"""
+    try:
+        data = request.get_json() or {}
+        user_id = data.get('user_id', 'anonymous')
+        items = data.get('ratings')
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'ratings must be a non-empty list'}), 400
+        if len(items) > RATE_BATCH_MAX:
+            return jsonify({'error': f'At most {RATE_BATCH_MAX} ratings per batch'}), 400
+        
+        try:
+            ratings = [(int(item['quote_id']), item['rating']) for item in items]
+        except (TypeError, ValueError, KeyError):
+            return jsonify({'error': 'Each rating needs numeric quote_id and rating'}), 400
+        try:
+            ratings = [(quote_id, parse_rating(rating)) for quote_id, rating in ratings]
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if write_buffer is not None and write_buffer.has_pending(user_id):
+            write_buffer.flush()
+        
+        with db.transaction() as conn:
+            not_found, changes = apply_ratings(conn, user_id, ratings)
+        note_rating_changes(user_id, changes)
+        
+        return jsonify({
+            'success': True,
+            'updated': len(ratings) - len(not_found),
+            'not_found': not_found
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/preferences', methods=['POST'])
+def update_preferences():
+    """Set the user's favorite quote category (weighted /api/quote picks favor it)"""
+    try:
+        data = request.get_json() or {}
+        user_id = data.get('user_id', 'anonymous')
+        favorite_category = data.get('favorite_category')
+        
+        categories = quote_categories()
+        if favorite_category not in categories:
+            return jsonify({'error': f'favorite_category must be one of: {", ".join(categories)}'}), 400
+        
+        with db.transaction() as conn:
+            conn.execute('''
+                INSERT INTO user_preferences (user_id, favorite_category) VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET favorite_category = excluded.favorite_category
+            ''', (user_id, favorite_category))
+        
+        if weighted_sampler is not None:
+            weighted_sampler.note_preferences(user_id)
+        return jsonify({'success': True, 'favorite_category': favorite_category})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -2176,22 +2710,32 @@ def download_music():
             return jsonify({'error': 'Invalid track ID'}), 400
         
         # Get track from database
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM music_tracks WHERE id = ?', [track_id])
+        cursor = db.get_connection(db.MUSIC_DB).cursor()
+        cursor.execute('SELECT id, title, artist, download_url FROM music_tracks WHERE id = ?', [track_id])
         row = cursor.fetchone()
-        conn.close()
         
         if not row:
             return jsonify({'error': 'Track not found'}), 404
         
         track_info = {
             'id': row[0],
-            'title': row[3],
-            'artist': row[4],
-            'download_url': row[6]
+            'title': row[1],
+            'artist': row[2],
+            'download_url': row[3]
         }
         
+        if track_downloads is not None and track_info['download_url']:
+            # Stored on this server in the background; poll progress_url
+            queue_track_download(track_info)
+            return jsonify({
+                'success': True,
+                'queued': True,
+                'download_url': track_info['download_url'],
+                'progress_url': f"/api/music/download/{track_id}",
+                'progress': track_downloads.progress(f'track:{track_id}'),
+                'message': f"Downloading: {track_info.get('title', 'Unknown Track')}"
+            }), 202
+        
         # Use the download method from music service
         download_url = music_service.download_music(track_info)
         
@@ -2208,12 +2752,53 @@ def download_music():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def queue_track_download(track_info: Dict):
+    """Start (or join) a library track's download; its file_path and file_size are saved when it finishes"""
+    track_id = track_info['id']
+    
+    def record(future):
+        if future.exception() is not None:
+            print(f"❌ Download failed for track {track_id}: {future.exception()}")
+            return
+        stored = future.result()
+        with db.transaction(db.MUSIC_DB) as conn:
+            conn.execute('UPDATE music_tracks SET file_path = ?, file_size = ? WHERE id = ?',
+                         (stored['path'], stored['size'], track_id))
+        print(f"✅ Downloaded: {track_info.get('title')}")
+    
+    future = track_downloads.submit(f'track:{track_id}', track_info['download_url'])
+    future.add_done_callback(record)
+
+@app.route('/api/music/download/<int:track_id>')
+def get_download_progress(track_id):
+    """State and byte counts of a track's download"""
+    try:
+        if track_downloads is None:
+            return jsonify({'error': 'Downloads to the server are off (set HECKX_DOWNLOAD_DIR)'}), 404
+        
+        progress = track_downloads.progress(f'track:{track_id}')
+        if progress is None:
+            # Finished in another worker or before a restart
+            row = db.get_connection(db.MUSIC_DB).execute(
+                'SELECT file_path, file_size FROM music_tracks WHERE id = ?', (track_id,)).fetchone()
+            if row is None or not row[0]:
+                return jsonify({'error': 'No download for this track'}), 404
+            progress = {'state': 'done', 'path': row[0], 'bytes': row[1], 'total': row[1]}
+        
+        return jsonify({'success': True, 'track_id': track_id, 'progress': progress})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/music/library')
 def get_music_library():
-    """Get music library with search and filters"""
+    """Get music library with search and filters (?genre=, ?mood=, ?tag= browse by quality)"""
     try:
         query = request.args.get('query', '')
-        tracks = music_service.search_music(query) if query else music_service.search_music('')
+        genre, mood, tag = request.args.get('genre'), request.args.get('mood'), request.args.get('tag')
+        if not query and (genre or mood or tag):
+            tracks = music_service.top_tracks(genre, mood, tag)
+        else:
+            tracks = music_service.search_music(query) if query else music_service.search_music('')
         stats = music_service.get_library_stats()
         
         return jsonify({
@@ -2225,26 +2810,24 @@ def get_music_library():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/music/recommendations')
-def get_music_recommendations():
-    """Get premium music recommendations"""
-    try:
+# Library-wide views change only when tracks are added, so short TTLs are enough
+RECOMMENDATIONS_TTL = 60
+GENRES_TTL = 60
+DRIVE_INFO_TTL = 300
+
+def recommendations_payload() -> Dict:
+    def compute():
         recommendations = music_service.search_music('lofi')  # Get lofi tracks as recommendations
-        
-        return jsonify({
+        return {
             'success': True,
             'tracks': recommendations,
             'total': len(recommendations)
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        }
+    return shared_cache.get('recommendations', RECOMMENDATIONS_TTL, compute)
 
-@app.route('/api/music/genres')
-def get_music_genres():
-    """Get available music genres"""
-    try:
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
+def genres_payload() -> Dict:
+    def compute():
+        cursor = db.get_connection(db.MUSIC_DB).cursor()
         
         cursor.execute('SELECT DISTINCT genre, COUNT(*) FROM music_tracks GROUP BY genre')
         genres = [{'genre': row[0], 'count': row[1]} for row in cursor.fetchall()]
@@ -2252,13 +2835,32 @@ def get_music_genres():
         cursor.execute('SELECT DISTINCT mood, COUNT(*) FROM music_tracks GROUP BY mood')
         moods = [{'mood': row[0], 'count': row[1]} for row in cursor.fetchall()]
         
-        conn.close()
-        
-        return jsonify({
+        return {
             'success': True,
             'genres': genres,
             'moods': moods
-        })
+        }
+    return shared_cache.get('genres', GENRES_TTL, compute)
+
+def drive_info_payload() -> Dict:
+    return shared_cache.get('drive_info', DRIVE_INFO_TTL, lambda: {
+        'success': True,
+        'drive_info': drive_service.get_drive_info()
+    })
+
+@app.route('/api/music/recommendations')
+def get_music_recommendations():
+    """Get premium music recommendations"""
+    try:
+        return jsonify(recommendations_payload())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/music/genres')
+def get_music_genres():
+    """Get available music genres"""
+    try:
+        return jsonify(genres_payload())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -2266,12 +2868,10 @@ def get_music_genres():
 def stream_music(track_id):
     """Get music track URL for streaming"""
     try:
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
+        cursor = db.get_connection(db.MUSIC_DB).cursor()
         
         cursor.execute('SELECT title, preview_url, download_url FROM music_tracks WHERE id = ?', (track_id,))
         result = cursor.fetchone()
-        conn.close()
         
         if result:
             title, preview_url, download_url = result
@@ -2290,63 +2890,172 @@ def stream_music(track_id):
 
 @app.route('/api/music/playlists', methods=['GET', 'POST'])
 def manage_playlists():
-    """Get or create playlists"""
+    """Get or create playlists (storage in playlists.py)"""
     try:
         if request.method == 'POST':
             data = request.get_json() or {}
             name = data.get('name')
-            track_ids = data.get('track_ids', [])
-            mood_tag = data.get('mood_tag')
+            track_ids = data.get('track_ids') or []
             
             if not name:
                 return jsonify({'error': 'Playlist name required'}), 400
+            if not isinstance(track_ids, list):
+                return jsonify({'error': 'track_ids must be a list of track ids'}), 400
             
-            # Demo mode - simulate playlist creation
-            playlist_id = len(name)  # Simple ID generation
+            try:
+                with db.transaction(db.MUSIC_DB) as conn:
+                    playlist_id = playlists.create_playlist(conn, name, track_ids, data.get('description'),
+                                                            data.get('mood_tag'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
             return jsonify({
                 'success': True,
                 'playlist_id': playlist_id,
-                'demo': True,
-                'message': f'Demo playlist "{name}" created with {len(track_ids)} tracks'
-            })
+                'message': f'Playlist "{name}" created with {len(track_ids)} tracks'
+            }), 201
         
         else:  # GET
-            conn = sqlite3.connect('music_library.db')
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM playlists ORDER BY created_date DESC')
-            playlists = []
-            
-            for row in cursor.fetchall():
-                track_ids = [int(x) for x in row[3].split(',') if x]
-                playlists.append({
-                    'id': row[0],
-                    'name': row[1],
-                    'description': row[2],
-                    'track_count': len(track_ids),
-                    'mood_tag': row[6],
-                    'created_date': row[4]
-                })
-            
-            conn.close()
+            # ?tracks=1 adds each playlist's tracks (same single query); ?track_id= keeps playlists holding it
+            try:
+                track_id = request.args.get('track_id', type=int)
+            except ValueError:
+                return jsonify({'error': 'track_id must be a number'}), 400
+            include_tracks = request.args.get('tracks', '').lower() in ('1', 'true', 'yes')
             
             return jsonify({
                 'success': True,
-                'playlists': playlists
+                'playlists': playlists.list_playlists(db.get_connection(db.MUSIC_DB), include_tracks, track_id)
             })
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/music/playlists/<int:playlist_id>', methods=['GET', 'DELETE'])
+def manage_playlist(playlist_id):
+    """Get a playlist with its tracks in order, or delete it"""
+    try:
+        if request.method == 'DELETE':
+            with db.transaction(db.MUSIC_DB) as conn:
+                playlists.delete_playlist(conn, playlist_id)
+            return jsonify({'success': True, 'message': f'Playlist {playlist_id} deleted'})
+        
+        return jsonify({
+            'success': True,
+            'playlist': playlists.get_playlist(db.get_connection(db.MUSIC_DB), playlist_id)
+        })
+    except playlists.PlaylistNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/music/playlists/<int:playlist_id>/tracks', methods=['POST'])
+def add_playlist_tracks(playlist_id):
+    """Append tracks, or insert them before `position`"""
+    try:
+        data = request.get_json() or {}
+        track_ids = data.get('track_ids')
+        if not isinstance(track_ids, list) or not track_ids:
+            return jsonify({'error': 'track_ids must be a non-empty list'}), 400
+        
+        with db.transaction(db.MUSIC_DB) as conn:
+            track_count = playlists.add_tracks(conn, playlist_id, track_ids, data.get('position'))
+        
+        return jsonify({
+            'success': True,
+            'track_count': track_count,
+            'message': f'Added {len(track_ids)} tracks to playlist {playlist_id}'
+        })
+    except playlists.PlaylistNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/music/playlists/<int:playlist_id>/tracks/<int:position>', methods=['DELETE'])
+def remove_playlist_track(playlist_id, position):
+    """Remove the track at a 0-based position"""
+    try:
+        with db.transaction(db.MUSIC_DB) as conn:
+            track_id = playlists.remove_track(conn, playlist_id, position)
+        return jsonify({'success': True, 'track_id': track_id})
+    except (playlists.PlaylistNotFound, ValueError) as e:  # ValueError: no track at that position
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/music/playlists/<int:playlist_id>/tracks/move', methods=['POST'])
+def move_playlist_track(playlist_id):
+    """Reorder: move the track at from_position to to_position"""
+    try:
+        data = request.get_json() or {}
+        with db.transaction(db.MUSIC_DB) as conn:
+            track_id = playlists.move_track(conn, playlist_id, data.get('from_position'), data.get('to_position'))
+        return jsonify({'success': True, 'track_id': track_id})
+    except playlists.PlaylistNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/music/drive/info')
 def get_drive_info():
     """Get Google Drive library information"""
     try:
-        drive_info = drive_service.get_drive_info()
+        return jsonify(drive_info_payload())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Page-load bundle: every part is the body its own endpoint would return
+bootstrap_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('HECKX_BOOTSTRAP_WORKERS', 6)),
+                                        thread_name_prefix='bootstrap')
+
+@app.route('/api/bootstrap')
+def bootstrap():
+    """Stats, first history page, daily quote, recommendations, genres and Drive info in one response.
+    
+    `parts=a,b` limits the response to the named parts.
+    """
+    try:
+        user_id = request.args.get('user_id', 'anonymous')
+        try:
+            history_limit = int(request.args.get('history_limit', HISTORY_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'history_limit must be a number'}), 400
+        history_limit = max(1, min(history_limit, HISTORY_MAX_PAGE_SIZE))
+        
+        jobs = {
+            'stats': lambda: stats_payload(user_id),
+            'history': lambda: history_page_payload(user_id, history_limit),
+            'daily_quote': daily_quote_payload,
+            'recommendations': recommendations_payload,
+            'genres': genres_payload,
+            'drive_info': drive_info_payload
+        }
+        if request.args.get('parts'):
+            names = request.args['parts'].split(',')
+            unknown = [name for name in names if name not in jobs]
+            if unknown:
+                return jsonify({'error': f"Unknown parts: {', '.join(unknown)}"}), 400
+            jobs = {name: jobs[name] for name in names}
+        
+        futures = {name: bootstrap_executor.submit(job) for name, job in jobs.items()}
+        
+        # A failed part is reported and left out; the page fetches it on its own
+        parts, errors = {}, {}
+        for name, future in futures.items():
+            try:
+                parts[name] = future.result()
+            except Exception as e:
+                errors[name] = str(e)
+        
         return jsonify({
-            'success': True,
-            'drive_info': drive_info
+            'success': not errors,
+            'user_id': user_id,
+            'parts': parts,
+            'errors': errors
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2470,11 +3179,9 @@ def sync_to_drive():
         # If no specific file provided, sync a demo track
         if not file_url:
             # Get a demo track from database
-            conn = sqlite3.connect('music_library.db')
-            cursor = conn.cursor()
+            cursor = db.get_connection(db.MUSIC_DB).cursor()
             cursor.execute('SELECT title, download_url FROM music_tracks LIMIT 1')
             result = cursor.fetchone()
-            conn.close()
             
             if result:
                 filename = f"{result[0]}.mp3"
@@ -2508,24 +3215,89 @@ def sync_to_drive():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Keyword searches for bulk discovery run side by side, each request waiting at most the deadline
+discover_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('HECKX_DISCOVER_WORKERS', 8)),
+                                       thread_name_prefix='discover')
+DISCOVER_DEADLINE_S = float(os.environ.get('HECKX_DISCOVER_DEADLINE_S', 5))
+MAX_DISCOVER_KEYWORDS = 20
+MAX_DISCOVER_TRACKS = 100
+# A request never holds more pool slots than this, even with searches still running past its deadline
+DISCOVER_PER_REQUEST = max(1, int(os.environ.get('HECKX_DISCOVER_PER_REQUEST', 2)))
+
+class TopTracks:
+    """The k most downloaded distinct tracks seen so far, in a min-heap of size k"""
+    
+    def __init__(self, k: int):
+        self.k = k
+        self._heap = []
+        self._seen = set()
+    
+    def add(self, track: Dict):
+        key = (track.get('source'), track.get('external_id') or track.get('id'))
+        if key in self._seen or self.k <= 0:
+            return
+        self._seen.add(key)
+        # -len(seen) breaks ties: the earlier track stays, and dicts are never compared
+        entry = (track.get('downloads') or 0, -len(self._seen), track)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+    
+    def tracks(self) -> List[Dict]:
+        return [track for _, _, track in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
 @app.route('/api/music/bulk-discover', methods=['POST'])
 def bulk_discover_music():
-    """Discover and download multiple premium tracks"""
+    """Discover and download multiple premium tracks.
+    
+    Keywords are searched concurrently, at most DISCOVER_PER_REQUEST at a
+    time; whatever finished by the deadline is returned, with the rest listed
+    in timed_out_keywords.
+    """
     try:
         data = request.get_json() or {}
         keywords = data.get('keywords', ['jazz', 'blue', 'piano', 'lofi'])
         max_tracks = data.get('max_tracks', 10)
         auto_download = data.get('auto_download', False)
         
-        all_tracks = []
-        
-        for keyword in keywords:
-            tracks = music_service.search_music(keyword)
-            all_tracks.extend(tracks)
+        if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+            return jsonify({'error': 'keywords must be a list of strings'}), 400
+        if isinstance(max_tracks, bool) or not isinstance(max_tracks, int) or not 1 <= max_tracks <= MAX_DISCOVER_TRACKS:
+            return jsonify({'error': f'max_tracks must be an integer between 1 and {MAX_DISCOVER_TRACKS}'}), 400
+        
+        queued = list(dict.fromkeys(k.strip() for k in keywords if k.strip()))[:MAX_DISCOVER_KEYWORDS]
+        queued.reverse()
+        running = {}
+        
+        def submit_next():
+            keyword = queued.pop()
+            running[discover_executor.submit(music_service.search_music, keyword)] = keyword
+        
+        for _ in range(min(DISCOVER_PER_REQUEST, len(queued))):
+            submit_next()
+        
+        top = TopTracks(max_tracks)
+        failed_keywords = {}
+        deadline = time.monotonic() + DISCOVER_DEADLINE_S
+        while running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                keyword = running.pop(future)
+                try:
+                    for track in future.result():
+                        top.add(track)
+                except Exception as e:
+                    failed_keywords[keyword] = str(e)
+                if queued:
+                    submit_next()
         
-        # Sort by downloads and limit
-        sorted_tracks = sorted(all_tracks, key=lambda x: x.get('downloads', 0), reverse=True)
-        top_tracks = sorted_tracks[:max_tracks]
+        # Searches still running finish in the background and warm the search cache; the rest never start
+        timed_out_keywords = list(running.values()) + queued[::-1]
+        top_tracks = top.tracks()
         
         downloaded_tracks = []
         
@@ -2540,7 +3312,10 @@ def bulk_discover_music():
             'discovered_tracks': top_tracks,
             'downloaded_tracks': downloaded_tracks,
             'total_discovered': len(top_tracks),
-            'total_downloaded': len(downloaded_tracks)
+            'total_downloaded': len(downloaded_tracks),
+            'partial': bool(timed_out_keywords or failed_keywords),
+            'timed_out_keywords': timed_out_keywords,
+            'failed_keywords': failed_keywords
         })
         
     except Exception as e:
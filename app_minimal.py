@@ -10,6 +10,8 @@ from datetime import datetime
 from flask import Flask, jsonify, request, g
 import logging
 
+import quote_store
+
 app = Flask(__name__)
 
 # Configure logging
@@ -23,6 +25,8 @@ logger = logging.getLogger(__name__)
 @app.before_request
 def before_request():
     g.start_time = time.time()
+    if corpus_watcher is not None:
+        corpus_watcher.ensure_started()
 
 @app.after_request
 def after_request(response):
@@ -66,6 +70,15 @@ QUOTES = [
     }
 ]
 
+# Compiled corpus shared by all workers (HECKX_QUOTE_CORPUS, see quote_store.py); QUOTES until one loads
+corpus = None
+
+def use_corpus(store):
+    global corpus
+    corpus = store
+
+corpus_watcher = quote_store.watch_from_env(use_corpus)
+
 @app.route('/')
 def home():
     return '''
@@ -352,7 +365,7 @@ def health():
         }
         
         # Test basic functionality
-        test_quote = random.choice(QUOTES)
+        test_quote = random.choice(corpus or QUOTES)
         if test_quote and 'quote' in test_quote:
             health_status['functional_test'] = 'PASS'
         else:
@@ -382,14 +395,14 @@ def health():
 def get_quote():
     """Get a random stoic wisdom quote"""
     try:
-        quote = random.choice(QUOTES)
+        quote = random.choice(corpus or QUOTES)
         return jsonify({
             'quote': quote['quote'],
             'author': quote['author'],
             'theme': quote['theme'],
             'id': random.randint(1000, 9999),
             'timestamp': datetime.now().isoformat(),
-            'language': 'thai'
+            'language': quote.get('language', 'thai')
         })
     except Exception as e:
         logger.error(f"Quote API error: {str(e)}")
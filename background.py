@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Per-process background workers for Heckx AI
+Threads and executors are created on first use, in the process that uses
+them, so a preloading master (gunicorn --preload) never forks a dead thread
+into its workers: after a fork the first call in the child starts its own.
+"""
+
+import os
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class PerProcess(Generic[T]):
+    """A value made by `factory` on the first get() in each process"""
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value: Optional[T] = None
+        self._pid = None
+
+    def get(self) -> T:
+        if self._pid == os.getpid():
+            return self._value
+        with self._lock:
+            if self._pid != os.getpid():
+                self._value = self._factory()
+                self._pid = os.getpid()  # set last: the unlocked check above must not see a stale value
+            return self._value
+
+    def started(self) -> bool:
+        """Whether get() has run in this process"""
+        return self._pid == os.getpid()
+
+
+def start_daemon(target: Callable[[], None], name: str) -> threading.Thread:
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+def lazy_thread(target: Callable[[], None], name: str) -> PerProcess[threading.Thread]:
+    """A daemon thread running `target`, started by the first get() in each process"""
+    return PerProcess(lambda: start_daemon(target, name))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+/api/music/bulk-discover latency: one keyword after another vs the concurrent fan-out
+Each keyword's external search is replaced by a sleep of a set latency (one
+keyword can be made a straggler past the deadline), with the search cache
+off so every request pays it.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+KEYWORDS = ['jazz', 'blue', 'piano', 'lofi', 'ambient', 'chill', 'acoustic', 'focus']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk music discovery')
+    parser.add_argument('--latency-ms', type=float, default=250, help='external search latency per keyword')
+    parser.add_argument('--straggler-ms', type=float, default=0, help='latency of the last keyword (0: same)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    os.environ['HECKX_SEARCH_CACHE'] = '0'
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    import app
+    sys.stdout = stdout
+
+    service = app.music_service
+    original = service.search_pixabay
+
+    def slow_search(query):
+        straggler = query == KEYWORDS[-1] and args.straggler_ms
+        time.sleep((args.straggler_ms if straggler else args.latency_ms) / 1000)
+        return original(query)
+    service.search_pixabay = slow_search
+
+    def sequential():
+        # What the endpoint did before: search each keyword in turn, sort everything
+        tracks = []
+        for keyword in KEYWORDS:
+            tracks.extend(service.search_music(keyword))
+        return sorted(tracks, key=lambda x: x.get('downloads', 0), reverse=True)[:10]
+
+    client = app.app.test_client()
+
+    def concurrent():
+        return client.post('/api/music/bulk-discover', json={'keywords': KEYWORDS, 'max_tracks': 10}).get_json()
+
+    print(f"{len(KEYWORDS)} keywords, {args.latency_ms:.0f} ms each"
+          + (f", '{KEYWORDS[-1]}' takes {args.straggler_ms:.0f} ms" if args.straggler_ms else '')
+          + f", deadline {app.DISCOVER_DEADLINE_S:.0f} s")
+    for label, fn in (('sequential', sequential), ('concurrent', concurrent)):
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = fn()
+            samples.append((time.perf_counter() - started) * 1000)
+        note = ''
+        if isinstance(result, dict):
+            note = f"  {result['total_discovered']} tracks, timed out: {result['timed_out_keywords'] or 'none'}"
+        print(f"{label:<11} median {statistics.median(samples):8.1f} ms{note}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Per-worker music library startup: delete-and-reseed vs the startup coordinator
+N worker processes start against one music library, either at the same
+moment (like gunicorn booting) or one after another (like worker restarts),
+and each times its own startup step.
+  legacy       what app.py did on import: delete the file, migrate, seed
+  coordinator  migrations.migrate() with the startup lock and read-only check
+Also reports how many tracks survive, since the legacy path throws them away.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db
+import migrations
+
+DEMO_TRACKS = [('demo', f'demo_{i}', f'Demo Track {i}', 'Demo Artist', 'demo, chill',
+                'https://example.com/a.mp3', 'https://example.com/a.mp3', 180, 5000, 250, 'lofi', 'focus')
+               for i in range(4)]
+
+
+def seed(conn):
+    # Same shape as SimpleMusicService._seed_demo_tracks
+    if conn.execute('SELECT COUNT(*) FROM music_tracks').fetchone()[0] == 0:
+        conn.executemany('''
+            INSERT INTO music_tracks
+            (source, external_id, title, artist, tags, download_url, preview_url,
+             duration, downloads, likes, genre, mood)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', DEMO_TRACKS)
+
+
+def legacy_startup(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = db.get_connection(path)
+    conn.execute(f'PRAGMA busy_timeout = {migrations.MIGRATION_LOCK_TIMEOUT_MS}')
+    with db.transaction(path) as conn:
+        migrations.apply_migrations(conn, migrations.MUSIC_MIGRATIONS)
+    with db.transaction(path) as conn:
+        seed(conn)
+
+
+def coordinator_startup(path):
+    migrations.migrate(path, migrations.MUSIC_MIGRATIONS, seed)
+
+
+def worker(mode, path, barrier, results):
+    sys.stdout = open(os.devnull, 'w')  # migration progress lines
+    barrier.wait()
+    started = time.perf_counter()
+    try:
+        (legacy_startup if mode == 'legacy' else coordinator_startup)(path)
+        results.put((time.perf_counter() - started) * 1000)
+    except Exception as e:
+        results.put(f'{type(e).__name__}: {e}')
+
+
+def build_library(path, size):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('BEGIN')
+    migrations.apply_migrations(conn, migrations.MUSIC_MIGRATIONS)
+    conn.executemany('''
+        INSERT INTO music_tracks (source, external_id, title, artist, tags, genre, mood, downloads, likes)
+        VALUES ('pixabay', ?, ?, 'Artist', 'chill, beats', 'lofi', 'focus', ?, ?)
+    ''', ((str(i), f'Track {i}', i % 1000, i % 100) for i in range(size)))
+    conn.execute('COMMIT')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+
+
+def run(mode, path, workers):
+    ctx = multiprocessing.get_context('fork')
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, path, barrier, results)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    outcomes = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    times = [o for o in outcomes if isinstance(o, float)]
+    errors = [o for o in outcomes if isinstance(o, str)]
+    try:
+        conn = sqlite3.connect(path)
+        tracks = conn.execute('SELECT COUNT(*) FROM music_tracks').fetchone()[0]
+        conn.close()
+    except sqlite3.Error as e:
+        tracks = f'unreadable ({e})'
+    return times, errors, tracks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-worker music library startup')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--tracks', type=int, default=100000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    template = os.path.join(workdir, 'template.db')
+    build_library(template, args.tracks)
+    print(f"{args.workers} workers, library of {args.tracks:,} tracks\n")
+    print(f"{'scenario':<38} {'median ms':>10} {'max ms':>8} {'errors':>7}  tracks after")
+
+    scenarios = [
+        ('legacy, existing, one at a time', 'legacy', True, False),
+        ('coordinator, existing, one at a time', 'coordinator', True, False),
+        ('legacy, existing library', 'legacy', True, True),
+        ('coordinator, existing library', 'coordinator', True, True),
+        ('legacy, first boot', 'legacy', False, True),
+        ('coordinator, first boot', 'coordinator', False, True),
+    ]
+    for n, (label, mode, existing, together) in enumerate(scenarios):
+        path = os.path.join(workdir, f'music_{n}.db')
+        if existing:
+            shutil.copy(template, path)
+        if together:
+            times, errors, tracks = run(mode, path, args.workers)
+        else:
+            times, errors = [], []
+            for _ in range(args.workers):
+                one_times, one_errors, tracks = run(mode, path, 1)
+                times += one_times
+                errors += one_errors
+        median = f'{statistics.median(times):.1f}' if times else '-'
+        worst = f'{max(times):.1f}' if times else '-'
+        print(f"{label:<38} {median:>10} {worst:>8} {len(errors):>7}  {tracks}")
+        for error in sorted(set(errors)):
+            print(f"    {error}")
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
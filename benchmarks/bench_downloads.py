@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Audio downloads: requests.get(...).content one track at a time vs download_manager
+A local HTTP server (Range support, throttled per connection) serves the
+tracks; every --dupe-every-th track has the same audio as another one.
+  sequential  what MusicDiscoveryService.download_track did, in a loop
+  manager     DownloadManager with N workers, streamed and content-addressed
+  resume      the server drops every first connection halfway through;
+              shows how many bytes the retries had to fetch again
+Peak Python memory is measured with tracemalloc on separate runs.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import download_manager
+
+BLOCK = 64 * 1024
+
+
+class Handler(BaseHTTPRequestHandler):
+    size = 0
+    rate = 0            # bytes per second per connection
+    drop_first = False
+    dupe_every = 0
+    sent = 0
+    dropped = set()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def block(self, n):
+        # 64 KB repeated to make the file, so the server itself holds no whole file in memory
+        seed = n % self.dupe_every if self.dupe_every else n
+        return hashlib.sha256(str(seed).encode()).digest() * (BLOCK // 32) * 2
+
+    def do_GET(self):
+        n = int(re.search(r'(\d+)', self.path).group(1))
+        block, size = self.block(n), self.size
+        start = 0
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{size - 1}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(size - start))
+        self.send_header('ETag', f'"{n}"')
+        self.end_headers()
+
+        drop_at = None
+        with self.lock:
+            if self.drop_first and n not in self.dropped:
+                self.dropped.add(n)
+                drop_at = size // 2
+        for offset in range(start, size, BLOCK):
+            if drop_at is not None and offset >= drop_at:
+                return  # connection closes with the body incomplete
+            chunk = block[offset % BLOCK:offset % BLOCK + min(BLOCK, size - offset)]
+            self.wfile.write(chunk)
+            with self.lock:
+                Handler.sent += len(chunk)
+            if self.rate:
+                time.sleep(len(chunk) / self.rate)
+
+
+def sequential(urls, directory):
+    for i, url in enumerate(urls):
+        response = requests.get(url, timeout=60)
+        if response.status_code == 200:
+            with open(os.path.join(directory, f'track_{i}.mp3'), 'wb') as f:
+                f.write(response.content)
+
+
+def managed(urls, directory, workers):
+    manager = download_manager.DownloadManager(directory, max_workers=workers, per_host=workers)
+    futures = [manager.submit(f'track:{i}', url) for i, url in enumerate(urls)]
+    return [future.result() for future in futures]
+
+
+def timed(label, fn, total_bytes):
+    Handler.sent = 0
+    started = time.perf_counter()
+    fn()
+    took = time.perf_counter() - started
+    print(f"{label:<28} {took:>7.2f} s   {Handler.sent / 1e6:>7.1f} MB transferred (files: {total_bytes / 1e6:.1f} MB)")
+
+
+def peak_mb(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark audio downloads')
+    parser.add_argument('--tracks', type=int, default=12)
+    parser.add_argument('--size-mb', type=float, default=4)
+    parser.add_argument('--rate-mb', type=float, default=8, help='per-connection bandwidth, MB/s')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--dupe-every', type=int, default=4, help='track n has the audio of track n %% this')
+    args = parser.parse_args()
+
+    Handler.size = int(args.size_mb * 1e6)
+    Handler.rate = args.rate_mb * 1e6
+    Handler.dupe_every = args.dupe_every
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f'http://127.0.0.1:{server.server_port}/audio/{i}.mp3' for i in range(args.tracks)]
+    total = args.tracks * Handler.size
+
+    print(f"{args.tracks} tracks x {args.size_mb:.0f} MB at {args.rate_mb:.0f} MB/s per connection, "
+          f"{args.workers} workers\n")
+    timed('sequential .content', lambda: sequential(urls, tempfile.mkdtemp()), total)
+    root = tempfile.mkdtemp()
+    timed('download_manager', lambda: managed(urls, root, args.workers), total)
+    stored = sum(len(files) for _, _, files in os.walk(os.path.join(root, 'objects')))
+    print(f"{'':<28} {stored} distinct files stored for {args.tracks} tracks")
+
+    Handler.drop_first = True
+    timed('sequential, drops (fails)', lambda: _ignore_errors(lambda: sequential(urls, tempfile.mkdtemp())), total)
+    Handler.dropped = set()
+    timed('download_manager, drops', lambda: managed(urls, tempfile.mkdtemp(), args.workers), total)
+    Handler.drop_first = False
+
+    Handler.rate = 0
+    print(f"\npeak Python memory  sequential {peak_mb(lambda: sequential(urls[:2], tempfile.mkdtemp())):.1f} MB"
+          f"   download_manager {peak_mb(lambda: managed(urls[:2], tempfile.mkdtemp(), 1)):.1f} MB")
+    server.shutdown()
+
+
+def _ignore_errors(fn):
+    try:
+        fn()
+    except requests.RequestException as e:
+        print(f"  sequential download failed: {type(e).__name__}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+On-disk size of conversations.db before and after the normalize_quotes migration
+Builds a synthetic history in the pre-normalization schema, measures, migrates, measures again
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import migrations
+from stoic_quotes import StoicQuotesGenerator
+
+CATEGORIES = ['wisdom', 'resilience', 'mindfulness', 'motivation']
+
+
+def file_size_mb(conn, path):
+    conn.execute('VACUUM')
+    return os.path.getsize(path) / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure history storage before/after quote normalization')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    args = parser.parse_args()
+
+    corpus = [(q['quote'], q['author']) for q in StoicQuotesGenerator().thai_quotes]
+    path = os.path.join(tempfile.mkdtemp(), 'conversations.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+
+    # Schema as it was before normalization (version 3)
+    conn.execute('BEGIN')
+    migrations.apply_migrations(conn, [m for m in migrations.CONVERSATIONS_MIGRATIONS if m[0] <= 3])
+    conn.execute('COMMIT')
+
+    rng = random.Random(42)
+    base = time.time() - 365 * 86400
+
+    def rows():
+        for i in range(args.rows):
+            text, author = rng.choice(corpus)
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(base + i * 30))
+            rating = rng.choice([None, None, None, 0, 1, 5])
+            yield (f'user_{rng.randrange(args.users)}', text, author, stamp, rng.choice(CATEGORIES), rating)
+
+    conn.execute('BEGIN')
+    conn.executemany('''
+        INSERT INTO conversations (user_id, message, response, timestamp, category, rating)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows())
+    conn.execute('COMMIT')
+    before = file_size_mb(conn, path)
+
+    started = time.time()
+    conn.execute('BEGIN')
+    migrations.apply_migrations(conn, migrations.CONVERSATIONS_MIGRATIONS)
+    conn.execute('COMMIT')
+    migrate_seconds = time.time() - started
+    after = file_size_mb(conn, path)
+
+    print(f"Rows:       {args.rows:,}")
+    print(f"Before:     {before:,.1f} MB ({before * 1024 * 1024 / args.rows:.0f} bytes/row)")
+    print(f"After:      {after:,.1f} MB ({after * 1024 * 1024 / args.rows:.0f} bytes/row)")
+    print(f"Reduction:  {100 * (1 - after / before):.1f}%")
+    print(f"Migration:  {migrate_seconds:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Music search latency: the old triple-LIKE scan vs music_search.search_tracks
+Builds migrated music libraries of synthetic tracks (100k and 1M by default)
+and times common, rare, prefix and filtered queries
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import migrations
+import music_search
+
+ADJECTIVES = ['smooth', 'chill', 'dark', 'happy', 'epic', 'lazy', 'summer', 'midnight', 'golden', 'dreamy',
+              'urban', 'cosmic', 'gentle', 'rainy', 'electric', 'velvet', 'silent', 'neon', 'autumn', 'lunar']
+NOUNS = ['jazz', 'beats', 'piano', 'guitar', 'vibes', 'waves', 'dreams', 'nights', 'groove', 'sunset',
+         'coffee', 'forest', 'city', 'ocean', 'memories', 'rain', 'garden', 'journey', 'echoes', 'horizon']
+GENRES = ['jazz', 'lofi', 'ambient', 'classical', 'electronic', 'rock', 'acoustic', 'cinematic', 'hiphop', 'pop']
+MOODS = ['calm', 'happy', 'sad', 'energetic', 'focus', 'romantic', 'dark', 'uplifting']
+# (label, query, genre, mood)
+QUERIES = [
+    ('common word', 'jazz', None, None),
+    ('two words', 'midnight piano', None, None),
+    ('prefix', 'velv', None, None),
+    ('rare (artist id)', 'horizon 4242', None, None),
+    ('common + genre', 'jazz', 'lofi', None),
+    ('browse mood', '', None, 'focus'),
+]
+
+
+def synthetic_word(rng):
+    # A long tail of rare words next to the common vocabulary, like real titles
+    return ''.join(rng.choice('bcdfghklmnprstvz') + rng.choice('aeiou') for _ in range(rng.randint(2, 4)))
+
+
+def build_library(path, size, rng):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('BEGIN')
+    migrations.apply_migrations(conn, migrations.MUSIC_MIGRATIONS)
+    conn.executemany('''
+        INSERT INTO music_tracks (source, external_id, title, artist, tags, genre, mood, downloads, likes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', ((
+        'pixabay', str(i),
+        f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {synthetic_word(rng)}',
+        f'{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS).title()} {i % 5000}',
+        ', '.join(rng.sample(ADJECTIVES + NOUNS, 3) + [synthetic_word(rng)]),
+        rng.choice(GENRES), rng.choice(MOODS),
+        int(rng.paretovariate(1.2) * 100), int(rng.paretovariate(1.5) * 10)
+    ) for i in range(size)))
+    conn.execute('COMMIT')
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return conn
+
+
+def like_scan(conn, query, genre, mood):
+    # What search_library did before: three leading-wildcard LIKEs on every row
+    sql = '''
+        SELECT id FROM music_tracks
+        WHERE (title LIKE ? OR artist LIKE ? OR tags LIKE ?)
+    '''
+    params = [f'%{query}%'] * 3
+    if genre:
+        sql += ' AND genre = ?'
+        params.append(genre)
+    if mood:
+        sql += ' AND mood = ?'
+        params.append(mood)
+    return conn.execute(sql + ' ORDER BY downloads DESC, likes DESC LIMIT 20', params).fetchall()
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark music library search')
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    for size in [int(s) for s in args.sizes.split(',')]:
+        path = os.path.join(tempfile.mkdtemp(), 'music_library.db')
+        started = time.perf_counter()
+        conn = build_library(path, size, rng)
+        print(f"\n{size:,} tracks (built and indexed in {time.perf_counter() - started:.0f} s, "
+              f"{os.path.getsize(path) / 1e6:.0f} MB)")
+        print(f"{'query':<18} {'LIKE scan ms':>13} {'search ms':>10} {'hits':>5}")
+        for label, query, genre, mood in QUERIES:
+            like_ms = median_ms(lambda: like_scan(conn, query, genre, mood), max(1, args.repeat // 5))
+            search_ms = median_ms(lambda: music_search.search_tracks(conn, query, genre, mood), args.repeat)
+            hits = len(music_search.search_tracks(conn, query, genre, mood))
+            print(f"{label:<18} {like_ms:>13.1f} {search_ms:>10.2f} {hits:>5}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Playlist reads: comma-separated playlists.track_ids vs playlist_tracks
+Builds the same playlists both ways (2,000 playlists of 200 tracks by
+default) and times
+  list    every playlist with its track count
+  open    one playlist with its tracks' metadata
+  holds   which playlists contain a given track
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db
+import migrations
+import music_ingest
+import playlists
+
+
+def legacy_list(conn):
+    # What GET /api/music/playlists did: parse every track_ids string to count it
+    return [{'id': row[0], 'name': row[1], 'track_count': len([int(x) for x in row[2].split(',') if x])}
+            for row in conn.execute('SELECT id, name, track_ids FROM legacy_playlists ORDER BY created_date DESC')]
+
+
+def legacy_open(conn, playlist_id):
+    # Parse the ids, then look each track up
+    track_ids = conn.execute('SELECT track_ids FROM legacy_playlists WHERE id = ?', (playlist_id,)).fetchone()[0]
+    return [conn.execute('SELECT id, title, artist, duration FROM music_tracks WHERE id = ?', (int(x),)).fetchone()
+            for x in track_ids.split(',') if x]
+
+
+def legacy_holds(conn, track_id):
+    return [row[0] for row in conn.execute('SELECT id, track_ids FROM legacy_playlists')
+            if str(track_id) in row[1].split(',')]
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark playlist storage')
+    parser.add_argument('--tracks', type=int, default=20000)
+    parser.add_argument('--playlists', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=200, help='tracks per playlist')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'music_library.db')
+    migrations.migrate(path, migrations.MUSIC_MIGRATIONS)
+    music_ingest.ingest_tracks(({'source': 'bench', 'external_id': str(i), 'title': f'Track {i}',
+                                 'artist': f'Artist {i % 300}', 'duration': 120 + i % 200}
+                                for i in range(args.tracks)), path=path)
+
+    rng = random.Random(5)
+    with db.transaction(path) as conn:
+        conn.execute('CREATE TABLE legacy_playlists (id INTEGER PRIMARY KEY, name TEXT, track_ids TEXT, '
+                     'created_date DATETIME DEFAULT CURRENT_TIMESTAMP)')
+        for n in range(args.playlists):
+            track_ids = [rng.randint(1, args.tracks) for _ in range(args.size)]
+            playlists.create_playlist(conn, f'Playlist {n}', track_ids)
+            conn.execute('INSERT INTO legacy_playlists (name, track_ids) VALUES (?, ?)',
+                         (f'Playlist {n}', ','.join(map(str, track_ids))))
+    conn = db.get_connection(path)
+    conn.execute('ANALYZE')
+
+    middle = args.playlists // 2
+    cases = [
+        ('list with counts', lambda: legacy_list(conn), lambda: playlists.list_playlists(conn)),
+        ('open one playlist', lambda: legacy_open(conn, middle), lambda: playlists.get_playlist(conn, middle)),
+        ('playlists holding a track', lambda: legacy_holds(conn, 7),
+         lambda: playlists.list_playlists(conn, track_id=7)),
+    ]
+    print(f"{args.playlists:,} playlists x {args.size} tracks\n")
+    print(f"{'query':<26} {'before ms':>10} {'after ms':>9}")
+    for label, old, new in cases:
+        print(f"{label:<26} {median_ms(old, args.repeat):>10.2f} {median_ms(new, args.repeat):>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
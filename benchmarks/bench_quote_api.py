@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for POST /api/quote
+Hammers a running Heckx AI server with N concurrent clients and reports requests/sec
+"""
+import argparse
+import threading
+import time
+
+import requests
+
+
+def run_clients(base_url, clients, duration):
+    """Run `clients` concurrent sessions for `duration` seconds"""
+    url = f"{base_url.rstrip('/')}/api/quote"
+    deadline = time.time() + duration
+    counts = [0] * clients
+    errors = [0] * clients
+
+    def worker(index):
+        session = requests.Session()
+        payload = {'category': 'random', 'user_id': f'bench_{index % 4}'}
+        while time.time() < deadline:
+            try:
+                response = session.post(url, json=payload, timeout=30)
+                if response.status_code == 200:
+                    counts[index] += 1
+                else:
+                    errors[index] += 1
+            except requests.RequestException:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    return {
+        'clients': clients,
+        'requests': sum(counts),
+        'errors': sum(errors),
+        'rps': round(sum(counts) / elapsed, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /api/quote throughput')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--clients', type=int, nargs='+', default=[8, 32])
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"🚀 Benchmarking {args.url}/api/quote for {args.duration:.0f}s per level")
+    for clients in args.clients:
+        result = run_clients(args.url, clients, args.duration)
+        print(f"{result['clients']:>3} clients: {result['rps']:>8} req/s "
+              f"({result['requests']} ok, {result['errors']} errors)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Cost of no-repeat quote picks with many users in memory
+Draws rounds of quotes for every user from a generated corpus, reporting
+draws/sec per round (later rounds hit more already-seen quotes) and the
+memory held by the per-user seen sets (including the LRU itself)
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import quote_index
+import quote_rotation
+
+THEMES = ['wisdom', 'resilience', 'mindfulness', 'motivation', 'growth', 'acceptance', 'control', 'response']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-user quote rotation')
+    parser.add_argument('--quotes', type=int, default=50000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--heavy-user-draws', type=int, default=6000,
+                        help='draws for one user in a single theme, to exercise the near-exhausted path')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    catalog = quote_index.QuoteCatalog(
+        ('thai', theme, 'Seneca', {'quote_id': i, 'category': theme, 'text': f'quote {i}'})
+        for i, theme in ((i, rng.choice(THEMES)) for i in range(1, args.quotes + 1))
+    )
+    rotation = quote_rotation.QuoteRotation(
+        catalog, capacity=args.users, path=os.path.join(tempfile.mkdtemp(), 'rotation.db'), rng=rng
+    )
+    rotation._ensure_started = lambda: None  # nothing to flush to in a benchmark
+    users = [f'user-{i}' for i in range(args.users)]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for user_id in users + ['heavy']:
+        rotation._users[user_id] = quote_rotation.SeenQuotes()  # skip the SQLite lookup on first touch
+    print(f"{args.quotes:,} quotes, {args.users:,} users")
+    print(f"{'round':>6} {'draws/s':>12} {'seen sets MB':>13}")
+    for n in range(1, args.rounds + 1):
+        started = time.perf_counter()
+        for user_id in users:
+            rotation.next_quote(user_id, THEMES[n % len(THEMES)] if n % 2 else None)
+        rate = args.users / (time.perf_counter() - started)
+        held = (tracemalloc.get_traced_memory()[0] - baseline) / 1e6
+        print(f"{n:>6} {rate:>12,.0f} {held:>13.1f}")
+    tracemalloc.stop()
+
+    # One user working through a whole theme: rejection sampling, then the tail list
+    theme_size = catalog.index.count('thai', 'growth')
+    draws = min(args.heavy_user_draws, theme_size)
+    seen = set()
+    started = time.perf_counter()
+    for _ in range(draws):
+        seen.add(rotation.next_quote('heavy', 'growth')['quote_id'])
+    rate = draws / (time.perf_counter() - started)
+    print(f"heavy user: {draws:,} of {theme_size:,} 'growth' quotes, {len(seen):,} distinct, {rate:,.0f} draws/s")
+
+
+if __name__ == '__main__':
+    main()
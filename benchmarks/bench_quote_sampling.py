@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Per-call cost of a filtered random quote pick as the corpus grows
+Compares the old list-comprehension filter with QuoteIndex.sample on corpora
+loaded from a generated JSON file
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import quote_index
+
+THEMES = ['wisdom', 'resilience', 'mindfulness', 'motivation', 'growth', 'acceptance', 'control', 'response']
+AUTHORS = ['Epictetus', 'Marcus Aurelius', 'Seneca', 'Zeno', 'Musonius Rufus']
+
+
+def write_corpus(path, size, rng):
+    quotes = [{
+        'text': f'quote {i}',
+        'author': rng.choice(AUTHORS),
+        'theme': rng.choice(THEMES),
+        'language': 'thai' if i % 3 else 'english'
+    } for i in range(size)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(quotes, f)
+
+
+def per_call_us(fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) * 1e6 / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark filtered quote sampling')
+    parser.add_argument('--sizes', default='100,1000,10000,50000')
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    path = os.path.join(tempfile.mkdtemp(), 'corpus.json')
+
+    print(f"{'quotes':>8} {'load+index ms':>14} {'filter us/call':>15} {'index us/call':>14}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        write_corpus(path, size, rng)
+        started = time.perf_counter()
+        quotes = quote_index.load_corpus(path)
+        catalog = quote_index.QuoteCatalog(quote_index.entries_for(quotes))
+        build_ms = (time.perf_counter() - started) * 1000
+
+        thai = [q for q in quotes if q['language'] == 'thai']
+
+        def filtered():
+            # What StoicQuotesGenerator.get_random_quote used to do per call
+            return random.choice([q for q in thai if q.get('theme') == 'growth'])
+
+        def indexed():
+            return catalog.sample('thai', 'growth')
+
+        calls = max(200, args.calls * 100 // size) if size > 100 else args.calls
+        print(f"{size:>8,} {build_ms:>14.1f} {per_call_us(filtered, calls):>15.2f} "
+              f"{per_call_us(indexed, args.calls):>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
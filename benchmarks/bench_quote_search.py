@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Latency of quote and history search on a large synthetic database
+Builds a migrated conversations.db with a Thai quote corpus and a 1M-row
+history (plus one heavy user), then times search_quotes/search_history for
+long (trigram index) and short (LIKE) terms, next to a plain LIKE scan of
+the whole history
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import migrations
+import quote_search
+
+WORDS = ['ความสุข', 'จิตใจ', 'ชีวิต', 'ความทุกข์', 'ปัญญา', 'อดทน', 'ปัจจุบัน', 'ความกลัว', 'ธรรมชาติ',
+         'เหตุการณ์', 'การกระทำ', 'ความจริง', 'อุปสรรค', 'ใจ', 'คน', 'ทาง', 'เวลา', 'ความรัก', 'สงบ', 'พลัง',
+         'ไม่', 'คือ', 'ของ', 'ใน', 'และ', 'ที่', 'เป็น', 'จะ', 'ได้', 'มี']
+AUTHORS = ['Epictetus', 'Marcus Aurelius', 'Seneca', 'Zeno', 'Musonius Rufus', 'Buddha', 'Lao Tzu']
+CATEGORIES = ['wisdom', 'resilience', 'mindfulness', 'motivation']
+QUERIES = [('ความสุข', 'long'), ('ความกลัว ปัญญา', 'long'), ('อุปสรรค ใจ', 'long+short'), ('ใจ', 'short')]
+
+
+def timed_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Thai full-text search over quotes and history')
+    parser.add_argument('--quotes', type=int, default=50_000)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--heavy-user-rows', type=int, default=50_000, help='history rows for one heavy user')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    path = os.path.join(tempfile.mkdtemp(), 'conversations.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+
+    started = time.perf_counter()
+    conn.execute('BEGIN')
+    migrations.apply_migrations(conn, migrations.CONVERSATIONS_MIGRATIONS)
+    conn.executemany('INSERT INTO quotes (id, category, text, author) VALUES (?, ?, ?, ?)', [
+        (i, rng.choice(CATEGORIES), ''.join(rng.choices(WORDS, k=rng.randint(6, 14))) + f' {i}', rng.choice(AUTHORS))
+        for i in range(1, args.quotes + 1)
+    ])
+    conn.executemany('INSERT INTO conversations (user_id, quote_id, created_at) VALUES (?, ?, ?)', (
+        (f'user-{rng.randrange(args.users)}', rng.randint(1, args.quotes), 1700000000 + i)
+        for i in range(args.rows)
+    ))
+    conn.executemany('INSERT INTO conversations (user_id, quote_id, created_at) VALUES (?, ?, ?)', (
+        ('heavy', rng.randint(1, args.quotes), 1700000000 + i) for i in range(args.heavy_user_rows)
+    ))
+    conn.execute('COMMIT')
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')  # steady state: reads from the main file, not a 1M-row WAL
+    print(f"Built {args.quotes:,} quotes and {args.rows + args.heavy_user_rows:,} history rows in {time.perf_counter() - started:.0f} s")
+
+    print(f"{'query':<18} {'kind':<11} {'quotes ms':>10} {'history ms':>11} {'heavy user ms':>14} "
+          f"{'history LIKE scan ms':>21}")
+    for query, kind in QUERIES:
+        quotes_ms, _ = timed_ms(lambda: quote_search.search_quotes(conn, query), args.repeat)
+        history_ms, _ = timed_ms(lambda: quote_search.search_history(conn, 'user-7', query), args.repeat)
+        heavy_ms, _ = timed_ms(lambda: quote_search.search_history(conn, 'heavy', query), args.repeat)
+        # What a naive implementation would do: LIKE over every history row joined to its text
+        scan_ms, _ = timed_ms(lambda: conn.execute('''
+            SELECT c.id FROM conversations c JOIN quotes q ON q.id = c.quote_id
+            WHERE q.text LIKE ? LIMIT 20
+        ''', (f'%{query.split()[-1]}%_x',)).fetchall(), 1)
+        print(f"{query:<18} {kind:<11} {quotes_ms:>10.2f} {history_ms:>11.2f} {heavy_ms:>14.2f} {scan_ms:>21.1f}")
+
+if __name__ == '__main__':
+    main()
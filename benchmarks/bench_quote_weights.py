@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Draws/sec of rating-weighted quote sampling at 50k quotes
+Builds the alias tables from generated ratings and compares weighted draws
+(global, one category, personalized) with a plain uniform pick and with a
+linear-scan weighted pick (random.choices), plus the cost of rebuilds
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import quote_index
+import quote_weights
+
+THEMES = ['wisdom', 'resilience', 'mindfulness', 'motivation', 'growth', 'acceptance', 'control', 'response']
+
+
+def per_sec(fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return calls / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark rating-weighted quote sampling')
+    parser.add_argument('--quotes', type=int, default=50000)
+    parser.add_argument('--rated', type=float, default=0.3, help='share of quotes with ratings')
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    catalog = quote_index.QuoteCatalog(
+        ('thai', theme, 'Seneca', {'quote_id': i, 'category': theme, 'text': f'quote {i}'})
+        for i, theme in ((i, rng.choice(THEMES)) for i in range(1, args.quotes + 1))
+    )
+    weights = quote_weights.QuoteWeights(catalog, rng=rng)
+    weights._ensure_started = lambda: None  # driven by hand, no database behind it
+    for quote_id in range(1, args.quotes + 1):
+        if rng.random() < args.rated:
+            count = rng.randint(1, 20)
+            weights._ratings[quote_id] = [sum(rng.randint(1, 5) for _ in range(count)), count]
+
+    started = time.perf_counter()
+    weights._rebuild(catalog.index, None)
+    full_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    weights._apply([(rng.randint(1, args.quotes), 5, 1) for _ in range(50)])
+    weights._rebuild(catalog.index, {rng.randint(1, args.quotes)})
+    one_ms = (time.perf_counter() - started) * 1000
+
+    weights._profiles['u'] = quote_weights.UserProfile({'growth': 2.0, 'control': 0.5})
+
+    # The same distribution the alias tables encode, drawn by a cumulative scan each time
+    quotes = catalog.index.quotes()
+    flat = [quote_weights.rating_factor(*weights._ratings.get(q['quote_id'], (0, 0))) for q in quotes]
+
+    print(f"{args.quotes:,} quotes, {len(weights._ratings):,} rated")
+    print(f"full rebuild {full_ms:.1f} ms, one-category rebuild {one_ms:.1f} ms")
+    print(f"{'draw':<28} {'draws/s':>12}")
+    for name, fn, calls in [
+        ('uniform (index.sample)', lambda: catalog.index.sample(rng=rng), args.calls),
+        ('weighted, any category', lambda: weights.sample(), args.calls),
+        ('weighted, one category', lambda: weights.sample(None, 'growth'), args.calls),
+        ('weighted, personalized', lambda: weights.sample('u'), args.calls),
+        ('random.choices (linear)', lambda: rng.choices(quotes, weights=flat), max(50, args.calls // 1000)),
+    ]:
+        print(f"{name:<28} {per_sec(fn, calls):>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
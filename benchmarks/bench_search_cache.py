@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Pixabay search load with and without search_cache.SearchCache
+Worker processes (like gunicorn workers) each run threads issuing searches
+for a few popular queries against a fake API with fixed latency, and we
+count the upstream calls and time every lookup.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db
+import migrations
+import search_cache
+
+QUERIES = ['jazz', 'Jazz ', 'lofi', 'piano', 'blues', 'ambient', 'chill', 'focus']
+
+
+def worker(mode, path, args, barrier, upstream, results):
+    sys.stdout = open(os.devnull, 'w')
+    cache = search_cache.SearchCache(path=path) if mode == 'cached' else None
+
+    def fetch(query):
+        with upstream.get_lock():
+            upstream.value += 1
+        time.sleep(args.latency_ms / 1000)
+        if args.fail and query.strip().lower() == 'ambient':
+            raise RuntimeError('Pixabay API error: 503')
+        return [{'title': f'{query} {i}', 'downloads': i} for i in range(20)]
+
+    def lookup(query):
+        if cache is None:
+            return fetch(query)
+        return cache.get(search_cache.cache_key('pixabay', query, per_page=20), lambda: fetch(query))
+
+    timings = []
+
+    def run_thread(n):
+        for i in range(args.requests):
+            query = QUERIES[(n + i) % len(QUERIES)]
+            started = time.perf_counter()
+            try:
+                lookup(query)
+            except Exception:
+                pass  # the app falls back to demo tracks
+            timings.append((time.perf_counter() - started) * 1000)
+
+    barrier.wait()
+    threads = [threading.Thread(target=run_thread, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(timings)
+
+
+def run(mode, path, args):
+    ctx = multiprocessing.get_context('fork')
+    barrier, upstream, results = ctx.Barrier(args.workers), ctx.Value('i', 0), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, path, args, barrier, upstream, results))
+             for _ in range(args.workers)]
+    started = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    timings = [t for _ in procs for t in results.get()]
+    for proc in procs:
+        proc.join()
+    return timings, upstream.value, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the shared search cache')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help='searches per thread')
+    parser.add_argument('--latency-ms', type=float, default=300)
+    parser.add_argument('--fail', action='store_true', help="make 'ambient' searches fail")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'music_library.db')
+    migrations.migrate(path, migrations.MUSIC_MIGRATIONS)
+    db.close_all()
+
+    total = args.workers * args.threads * args.requests
+    print(f"{total:,} searches from {args.workers} workers x {args.threads} threads, "
+          f"{len(QUERIES)} queries, {args.latency_ms:.0f} ms API latency")
+    print(f"{'mode':<10} {'upstream calls':>15} {'p50 ms':>8} {'p99 ms':>8} {'wall s':>7}")
+    for mode in ('uncached', 'cached'):
+        timings, calls, wall = run(mode, path, args)
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        print(f"{mode:<10} {calls:>15,} {statistics.median(timings):>8.2f} {p99:>8.1f} {wall:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Catalog import: one INSERT transaction per track vs music_ingest.ingest_tracks
+Streams a generated catalog (50k tracks by default) into a migrated music
+library: first import, an identical re-import, and a re-import where 10% of
+the tracks changed. Peak Python memory is measured with tracemalloc on a
+separate re-import, since tracing slows everything down.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db
+import migrations
+import music_ingest
+
+
+def catalog(size, changed_every=0):
+    for i in range(size):
+        downloads = 1000 + i % 5000
+        if changed_every and i % changed_every == 0:
+            downloads += 1
+        yield {
+            'source': 'pixabay', 'external_id': str(i), 'title': f'Track {i}', 'artist': f'Artist {i % 700}',
+            'tags': 'chill, lofi, study', 'download_url': f'https://cdn.example.com/{i}.mp3',
+            'preview_url': f'https://cdn.example.com/{i}.mp3', 'duration': 120 + i % 200,
+            'downloads': downloads, 'likes': i % 300
+        }
+
+
+def per_track_insert(tracks, path):
+    # What _save_track_to_db did: a write transaction and a plain INSERT per track
+    for track in tracks:
+        with db.transaction(path) as conn:
+            conn.execute('''
+                INSERT INTO music_tracks (source, external_id, title, artist, tags, download_url, preview_url,
+                                          duration, downloads, likes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', tuple(track[c] for c in ('source', 'external_id', 'title', 'artist', 'tags', 'download_url',
+                                          'preview_url', 'duration', 'downloads', 'likes')))
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    result = fn()
+    print(f"{label:<36} {time.perf_counter() - started:>7.2f} s  {result or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark music catalog ingest')
+    parser.add_argument('--tracks', type=int, default=50000)
+    parser.add_argument('--legacy-tracks', type=int, default=5000, help='tracks for the per-track baseline')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    legacy_path = os.path.join(workdir, 'legacy.db')
+    path = os.path.join(workdir, 'music_library.db')
+    for p in (legacy_path, path):
+        migrations.migrate(p, migrations.MUSIC_MIGRATIONS[:5] if p == legacy_path else migrations.MUSIC_MIGRATIONS)
+
+    timed(f'per-track INSERT, {args.legacy_tracks:,} tracks',
+          lambda: per_track_insert(catalog(args.legacy_tracks), legacy_path))
+    timed('per-track INSERT again (duplicates)', lambda: per_track_insert(catalog(args.legacy_tracks), legacy_path))
+    rows = db.get_connection(legacy_path).execute('SELECT COUNT(*) FROM music_tracks').fetchone()[0]
+    print(f"{'':<36} legacy library now holds {rows:,} rows for {args.legacy_tracks:,} tracks\n")
+
+    timed(f'ingest_tracks, {args.tracks:,} new', lambda: music_ingest.ingest_tracks(catalog(args.tracks), path=path))
+    timed('ingest_tracks, identical re-import', lambda: music_ingest.ingest_tracks(catalog(args.tracks), path=path))
+    timed('ingest_tracks, 10% changed', lambda: music_ingest.ingest_tracks(catalog(args.tracks, 10), path=path))
+    rows = db.get_connection(path).execute('SELECT COUNT(*) FROM music_tracks').fetchone()[0]
+    print(f"{'':<36} library holds {rows:,} rows")
+
+    tracemalloc.start()
+    music_ingest.ingest_tracks(catalog(args.tracks, 7), path=path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"\npeak Python memory while re-importing {args.tracks:,} tracks: {peak / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Genre / mood / tag browsing and "top by quality" before and after the stored columns
+Builds a library through music_ingest (100k tracks by default), then times
+  before  substring scans of the tags string and ranking computed per query
+  after   the stored genre/mood/quality_score columns and the track_tags index
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db
+import migrations
+import music_ingest
+import track_tags
+
+WORDS = ['jazz', 'blues', 'piano', 'ambient', 'lofi', 'chill', 'study', 'synth', 'acoustic', 'guitar',
+         'calm', 'relax', 'focus', 'happy', 'dark', 'love', 'upbeat', 'sad', 'cinematic', 'summer',
+         'night', 'coffee', 'rain', 'travel', 'corporate', 'epic', 'drums', 'strings', 'vlog', 'nature']
+
+
+def catalog(size, rng):
+    for i in range(size):
+        yield {
+            'source': 'pixabay', 'external_id': str(i), 'title': f'Track {i}', 'artist': f'Artist {i % 900}',
+            'tags': ', '.join(rng.sample(WORDS, 4)), 'duration': rng.randint(60, 400),
+            'downloads': int(rng.paretovariate(1.2) * 200), 'likes': int(rng.paretovariate(1.5) * 20)
+        }
+
+
+def before(conn, genre=None, tag=None, limit=20):
+    # Genre by substring checks on every row's tags, quality computed per row, then a full sort
+    rows = conn.execute('SELECT id, tags, downloads, likes, duration FROM music_tracks').fetchall()
+    hits = [(track_tags.quality_score(d, l, s), track_id) for track_id, tags, d, l, s in rows
+            if (not genre or track_tags.extract_genre(tags) == genre)
+            and (not tag or tag in track_tags.normalize_tags(tags))]
+    return sorted(hits, reverse=True)[:limit]
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark derived track columns and the tag index')
+    parser.add_argument('--tracks', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'music_library.db')
+    migrations.migrate(path, migrations.MUSIC_MIGRATIONS)
+    started = time.perf_counter()
+    music_ingest.ingest_tracks(catalog(args.tracks, random.Random(3)), path=path)
+    conn = db.get_connection(path)
+    conn.execute('ANALYZE')
+    print(f"{args.tracks:,} tracks ingested in {time.perf_counter() - started:.1f} s\n")
+
+    cases = [
+        ('top 20 jazz', lambda: before(conn, genre='jazz'), lambda: track_tags.top_tracks(conn, genre='jazz')),
+        ('top 20 tagged "rain"', lambda: before(conn, tag='rain'), lambda: track_tags.top_tracks(conn, tag='rain')),
+        ('top 20 lofi + "coffee"', lambda: before(conn, 'lofi', 'coffee'),
+         lambda: track_tags.top_tracks(conn, genre='lofi', tag='coffee')),
+    ]
+    print(f"{'query':<26} {'before ms':>10} {'after ms':>9}")
+    for label, old, new in cases:
+        print(f"{label:<26} {median_ms(old, args.repeat):>10.2f} {median_ms(new, args.repeat * 20):>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite access layer for Heckx AI
+Pooled WAL-mode connections shared by the web app, music discovery and Drive services
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+CONVERSATIONS_DB = os.environ.get('HECKX_CONVERSATIONS_DB', 'conversations.db')
+MUSIC_DB = os.environ.get('HECKX_MUSIC_DB', 'music_library.db')
+
+# Connection tuning (override via environment)
+BUSY_TIMEOUT_MS = int(os.environ.get('HECKX_SQLITE_BUSY_TIMEOUT_MS', 5000))
+CACHE_SIZE_KB = int(os.environ.get('HECKX_SQLITE_CACHE_KB', 16384))
+MMAP_SIZE_BYTES = int(os.environ.get('HECKX_SQLITE_MMAP_BYTES', 64 * 1024 * 1024))
+POOL_SIZE = int(os.environ.get('HECKX_SQLITE_POOL_SIZE', 32))
+STATEMENT_CACHE_SIZE = 256
+BEGIN_RETRIES = 5
+
+# Each thread (each greenlet under gevent, where threading.local is patched)
+# holds at most one connection per database. Request handlers hand theirs
+# back to the idle pool via release(); long-lived threads simply keep theirs.
+_local = threading.local()
+_pool_lock = threading.Lock()
+_idle = {}
+_pool_pid = os.getpid()
+_generation = 0
+
+# Write-lock hold times per database (this process only), see lock_metrics()
+_metrics_lock = threading.Lock()
+_lock_metrics = {}
+
+
+def _open(path: str) -> sqlite3.Connection:
+    """Open and tune a new connection"""
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000.0,
+        isolation_level=None,  # explicit transactions only, see transaction()
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False  # connections move between threads via the idle pool
+    )
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    # Only takes effect on a brand-new file, and must precede the WAL switch;
+    # lets retention.py hand freed pages back with incremental_vacuum
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE_BYTES}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+
+def _local_pool() -> dict:
+    """Connections bound to the current thread, reset after fork or close_all()"""
+    global _pool_pid
+    pid = os.getpid()
+    if _pool_pid != pid:
+        # Forked worker: never reuse the parent's sqlite handles
+        with _pool_lock:
+            if _pool_pid != pid:
+                _idle.clear()
+                _pool_pid = pid
+
+    pool = getattr(_local, 'connections', None)
+    if pool is None or _local.pid != pid or _local.generation != _generation:
+        pool = _local.connections = {}
+        _local.pid = pid
+        _local.generation = _generation
+    return pool
+
+
+def get_connection(path: str = CONVERSATIONS_DB) -> sqlite3.Connection:
+    """Get this thread's connection to `path`, taking one from the pool if needed"""
+    pool = _local_pool()
+    conn = pool.get(path)
+    if conn is None:
+        with _pool_lock:
+            idle = _idle.get(path)
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = _open(path)
+        pool[path] = conn
+    return conn
+
+
+def release():
+    """Return this thread's connections to the idle pool (end of request)"""
+    pool = getattr(_local, 'connections', None)
+    if not pool or _local.pid != os.getpid() or _local.generation != _generation:
+        return
+
+    for path, conn in list(pool.items()):
+        del pool[path]
+        if conn.in_transaction:
+            conn.rollback()
+        with _pool_lock:
+            idle = _idle.setdefault(path, [])
+            if len(idle) < POOL_SIZE:
+                idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+def _begin(conn: sqlite3.Connection, mode: str):
+    """BEGIN with a short retry loop on top of busy_timeout"""
+    for attempt in range(BEGIN_RETRIES):
+        try:
+            conn.execute(f'BEGIN {mode}')
+            return
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) or attempt == BEGIN_RETRIES - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+@contextmanager
+def transaction(path: str = CONVERSATIONS_DB, mode: str = 'IMMEDIATE'):
+    """Run a block in a single write transaction on the pooled connection.
+
+    IMMEDIATE takes the write lock up front so concurrent writers queue on
+    busy_timeout instead of failing halfway with "database is locked".
+    Nested use joins the outer transaction.
+    """
+    conn = get_connection(path)
+    if conn.in_transaction:
+        yield conn
+        return
+
+    _begin(conn, mode)
+    started = time.perf_counter()
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        if mode != 'DEFERRED':
+            _record_hold(path, time.perf_counter() - started)
+
+
+def _record_hold(path: str, seconds: float):
+    with _metrics_lock:
+        stats = _lock_metrics.get(path)
+        if stats is None:
+            stats = _lock_metrics[path] = {'transactions': 0, 'total': 0.0, 'max': 0.0, 'max_at': None}
+        stats['transactions'] += 1
+        stats['total'] += seconds
+        if seconds > stats['max']:
+            stats['max'] = seconds
+            stats['max_at'] = time.time()
+
+
+def lock_metrics() -> dict:
+    """Write transactions, average and longest write-lock hold (ms) per database"""
+    with _metrics_lock:
+        return {
+            os.path.basename(path): {
+                'transactions': stats['transactions'],
+                'avg_hold_ms': round(stats['total'] * 1000 / stats['transactions'], 3),
+                'max_hold_ms': round(stats['max'] * 1000, 3),
+                'max_hold_at': stats['max_at']
+            }
+            for path, stats in _lock_metrics.items()
+        }
+
+
+def reset_lock_metrics():
+    with _metrics_lock:
+        _lock_metrics.clear()
+
+
+def close_all():
+    """Close idle pooled connections and detach every thread from its own"""
+    global _generation
+    with _pool_lock:
+        idle = [conn for conns in _idle.values() for conn in conns]
+        _idle.clear()
+        _generation += 1
+
+    pool = getattr(_local, 'connections', None) or {}
+    for conn in idle + list(pool.values()):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.connections = None
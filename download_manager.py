@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Resumable, content-addressed audio downloads for the Heckx AI music library
+Each download streams to partial/<key>.part in CHUNK_SIZE pieces, so memory
+stays flat whatever the file size. A dropped connection (or a restart) picks
+up where the partial file ends with a Range request; If-Range makes the
+server send the whole file again if it changed in between.
+
+A finished file is checked against the size the server announced (and the
+expected size / SHA-256 when the caller knows them), then moved to
+objects/<sha[:2]>/<sha256><suffix>. The same audio under two tracks or two
+URLs is stored once.
+
+At most max_workers downloads run at a time, and at most per_host against
+one host; the rest wait in per-host queues, so one slow CDN can't hold every
+worker. Submitting a track that is already queued or downloading returns the
+same future. progress(key) reports queued / downloading / verifying / done /
+failed with byte counts; it covers this process only.
+
+    HECKX_DOWNLOAD_DIR        where files go (downloads are off without it in app.py)
+    HECKX_DOWNLOAD_WORKERS    concurrent downloads (default 4)
+    HECKX_DOWNLOAD_PER_HOST   concurrent downloads per host (default 2)
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+import background
+
+CHUNK_SIZE = 256 * 1024
+CONNECT_TIMEOUT_S = 10
+READ_TIMEOUT_S = 60        # between chunks, not for the whole file
+ATTEMPTS = 3               # each retry resumes from the partial file
+MAX_PROGRESS_ENTRIES = 1000
+
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class DownloadFailed(Exception):
+    """A download that retrying won't fix: bad status, wrong size or hash"""
+
+
+class _Interrupted(IOError):
+    """The body ended early; retried from where the partial file ends"""
+
+
+class DownloadManager:
+    def __init__(self, root, max_workers: int = 4, per_host: int = 2, chunk_size: int = CHUNK_SIZE,
+                 attempts: int = ATTEMPTS):
+        self.root = Path(root)
+        self.objects_dir = self.root / 'objects'
+        self.partial_dir = self.root / 'partial'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.chunk_size = chunk_size
+        self.attempts = attempts
+
+        self._lock = threading.Lock()
+        self._progress: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._waiting: Dict[str, deque] = {}
+        self._active: Dict[str, int] = {}
+        self._sessions = threading.local()
+        self._executor = background.PerProcess(self._start_workers)
+
+    def _start_workers(self) -> ThreadPoolExecutor:
+        # A forked worker doesn't inherit the parent's queue; called with _lock held
+        self._futures, self._waiting, self._active = {}, {}, {}
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='download')
+
+    def _workers(self) -> ThreadPoolExecutor:
+        # Called with _lock held
+        return self._executor.get()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._sessions, 'session', None)
+        if session is None:
+            session = self._sessions.session = requests.Session()
+        return session
+
+    # --- queueing -----------------------------------------------------------
+
+    def submit(self, key: str, url: str, expected_size: int = None, expected_sha256: str = None,
+               suffix: str = '.mp3') -> Future:
+        """Queue a download of `url` for track `key`; the future resolves to {'path', 'size', 'sha256'}"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            executor = self._workers()
+            if key in self._futures:
+                return self._futures[key]
+            future = self._futures[key] = Future()
+            self._set_progress(key, state='queued', url=url, bytes=0, total=expected_size, path=None,
+                               sha256=None, error=None)
+            self._waiting.setdefault(host, deque()).append(
+                (key, url, expected_size, expected_sha256 and expected_sha256.lower(), suffix, future))
+            self._dispatch(host, executor)
+        return future
+
+    def download(self, key: str, url: str, **kwargs) -> Dict:
+        """Blocking submit(); raises DownloadFailed or the last network error"""
+        return self.submit(key, url, **kwargs).result()
+
+    def _dispatch(self, host: str, executor: ThreadPoolExecutor):
+        # Called with _lock held
+        waiting = self._waiting.get(host)
+        while waiting and self._active.get(host, 0) < self.per_host:
+            self._active[host] = self._active.get(host, 0) + 1
+            executor.submit(self._run, host, *waiting.popleft())
+        if not waiting:
+            self._waiting.pop(host, None)
+
+    def _run(self, host, key, url, expected_size, expected_sha256, suffix, future):
+        try:
+            result = self._download(key, url, expected_size, expected_sha256, suffix)
+            with self._lock:
+                self._set_progress(key, state='done', path=result['path'], sha256=result['sha256'],
+                                   bytes=result['size'], total=result['size'])
+            future.set_result(result)
+        except Exception as e:
+            with self._lock:
+                self._set_progress(key, state='failed', error=str(e))
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._futures.pop(key, None)
+                self._active[host] -= 1
+                self._dispatch(host, self._workers())
+
+    # --- progress -----------------------------------------------------------
+
+    def _set_progress(self, key: str, **fields):
+        # Called with _lock held
+        entry = self._progress.get(key)
+        if entry is None:
+            entry = self._progress[key] = {'key': key}
+            while len(self._progress) > MAX_PROGRESS_ENTRIES:
+                oldest = next(iter(self._progress))
+                if self._progress[oldest]['state'] not in ('done', 'failed'):
+                    break
+                self._progress.popitem(last=False)
+        entry.update(fields, updated_at=time.time())
+
+    def progress(self, key: str) -> Optional[Dict]:
+        """Copy of the latest state of a track's download, or None if this process never saw it"""
+        entry = self._progress.get(key)
+        return dict(entry) if entry is not None else None
+
+    # --- one download -------------------------------------------------------
+
+    def object_path(self, sha256: str, suffix: str = '.mp3') -> Path:
+        return self.objects_dir / sha256[:2] / f'{sha256}{suffix}'
+
+    def _download(self, key, url, expected_size, expected_sha256, suffix) -> Dict:
+        if expected_sha256:
+            stored = self.object_path(expected_sha256, suffix)
+            if stored.exists():
+                return {'path': str(stored), 'size': stored.stat().st_size, 'sha256': expected_sha256}
+
+        partial = self.partial_dir / (hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '.part')
+        error = None
+        for attempt in range(self.attempts):
+            if attempt:
+                time.sleep(min(2 ** attempt * 0.5, 10))
+            try:
+                self._fetch(key, url, partial)
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    _Interrupted) as e:
+                error = e
+                print(f"⚠️ Download of {key} interrupted ({type(e).__name__}), attempt {attempt + 1}/{self.attempts}")
+        else:
+            raise DownloadFailed(f'Download of {key} failed after {self.attempts} attempts: {error}')
+
+        return self._store(key, partial, expected_size, expected_sha256, suffix)
+
+    def _fetch(self, key: str, url: str, partial: Path):
+        """Stream url into partial, resuming what is already there"""
+        meta_path = partial.with_suffix('.json')
+        meta = {}
+        if partial.exists() and meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+        offset = partial.stat().st_size if meta.get('url') == url else 0
+
+        headers = {}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            if meta.get('validator'):
+                headers['If-Range'] = meta['validator']
+        with self._session().get(url, headers=headers, stream=True,
+                                 timeout=(CONNECT_TIMEOUT_S, READ_TIMEOUT_S)) as response:
+            if response.status_code == 416 and offset:
+                # The partial file doesn't fit the current file at all: start over
+                partial.unlink()
+                raise _Interrupted('range not satisfiable, restarting')
+            if response.status_code not in (200, 206):
+                raise DownloadFailed(f'HTTP {response.status_code} for {url}')
+
+            total = None
+            if response.status_code == 206:
+                match = CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+                if not match or int(match.group(1)) != offset:
+                    partial.unlink()
+                    raise _Interrupted('unexpected Content-Range, restarting')
+                total = int(match.group(3)) if match.group(3) != '*' else None
+            else:
+                offset = 0  # no Range support, or If-Range saw a changed file
+                if response.headers.get('Content-Length') and not response.headers.get('Content-Encoding'):
+                    total = int(response.headers['Content-Length'])
+                meta = {'url': url, 'validator': response.headers.get('ETag') or response.headers.get('Last-Modified'),
+                        'total': total}
+                meta_path.write_text(json.dumps(meta))
+            total = total or meta.get('total')
+
+            received = offset
+            with self._lock:
+                self._set_progress(key, state='downloading', bytes=received, total=total)
+            with open(partial, 'ab' if offset else 'wb') as f:
+                for chunk in response.iter_content(self.chunk_size):
+                    f.write(chunk)
+                    received += len(chunk)
+                    self._progress[key]['bytes'] = received
+
+        if total is not None and received != total:
+            raise _Interrupted(f'got {received} of {total} bytes')
+
+    def _store(self, key, partial: Path, expected_size, expected_sha256, suffix) -> Dict:
+        """Verify the finished partial file and move it into the content-addressed store"""
+        with self._lock:
+            self._set_progress(key, state='verifying')
+        size = partial.stat().st_size
+        digest = hashlib.sha256()
+        with open(partial, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+        problem = None
+        if expected_size and size != int(expected_size):
+            problem = f'size {size} != expected {expected_size}'
+        elif expected_sha256 and sha256 != expected_sha256:
+            problem = f'sha256 {sha256} != expected {expected_sha256}'
+        if problem:
+            self._discard(partial)
+            raise DownloadFailed(f'Download of {key} failed verification: {problem}')
+
+        stored = self.object_path(sha256, suffix)
+        stored.parent.mkdir(exist_ok=True)
+        if stored.exists():
+            self._discard(partial)  # same audio already stored
+        else:
+            os.replace(partial, stored)
+            self._discard(partial)
+        return {'path': str(stored), 'size': size, 'sha256': sha256}
+
+    @staticmethod
+    def _discard(partial: Path):
+        for path in (partial, partial.with_suffix('.json')):
+            if path.exists():
+                path.unlink()
+
+
+def probe(url: str, timeout: float = CONNECT_TIMEOUT_S) -> bool:
+    """True when url is downloadable, without downloading it"""
+    response = requests.head(url, allow_redirects=True, timeout=timeout)
+    if response.status_code in (403, 405, 501):
+        # No HEAD support: ask for the first byte only
+        with requests.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout) as response:
+            return response.status_code in (200, 206)
+    return response.status_code == 200
+
+
+def create_manager_from_env(default_dir=None) -> Optional[DownloadManager]:
+    """Build a download manager in HECKX_DOWNLOAD_DIR (or default_dir); None if neither is set"""
+    root = os.environ.get('HECKX_DOWNLOAD_DIR') or default_dir
+    if not root:
+        return None
+
+    return DownloadManager(
+        root,
+        max_workers=int(os.environ.get('HECKX_DOWNLOAD_WORKERS', 4)),
+        per_host=int(os.environ.get('HECKX_DOWNLOAD_PER_HOST', 2))
+    )
@@ -6,11 +6,12 @@ Handles file uploads and management for music library
 
 import os
 import json
-import sqlite3
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime
 
+import db
+
 try:
     from googleapiclient.discovery import build
     from googleapiclient.http import MediaFileUpload
@@ -120,9 +121,10 @@ class GoogleDriveService:
                 print(f"File not found: {file_path}")
                 return None
             
-            # Prepare file metadata
+            # Prepare file metadata (downloads are stored under their content hash, so name them by title)
+            title = track_info.get('title')
             file_metadata = {
-                'name': file_path.name,
+                'name': f"{title}{file_path.suffix}" if title else file_path.name,
                 'parents': [self.folder_id],
                 'description': f"Artist: {track_info.get('artist', 'Unknown')}\n"
                              f"Genre: {track_info.get('genre', 'Unknown')}\n"
@@ -148,7 +150,7 @@ class GoogleDriveService:
             print(f"✅ Uploaded to Google Drive: {file_path.name}")
             
             # Update database with Google Drive ID
-            self._update_track_drive_id(track_info.get('external_id'), file_id)
+            self._update_track_drive_id(track_info.get('source'), track_info.get('external_id'), file_id)
             
             return file_id
             
@@ -156,19 +158,14 @@ class GoogleDriveService:
             print(f"Upload error for {file_path}: {str(e)}")
             return None
     
-    def _update_track_drive_id(self, external_id: str, drive_id: str):
+    def _update_track_drive_id(self, source: str, external_id: str, drive_id: str):
         """Update track with Google Drive ID"""
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE music_tracks 
-            SET google_drive_id = ? 
-            WHERE external_id = ?
-        ''', (drive_id, external_id))
-        
-        conn.commit()
-        conn.close()
+        with db.transaction(db.MUSIC_DB) as conn:
+            conn.execute('''
+                UPDATE music_tracks 
+                SET google_drive_id = ? 
+                WHERE source = ? AND external_id = ?
+            ''', (drive_id, source, external_id))
     
     def bulk_upload_library(self):
         """Upload all downloaded music to Google Drive"""
@@ -177,8 +174,7 @@ class GoogleDriveService:
             return
         
         # Get all tracks with local files but no Drive ID
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
+        cursor = db.get_connection(db.MUSIC_DB).cursor()
         
         cursor.execute('''
             SELECT external_id, title, artist, file_path, genre, mood, downloads, source
@@ -188,7 +184,6 @@ class GoogleDriveService:
         ''')
         
         tracks = cursor.fetchall()
-        conn.close()
         
         print(f"Uploading {len(tracks)} tracks to Google Drive...")
         
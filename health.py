@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Background health checks for Heckx AI
+Checks run on their own interval in a daemon thread; /health/ready serves the
+last results from memory, so probes and open browser tabs never touch the
+database or external services themselves.
+
+Tuning:
+    HECKX_HEALTH_INTERVAL_S    seconds between local checks (default 15)
+    HECKX_HEALTH_EXTERNAL_S    seconds between external service checks (default 300, 0 = off)
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import background
+
+HEALTH_INTERVAL = float(os.environ.get('HECKX_HEALTH_INTERVAL_S', 15))
+EXTERNAL_INTERVAL = float(os.environ.get('HECKX_HEALTH_EXTERNAL_S', 300))
+
+
+class HealthMonitor:
+    def __init__(self, tick: float = 1.0):
+        self.tick = tick
+        self._checks: Dict[str, Dict] = {}
+        self._results: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._thread = background.PerProcess(self._start)
+
+    def add_check(self, name: str, check: Callable[[], Optional[Dict]],
+                  interval: float = HEALTH_INTERVAL, critical: bool = True):
+        """Register a check; it raises (or returns ok=False) on failure and may return details.
+
+        A failing critical check makes the app not ready; a failing
+        non-critical one only marks it degraded.
+        """
+        self._checks[name] = {'check': check, 'interval': interval, 'critical': critical, 'due': 0.0}
+
+    def ensure_started(self):
+        self._thread.get()
+
+    def _start(self) -> threading.Thread:
+        # A forked worker reports its own results, checked afresh
+        with self._lock:
+            self._results = {}
+            for spec in self._checks.values():
+                spec['due'] = 0.0
+        return background.start_daemon(self._run, 'health-monitor')
+
+    def _run_check(self, name: str, spec: Dict):
+        started = time.perf_counter()
+        try:
+            detail = spec['check']() or {}
+            ok = detail.pop('ok', True)
+            result = {'ok': bool(ok), **detail}
+        except Exception as e:
+            result = {'ok': False, 'error': str(e)}
+        result['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        result['checked_at'] = time.time()
+        result['critical'] = spec['critical']
+        result['interval_s'] = spec['interval']
+        with self._lock:
+            self._results[name] = result
+
+    def refresh(self, force: bool = False):
+        """Run every check that is due (all of them with force=True)"""
+        now = time.monotonic()
+        for name, spec in self._checks.items():
+            if spec['interval'] <= 0 and not force:
+                continue
+            if force or now >= spec['due']:
+                spec['due'] = now + spec['interval']
+                self._run_check(name, spec)
+
+    def _run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.tick)
+
+    def snapshot(self) -> Dict:
+        """Last results with their age; never runs a check itself"""
+        now = time.time()
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+
+        for name, result in results.items():
+            age = now - result['checked_at']
+            result['age_s'] = round(age, 1)
+            # Three missed refreshes means the monitor itself is stuck
+            result['stale'] = age > 3 * max(result['interval_s'], self.tick)
+
+        pending = [name for name, spec in self._checks.items()
+                   if spec['interval'] > 0 and name not in results]
+        critical_failures = [name for name, r in results.items() if r['critical'] and (not r['ok'] or r['stale'])]
+        other_failures = [name for name, r in results.items() if not r['critical'] and (not r['ok'] or r['stale'])]
+
+        if pending and any(self._checks[name]['critical'] for name in pending):
+            status = 'starting'
+        elif critical_failures:
+            status = 'unavailable'
+        elif other_failures:
+            status = 'degraded'
+        else:
+            status = 'ready'
+
+        return {
+            'status': status,
+            'ready': status in ('ready', 'degraded'),
+            'checked_at': max((r['checked_at'] for r in results.values()), default=None),
+            'checks': results
+        }
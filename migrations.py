@@ -0,0 +1,775 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for Heckx AI databases
+Every worker calls migrate_*() on startup. An up-to-date database is
+recognised through a read-only connection, without any lock. Otherwise the
+first worker to take the startup file lock (<database>.lock) migrates, and
+seeds a brand-new database. The others block on the lock and then find
+nothing left to do. A BEGIN IMMEDIATE transaction still makes each
+migration apply exactly once where file locks are unavailable.
+
+Usage:
+    python migrations.py migrate       # bring both databases up to date
+    python migrations.py status        # show applied versions
+    python migrations.py check-plans   # fail if a hot query needs a full scan or sort
+"""
+
+import argparse
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+import db
+import track_tags
+import user_stats
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to SQLite's write lock alone
+    fcntl = None
+
+# --- conversations.db -------------------------------------------------------
+
+def _conversations_baseline(conn: sqlite3.Connection):
+    """Create conversations and user_preferences"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            message TEXT,
+            response TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            category TEXT,
+            rating INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            user_id TEXT PRIMARY KEY,
+            favorite_category TEXT DEFAULT 'wisdom',
+            theme TEXT DEFAULT 'dark',
+            language TEXT DEFAULT 'thai',
+            notifications BOOLEAN DEFAULT TRUE,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _conversations_user_stats(conn: sqlite3.Connection):
+    """Create user_stats (filled from history by the normalize_quotes step)"""
+    user_stats.create_table(conn)
+
+
+def _conversations_history_index(conn: sqlite3.Connection):
+    """Serve per-user history and latest-quote lookups from an index"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_conversations_user_timestamp
+        ON conversations (user_id, timestamp DESC, id DESC)
+    ''')
+
+
+def _conversations_normalize_quotes(conn: sqlite3.Connection):
+    """Move quote text into a quotes table; conversations keep a quote_id and epoch seconds"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quotes (
+            id INTEGER PRIMARY KEY,
+            category TEXT NOT NULL,
+            text TEXT NOT NULL,
+            author TEXT NOT NULL,
+            UNIQUE (category, text, author)
+        )
+    ''')
+
+    # One row per distinct quote already in history
+    conn.execute('''
+        INSERT OR IGNORE INTO quotes (category, text, author)
+        SELECT DISTINCT IFNULL(category, ''), IFNULL(message, ''), IFNULL(response, '')
+        FROM conversations
+    ''')
+
+    conn.execute('''
+        CREATE TABLE conversations_normalized (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            quote_id INTEGER NOT NULL REFERENCES quotes (id),
+            created_at INTEGER NOT NULL,
+            rating INTEGER
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO conversations_normalized (id, user_id, quote_id, created_at, rating)
+        SELECT c.id, c.user_id, q.id,
+               CAST(strftime('%s', IFNULL(c.timestamp, 'now')) AS INTEGER), c.rating
+        FROM conversations c
+        JOIN quotes q
+          ON q.category = IFNULL(c.category, '')
+         AND q.text = IFNULL(c.message, '')
+         AND q.author = IFNULL(c.response, '')
+    ''')
+    conn.execute('DROP TABLE conversations')
+    conn.execute('ALTER TABLE conversations_normalized RENAME TO conversations')
+    conn.execute('''
+        CREATE INDEX idx_conversations_user_created
+        ON conversations (user_id, created_at DESC, id DESC)
+    ''')
+
+    users = user_stats.rebuild(conn)
+    if users:
+        print(f"📊 Built user_stats for {users} users")
+
+
+def _conversations_retention(conn: sqlite3.Connection):
+    """Archive table and created_at index for the retention job (see retention.py)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS conversations_archive (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT,
+            quote_id INTEGER NOT NULL,
+            created_at INTEGER NOT NULL,
+            rating INTEGER,
+            archived_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_conversations_created
+        ON conversations (created_at)
+    ''')
+
+
+def _conversations_user_seen_quotes(conn: sqlite3.Connection):
+    """Per-user seen quote sets for the no-repeat rotation (see quote_rotation.py)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_seen_quotes (
+            user_id TEXT PRIMARY KEY,
+            seen BLOB NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+
+
+def _conversations_quote_search(conn: sqlite3.Connection):
+    """Trigram full-text index over quotes, kept in sync by triggers (see quote_search.py)"""
+    # Trigrams match any substring, so Thai needs no word segmentation
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts
+        USING fts5(text, author, content='quotes', content_rowid='id', tokenize='trigram')
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_insert AFTER INSERT ON quotes BEGIN
+            INSERT INTO quotes_fts (rowid, text, author) VALUES (new.id, new.text, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_delete AFTER DELETE ON quotes BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, text, author) VALUES ('delete', old.id, old.text, old.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_update AFTER UPDATE ON quotes BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, text, author) VALUES ('delete', old.id, old.text, old.author);
+            INSERT INTO quotes_fts (rowid, text, author) VALUES (new.id, new.text, new.author);
+        END
+    ''')
+    conn.execute("INSERT INTO quotes_fts (quotes_fts) VALUES ('rebuild')")
+    # History search asks "has this user seen quote X" for every matching quote
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_conversations_user_quote
+        ON conversations (user_id, quote_id, created_at)
+    ''')
+
+
+CONVERSATIONS_MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, 'baseline', _conversations_baseline),
+    (2, 'user_stats', _conversations_user_stats),
+    (3, 'history_index', _conversations_history_index),
+    (4, 'normalize_quotes', _conversations_normalize_quotes),
+    (5, 'retention', _conversations_retention),
+    (6, 'user_seen_quotes', _conversations_user_seen_quotes),
+    (7, 'quote_search', _conversations_quote_search),
+]
+
+# --- music_library.db -------------------------------------------------------
+
+MUSIC_TRACK_COLUMNS = [
+    ('source', 'TEXT'),
+    ('external_id', 'TEXT'),
+    ('title', 'TEXT'),
+    ('artist', 'TEXT'),
+    ('tags', 'TEXT'),
+    ('download_url', 'TEXT'),
+    ('preview_url', 'TEXT'),
+    ('duration', 'INTEGER'),
+    ('downloads', 'INTEGER'),
+    ('likes', 'INTEGER'),
+    ('file_path', 'TEXT'),
+    ('google_drive_id', 'TEXT'),
+    ('download_date', 'DATETIME'),
+    ('file_size', 'INTEGER'),
+    ('genre', 'TEXT'),
+    ('mood', 'TEXT'),
+    ('bpm', 'INTEGER'),
+]
+
+
+def _music_baseline(conn: sqlite3.Connection):
+    """Create music_tracks and playlists"""
+    columns = ',\n'.join(
+        f'{name} {sql_type} DEFAULT CURRENT_TIMESTAMP' if name == 'download_date' else f'{name} {sql_type}'
+        for name, sql_type in MUSIC_TRACK_COLUMNS
+    )
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS music_tracks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            {columns}
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS playlists (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            description TEXT,
+            track_ids TEXT,
+            created_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+            play_count INTEGER DEFAULT 0,
+            mood_tag TEXT
+        )
+    ''')
+
+
+def _music_legacy_columns(conn: sqlite3.Connection):
+    """Add columns missing from the reduced schema app.py used to create"""
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(music_tracks)')}
+    for name, sql_type in MUSIC_TRACK_COLUMNS:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE music_tracks ADD COLUMN {name} {sql_type}')
+
+
+def _music_track_indexes(conn: sqlite3.Connection):
+    """Index external ids, pending Drive uploads and the recommendation ranking"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_music_tracks_source_external
+        ON music_tracks (source, external_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_music_tracks_file_path
+        ON music_tracks (file_path)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_music_tracks_pending_upload
+        ON music_tracks (id)
+        WHERE file_path IS NOT NULL AND (google_drive_id IS NULL OR google_drive_id = '')
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_music_tracks_popularity
+        ON music_tracks ((downloads * 1.0 + likes * 2.0) DESC)
+    ''')
+
+
+def _music_track_search(conn: sqlite3.Connection):
+    """FTS5 index over title/artist/tags and popularity-ordered genre/mood indexes (see music_search.py)"""
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS music_tracks_fts
+        USING fts5(title, artist, tags, content='music_tracks', content_rowid='id',
+                   tokenize='unicode61 remove_diacritics 2', prefix='2 3')
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS music_tracks_fts_insert AFTER INSERT ON music_tracks BEGIN
+            INSERT INTO music_tracks_fts (rowid, title, artist, tags) VALUES (new.id, new.title, new.artist, new.tags);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS music_tracks_fts_delete AFTER DELETE ON music_tracks BEGIN
+            INSERT INTO music_tracks_fts (music_tracks_fts, rowid, title, artist, tags)
+            VALUES ('delete', old.id, old.title, old.artist, old.tags);
+        END
+    ''')
+    # Only text changes touch the index; download and Drive bookkeeping updates don't
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS music_tracks_fts_update AFTER UPDATE OF title, artist, tags ON music_tracks BEGIN
+            INSERT INTO music_tracks_fts (music_tracks_fts, rowid, title, artist, tags)
+            VALUES ('delete', old.id, old.title, old.artist, old.tags);
+            INSERT INTO music_tracks_fts (rowid, title, artist, tags) VALUES (new.id, new.title, new.artist, new.tags);
+        END
+    ''')
+    conn.execute("INSERT INTO music_tracks_fts (music_tracks_fts) VALUES ('rebuild')")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_music_tracks_genre_popularity
+        ON music_tracks (genre, (downloads * 1.0 + likes * 2.0) DESC)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_music_tracks_mood_popularity
+        ON music_tracks (mood, (downloads * 1.0 + likes * 2.0) DESC)
+    ''')
+
+
+def _music_search_cache(conn: sqlite3.Connection):
+    """Pixabay search results shared by every worker (see search_cache.py)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_cache (
+            key TEXT PRIMARY KEY,
+            payload TEXT,
+            error TEXT,
+            fetched_at REAL,
+            fresh_until REAL NOT NULL DEFAULT 0,
+            stale_until REAL NOT NULL DEFAULT 0,
+            refresh_at REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_search_cache_stale_until
+        ON search_cache (stale_until)
+    ''')
+
+
+def _music_track_identity(conn: sqlite3.Connection):
+    """Merge duplicate (source, external_id) rows and make the pair unique (see music_ingest.py)"""
+    duplicates = conn.execute('''
+        SELECT t.id, k.keep_id FROM music_tracks t
+        JOIN (SELECT source, external_id, MIN(id) AS keep_id FROM music_tracks
+              WHERE source IS NOT NULL AND external_id IS NOT NULL
+              GROUP BY source, external_id HAVING COUNT(*) > 1) k
+          ON t.source = k.source AND t.external_id = k.external_id AND t.id != k.keep_id
+        ORDER BY t.id
+    ''').fetchall()
+    if duplicates:
+        # The oldest row keeps its id (playlists point at it) and takes the newest catalog data,
+        # plus any local file or Drive upload only a duplicate had
+        conn.executemany('''
+            UPDATE music_tracks SET
+                (title, artist, tags, download_url, preview_url, duration, downloads, likes, genre, mood) =
+                (SELECT title, artist, tags, download_url, preview_url, duration, downloads, likes, genre, mood
+                 FROM music_tracks WHERE id = ?1),
+                file_path = COALESCE((SELECT file_path FROM music_tracks WHERE id = ?1), file_path),
+                file_size = COALESCE((SELECT file_size FROM music_tracks WHERE id = ?1), file_size),
+                google_drive_id = COALESCE(google_drive_id, (SELECT google_drive_id FROM music_tracks WHERE id = ?1))
+            WHERE id = ?2
+        ''', duplicates)
+        remap = {str(duplicate): str(keep) for duplicate, keep in duplicates}
+        for playlist_id, track_ids in conn.execute('SELECT id, track_ids FROM playlists').fetchall():
+            if track_ids:
+                ids = [remap.get(track_id.strip(), track_id.strip()) for track_id in track_ids.split(',')]
+                conn.execute('UPDATE playlists SET track_ids = ? WHERE id = ?', (','.join(ids), playlist_id))
+        conn.executemany('DELETE FROM music_tracks WHERE id = ?', [(duplicate,) for duplicate, _ in duplicates])
+
+    conn.execute('DROP INDEX IF EXISTS idx_music_tracks_source_external')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_music_tracks_identity
+        ON music_tracks (source, external_id)
+    ''')
+
+
+def _music_track_tags(conn: sqlite3.Connection):
+    """Stored quality scores, derived genre/mood backfill and the track_tags index (see track_tags.py)"""
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(music_tracks)')}
+    if 'quality_score' not in existing:
+        conn.execute('ALTER TABLE music_tracks ADD COLUMN quality_score INTEGER')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS track_tags (
+            tag TEXT NOT NULL,
+            track_id INTEGER NOT NULL,
+            quality_score INTEGER,
+            PRIMARY KEY (tag, track_id)
+        ) WITHOUT ROWID
+    ''')
+
+    rows = conn.execute('SELECT id, tags, genre, mood, downloads, likes, duration FROM music_tracks').fetchall()
+    derived = [(track_tags.quality_score(downloads, likes, duration),
+                genre or track_tags.extract_genre(tags), mood or track_tags.extract_mood(tags), track_id)
+               for track_id, tags, genre, mood, downloads, likes, duration in rows]
+    conn.executemany('UPDATE music_tracks SET quality_score = ?, genre = ?, mood = ? WHERE id = ?', derived)
+    track_tags.write_tags(conn, ((track_id, tags, quality)
+                                 for (track_id, tags, *_), (quality, *_) in zip(rows, derived)))
+
+    # Keep the copied quality scores in step and drop a deleted track's tags
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS track_tags_quality AFTER UPDATE OF quality_score ON music_tracks BEGIN
+            UPDATE track_tags SET quality_score = new.quality_score WHERE track_id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS track_tags_delete AFTER DELETE ON music_tracks BEGIN
+            DELETE FROM track_tags WHERE track_id = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_track_tags_quality
+        ON track_tags (tag, quality_score DESC)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_track_tags_track
+        ON track_tags (track_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_music_tracks_quality
+        ON music_tracks (quality_score DESC)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_music_tracks_genre_quality
+        ON music_tracks (genre, quality_score DESC)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_music_tracks_mood_quality
+        ON music_tracks (mood, quality_score DESC)
+    ''')
+
+
+def _music_playlist_tracks(conn: sqlite3.Connection):
+    """Move playlists.track_ids into playlist_tracks with a trigger-kept track_count (see playlists.py)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS playlist_tracks (
+            playlist_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            track_id INTEGER NOT NULL,
+            PRIMARY KEY (playlist_id, position)
+        ) WITHOUT ROWID
+    ''')
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(playlists)')}
+    if 'track_count' not in existing:
+        conn.execute('ALTER TABLE playlists ADD COLUMN track_count INTEGER NOT NULL DEFAULT 0')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS playlist_tracks_insert AFTER INSERT ON playlist_tracks BEGIN
+            UPDATE playlists SET track_count = track_count + 1 WHERE id = new.playlist_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS playlist_tracks_delete AFTER DELETE ON playlist_tracks BEGIN
+            UPDATE playlists SET track_count = track_count - 1 WHERE id = old.playlist_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS music_tracks_playlist_delete AFTER DELETE ON music_tracks BEGIN
+            DELETE FROM playlist_tracks WHERE track_id = old.id;
+        END
+    ''')
+
+    if 'track_ids' in existing:
+        known = {row[0] for row in conn.execute('SELECT id FROM music_tracks')}
+        for playlist_id, track_ids in conn.execute('SELECT id, track_ids FROM playlists').fetchall():
+            ids = [int(part) for part in (track_ids or '').split(',') if part.strip().isdigit()]
+            conn.executemany('INSERT INTO playlist_tracks (playlist_id, position, track_id) VALUES (?, ?, ?)',
+                             [(playlist_id, position, track_id)
+                              for position, track_id in enumerate(t for t in ids if t in known)])
+        conn.execute('ALTER TABLE playlists DROP COLUMN track_ids')
+
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_playlist_tracks_track
+        ON playlist_tracks (track_id, playlist_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_playlists_created
+        ON playlists (created_date DESC, id DESC)
+    ''')
+
+
+MUSIC_MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, 'baseline', _music_baseline),
+    (2, 'legacy_columns', _music_legacy_columns),
+    (3, 'track_indexes', _music_track_indexes),
+    (4, 'track_search', _music_track_search),
+    (5, 'search_cache', _music_search_cache),
+    (6, 'track_identity', _music_track_identity),
+    (7, 'track_tags', _music_track_tags),
+    (8, 'playlist_tracks', _music_playlist_tracks),
+]
+
+# --- runner -----------------------------------------------------------------
+
+MIGRATION_LOCK_TIMEOUT_MS = 120000
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection, migrations: List[Tuple[int, str, Callable]]) -> List[int]:
+    """Apply pending migrations in order inside the caller's write transaction"""
+    applied = []
+    version = current_version(conn)
+    for number, name, migration in migrations:
+        if number <= version:
+            continue
+        migration(conn)
+        conn.execute('INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+                     (number, name, datetime.now().isoformat()))
+        applied.append(number)
+    return applied
+
+
+def is_current(path: str, migrations: List[Tuple[int, str, Callable]]) -> bool:
+    """True when `path` exists with every migration applied; reads only, takes no lock"""
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=db.BUSY_TIMEOUT_MS / 1000.0)
+    except sqlite3.OperationalError:
+        return False  # no database yet
+    try:
+        return conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] == migrations[-1][0]
+    except sqlite3.OperationalError:
+        return False  # no schema_version table yet
+    finally:
+        conn.close()
+
+
+@contextmanager
+def startup_lock(path: str):
+    """Exclusive lock on <path>.lock, held while one process migrates and seeds"""
+    if fcntl is None:
+        yield
+        return
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file is closed
+        yield
+
+
+def migrate(path: str, migrations: List[Tuple[int, str, Callable]],
+            seed: Callable[[sqlite3.Connection], None] = None) -> List[int]:
+    """Bring one database up to date; safe to call from every worker at once.
+
+    seed(conn) runs in the same transaction when the database is new (no
+    migration applied before), so a half-seeded library never persists.
+    """
+    if is_current(path, migrations):
+        return []
+
+    with startup_lock(path):
+        conn = db.get_connection(path)
+        # Only matters without file locks: other workers wait out slow steps on SQLite's lock instead
+        conn.execute(f'PRAGMA busy_timeout = {MIGRATION_LOCK_TIMEOUT_MS}')
+        try:
+            with db.transaction(path) as conn:
+                new = current_version(conn) == 0
+                applied = apply_migrations(conn, migrations)
+                if seed is not None and new:
+                    seed(conn)
+        finally:
+            conn.execute(f'PRAGMA busy_timeout = {db.BUSY_TIMEOUT_MS}')
+
+    for number in applied:
+        name = next(name for n, name, _ in migrations if n == number)
+        print(f"🗄️ Applied migration {number} ({name}) to {path}")
+    return applied
+
+
+def migrate_conversations() -> List[int]:
+    return migrate(db.CONVERSATIONS_DB, CONVERSATIONS_MIGRATIONS)
+
+
+def migrate_music(seed: Callable[[sqlite3.Connection], None] = None) -> List[int]:
+    return migrate(db.MUSIC_DB, MUSIC_MIGRATIONS, seed)
+
+# --- query plan check -------------------------------------------------------
+
+# Queries on request paths that must be answered from an index
+HOT_QUERIES = {
+    'conversations': [
+        ('history page', '''
+            SELECT c.id, q.text, q.category, c.created_at
+            FROM conversations c JOIN quotes q ON q.id = c.quote_id
+            WHERE c.user_id = ? ORDER BY c.created_at DESC, c.id DESC LIMIT 21
+        ''', ('u',)),
+        ('history page after cursor', '''
+            SELECT c.id, q.text, q.category, c.created_at
+            FROM conversations c JOIN quotes q ON q.id = c.quote_id
+            WHERE c.user_id = ? AND (c.created_at, c.id) < (?, ?)
+            ORDER BY c.created_at DESC, c.id DESC LIMIT 21
+        ''', ('u', 1700000000, 1)),
+        ('history since cursor', '''
+            SELECT c.id, q.text, q.category, c.created_at
+            FROM conversations c JOIN quotes q ON q.id = c.quote_id
+            WHERE c.user_id = ? AND c.created_at >= ? AND c.id NOT IN (?, ?)
+            ORDER BY c.created_at ASC, c.id ASC LIMIT 21
+        ''', ('u', 1700000000, 1, 2)),
+        ('sync cursor newest second', '''
+            SELECT id FROM conversations WHERE user_id = ? AND created_at = ?
+        ''', ('u', 1700000000)),
+        ('sync cursor seen ids', 'SELECT id, created_at FROM conversations WHERE id IN (?, ?)', (1, 2)),
+        ('latest quote for rating', '''
+            SELECT id, rating FROM conversations
+            WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT 1
+        ''', ('u',)),
+        ('rate by id', 'SELECT rating FROM conversations WHERE id = ? AND user_id = ?', (1, 'u')),
+        ('user stats', '''
+            SELECT total_quotes, category_counts, rating_sum, rating_count
+            FROM user_stats WHERE user_id = ?
+        ''', ('u',)),
+        ('seen quotes', 'SELECT seen FROM user_seen_quotes WHERE user_id = ?', ('u',)),
+        ('quote row id', 'SELECT id FROM quotes WHERE category = ? AND text = ? AND author = ?', ('c', 't', 'a')),
+        ('quote search', '''
+            SELECT q.id, q.text, q.author, q.category
+            FROM quotes_fts JOIN quotes q ON q.id = quotes_fts.rowid
+            WHERE quotes_fts MATCH ? ORDER BY quotes_fts.rowid LIMIT 500
+        ''', ('"abc"',)),
+        ('history size probe', 'SELECT 1 FROM conversations WHERE user_id = ? LIMIT 1 OFFSET 20000', ('u',)),
+        ('history search scan', '''
+            SELECT q.id, q.text, q.author, q.category, COUNT(*), MAX(c.created_at)
+            FROM conversations c JOIN quotes q ON q.id = c.quote_id
+            WHERE c.user_id = ? AND (q.text LIKE ? OR q.author LIKE ?)
+            GROUP BY c.quote_id
+        ''', ('u', '%ab%', '%ab%')),
+        ('history search', '''
+            SELECT q.id,
+                   (SELECT MAX(c.created_at) FROM conversations c WHERE c.user_id = ?1 AND c.quote_id = q.id)
+            FROM quotes_fts JOIN quotes q ON q.id = quotes_fts.rowid
+            WHERE quotes_fts MATCH ?2
+              AND EXISTS (SELECT 1 FROM conversations c WHERE c.user_id = ?1 AND c.quote_id = q.id)
+            ORDER BY quotes_fts.rowid LIMIT 500
+        ''', ('u', '"abc"')),
+        ('history delete chunk', '''
+            SELECT c.id, c.user_id, q.category, c.rating
+            FROM conversations c JOIN quotes q ON q.id = c.quote_id
+            WHERE c.user_id = ? ORDER BY c.created_at DESC, c.id DESC LIMIT 500
+        ''', ('u',)),
+        ('retention chunk', '''
+            SELECT c.id, c.user_id, q.category, c.rating
+            FROM conversations c JOIN quotes q ON q.id = c.quote_id
+            WHERE c.created_at < ? ORDER BY c.created_at LIMIT 500
+        ''', (1700000000,)),
+    ],
+    'music': [
+        ('track by id', 'SELECT title, preview_url, download_url FROM music_tracks WHERE id = ?', (1,)),
+        ('drive id update', '''
+            UPDATE music_tracks SET google_drive_id = ? WHERE source = ? AND external_id = ?
+        ''', ('d', 'pixabay', '1')),
+        ('track by file path', 'SELECT id FROM music_tracks WHERE file_path = ?', ('x.mp3',)),
+        ('pending drive uploads', '''
+            SELECT external_id, title, artist, file_path, genre, mood, downloads, source
+            FROM music_tracks
+            WHERE file_path IS NOT NULL
+            AND (google_drive_id IS NULL OR google_drive_id = '')
+        ''', ()),
+        ('track search', '''
+            SELECT t.id, bm25(music_tracks_fts, 10.0, 5.0, 2.0)
+            FROM music_tracks_fts JOIN music_tracks t ON t.id = music_tracks_fts.rowid
+            WHERE music_tracks_fts MATCH ? AND t.genre = ?
+            ORDER BY music_tracks_fts.rowid LIMIT 2000
+        ''', ('"jazz"*', 'jazz')),
+        ('tracks by popularity', '''
+            SELECT id FROM music_tracks ORDER BY (downloads * 1.0 + likes * 2.0) DESC LIMIT 50000
+        ''', ()),
+        ('genre by popularity', '''
+            SELECT id FROM music_tracks WHERE genre = ? ORDER BY (downloads * 1.0 + likes * 2.0) DESC LIMIT 20
+        ''', ('jazz',)),
+        ('mood by popularity', '''
+            SELECT id FROM music_tracks WHERE mood = ? ORDER BY (downloads * 1.0 + likes * 2.0) DESC LIMIT 20
+        ''', ('calm',)),
+        ('premium recommendations', '''
+            SELECT id FROM music_tracks
+            WHERE downloads >= 2000
+            ORDER BY (downloads * 1.0 + likes * 2.0) DESC
+            LIMIT 20
+        ''', ()),
+        ('top by quality', '''
+            SELECT t.id FROM music_tracks t
+            WHERE t.quality_score IS NOT NULL ORDER BY t.quality_score DESC LIMIT 20
+        ''', ()),
+        ('genre by quality', '''
+            SELECT t.id FROM music_tracks t
+            WHERE t.quality_score IS NOT NULL AND t.genre = ? ORDER BY t.quality_score DESC LIMIT 20
+        ''', ('jazz',)),
+        ('genre and mood by quality', '''
+            SELECT t.id FROM music_tracks t
+            WHERE t.quality_score IS NOT NULL AND t.genre = ? AND t.mood = ? ORDER BY t.quality_score DESC LIMIT 20
+        ''', ('jazz', 'calm')),
+        ('tag by quality', '''
+            SELECT t.id FROM track_tags g JOIN music_tracks t ON t.id = g.track_id
+            WHERE g.tag = ? AND t.genre = ? ORDER BY g.quality_score DESC LIMIT 20
+        ''', ('chill', 'lofi')),
+        ('track tags by track', 'SELECT tag FROM track_tags WHERE track_id = ?', (1,)),
+        ('playlists page', '''
+            SELECT id, name, track_count FROM playlists ORDER BY created_date DESC, id DESC
+        ''', ()),
+        ('playlist with tracks', '''
+            SELECT p.id, pt.position, t.title
+            FROM playlists p
+            LEFT JOIN playlist_tracks pt ON pt.playlist_id = p.id
+            LEFT JOIN music_tracks t ON t.id = pt.track_id
+            WHERE p.id = ?
+            ORDER BY p.created_date DESC, p.id DESC, pt.position
+        ''', (1,)),
+        ('playlists with tracks', '''
+            SELECT p.id, pt.position, t.title
+            FROM playlists p
+            LEFT JOIN playlist_tracks pt ON pt.playlist_id = p.id
+            LEFT JOIN music_tracks t ON t.id = pt.track_id
+            ORDER BY p.created_date DESC, p.id DESC, pt.position
+        ''', ()),
+        # The few playlists found are then sorted by date
+        ('playlists holding track', 'SELECT playlist_id FROM playlist_tracks WHERE track_id = ?', (1,)),
+        ('playlist position lookup', '''
+            SELECT position FROM playlist_tracks WHERE playlist_id = ? ORDER BY position LIMIT 1 OFFSET ?
+        ''', (1, 3)),
+        ('playlist shift', '''
+            UPDATE playlist_tracks SET position = -(position + 1) - 1 WHERE playlist_id = ? AND position >= ?
+        ''', (1, 3)),
+        ('search cache lookup', '''
+            SELECT payload, error, fresh_until, stale_until, refresh_at FROM search_cache WHERE key = ?
+        ''', ('k',)),
+        ('search cache prune', '''
+            SELECT key FROM search_cache WHERE stale_until < ? LIMIT 500
+        ''', (1700000000,)),
+    ],
+}
+
+
+def plan_problems(conn: sqlite3.Connection, queries) -> List[str]:
+    """Describe hot queries whose plan scans a whole table or sorts in a temp b-tree"""
+    problems = []
+    for name, sql, params in queries:
+        for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params):
+            detail = row[-1]
+            # FTS5 lookups show up as 'SCAN ... VIRTUAL TABLE INDEX n:M...'
+            full_scan = detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE INDEX' not in detail
+            if full_scan or 'TEMP B-TREE' in detail:
+                problems.append(f"{name}: {detail}")
+    return problems
+
+
+def check_plans() -> List[str]:
+    """Run every hot query's EXPLAIN QUERY PLAN against a freshly migrated schema"""
+    problems = []
+    for label, migrations in (('conversations', CONVERSATIONS_MIGRATIONS), ('music', MUSIC_MIGRATIONS)):
+        conn = sqlite3.connect(':memory:', isolation_level=None)
+        conn.execute('BEGIN')
+        apply_migrations(conn, migrations)
+        conn.execute('COMMIT')
+        problems.extend(f"{label} / {problem}" for problem in plan_problems(conn, HOT_QUERIES[label]))
+        conn.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage Heckx AI database schema')
+    parser.add_argument('command', choices=['migrate', 'status', 'check-plans'])
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate_conversations()
+        migrate_music()
+        return 0
+
+    if args.command == 'status':
+        for path in (db.CONVERSATIONS_DB, db.MUSIC_DB):
+            with db.transaction(path, mode='DEFERRED') as conn:
+                print(f"{path}: version {current_version(conn)}")
+        return 0
+
+    problems = check_plans()
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        return 1
+    print("✅ All hot queries use indexes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,11 +7,19 @@ Integrates with Pixabay/Pexels for high-quality music discovery
 import os
 import json
 import requests
-import sqlite3
 from datetime import datetime
 from pathlib import Path
 import hashlib
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, List, Optional
+
+import db
+import download_manager
+import migrations
+import music_ingest
+import music_search
+import playlists
+import search_cache
+import track_tags
 
 class MusicDiscoveryService:
     def __init__(self):
@@ -19,6 +27,8 @@ class MusicDiscoveryService:
         self.pexels_api_key = os.environ.get('PEXELS_API_KEY', 'demo-key')
         self.music_dir = Path('./music_library')
         self.music_dir.mkdir(exist_ok=True)
+        self.downloads = download_manager.create_manager_from_env(self.music_dir)  # see download_manager.py
+        self.search_cache = search_cache.create_cache_from_env()  # shared by all workers, see search_cache.py
         self.init_music_db()
         
         # Popular search terms for quality music
@@ -72,45 +82,13 @@ class MusicDiscoveryService:
         ]
     
     def init_music_db(self):
-        """Initialize music database with demo data"""
-        conn = sqlite3.connect('music_library.db')
+        """Migrate the persistent music library, seeding demo data when it is new"""
+        migrations.migrate_music(seed=self._seed_demo_tracks)
+    
+    def _seed_demo_tracks(self, conn):
+        """Seed demo tracks into an empty library inside the caller's transaction"""
         cursor = conn.cursor()
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS music_tracks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source TEXT,
-                external_id TEXT,
-                title TEXT,
-                artist TEXT,
-                tags TEXT,
-                download_url TEXT,
-                preview_url TEXT,
-                duration INTEGER,
-                downloads INTEGER,
-                likes INTEGER,
-                file_path TEXT,
-                google_drive_id TEXT,
-                download_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                file_size INTEGER,
-                genre TEXT,
-                mood TEXT,
-                bpm INTEGER
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS playlists (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                description TEXT,
-                track_ids TEXT,
-                created_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                play_count INTEGER DEFAULT 0,
-                mood_tag TEXT
-            )
-        ''')
-        
         # Add demo tracks if database is empty
         cursor.execute('SELECT COUNT(*) FROM music_tracks')
         if cursor.fetchone()[0] == 0:
@@ -146,51 +124,53 @@ class MusicDiscoveryService:
                  195, 5500, 275, None, None, 0, 'ambient', 'peaceful', 70)
             ]
             
-            cursor.executemany('''
-                INSERT INTO music_tracks 
-                (source, external_id, title, artist, tags, download_url, preview_url, 
-                 duration, downloads, likes, file_path, google_drive_id, file_size, genre, mood, bpm)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', demo_music)
+            columns = ('source', 'external_id', 'title', 'artist', 'tags', 'download_url', 'preview_url',
+                       'duration', 'downloads', 'likes', 'file_path', 'google_drive_id', 'file_size', 'genre',
+                       'mood', 'bpm')
+            # Through the ingest path (joining this transaction) so quality scores and tags are derived
+            self.ingest_tracks(dict(zip(columns, row)) for row in demo_music)
             
             print("✅ Added demo music tracks to database")
-        
-        conn.commit()
-        conn.close()
     
     def search_pixabay_music(self, query: str, min_downloads: int = 2000, per_page: int = 20) -> List[Dict]:
         """Search high-quality music from Pixabay with fallback to demo data"""
+        fetch = lambda: self._fetch_pixabay_music(query, min_downloads, per_page)
         try:
-            url = "https://pixabay.com/api/"
-            params = {
-                'key': self.pixabay_api_key,
-                'q': query,
-                'category': 'music',
-                'audio_type': 'music',
-                'min_downloads': min_downloads,
-                'per_page': per_page,
-                'order': 'popular',
-                'safesearch': 'true'
-            }
-            
-            response = requests.get(url, params=params, timeout=30)
-            if response.status_code == 200:
-                data = response.json()
-                results = self._process_pixabay_results(data.get('hits', []))
-                
-                # If no results from API, return demo tracks filtered by query
-                if not results:
-                    print(f"No Pixabay results for '{query}', using demo tracks")
-                    return self._get_demo_tracks_for_query(query)
-                
-                return results
+            if self.search_cache is not None:
+                # Failures are cached briefly too, so a down API isn't retried on every request
+                key = search_cache.cache_key('pixabay', query, min_downloads=min_downloads, per_page=per_page)
+                results = self.search_cache.get(key, fetch)
             else:
-                print(f"Pixabay API error: {response.status_code}, using demo tracks")
-                return self._get_demo_tracks_for_query(query)
-                
+                results = fetch()
         except Exception as e:
             print(f"Pixabay search error: {str(e)}, using demo tracks")
             return self._get_demo_tracks_for_query(query)
+        
+        # If no results from API, return demo tracks filtered by query
+        if not results:
+            print(f"No Pixabay results for '{query}', using demo tracks")
+            return self._get_demo_tracks_for_query(query)
+        
+        return results
+    
+    def _fetch_pixabay_music(self, query: str, min_downloads: int, per_page: int) -> List[Dict]:
+        """One Pixabay API call; raises on errors so they can be cached"""
+        url = "https://pixabay.com/api/"
+        params = {
+            'key': self.pixabay_api_key,
+            'q': query,
+            'category': 'music',
+            'audio_type': 'music',
+            'min_downloads': min_downloads,
+            'per_page': per_page,
+            'order': 'popular',
+            'safesearch': 'true'
+        }
+        
+        response = requests.get(url, params=params, timeout=30)
+        if response.status_code != 200:
+            raise RuntimeError(f"Pixabay API error: {response.status_code}")
+        return self._process_pixabay_results(response.json().get('hits', []))
     
     def _process_pixabay_results(self, hits: List[Dict]) -> List[Dict]:
         """Process and standardize Pixabay results"""
@@ -217,13 +197,9 @@ class MusicDiscoveryService:
     
     def _calculate_quality_score(self, track_data: Dict) -> int:
         """Calculate quality score based on downloads, likes, and duration"""
-        downloads = track_data.get('downloads', 0)
-        likes = track_data.get('likes', 0)
-        duration = track_data.get('duration', 0)
-        
-        # Weighted scoring
-        score = (downloads * 1.0) + (likes * 2.0) + (duration * 0.1)
-        return int(score)
+        # Same score ingest stores in music_tracks.quality_score
+        return track_tags.quality_score(track_data.get('downloads'), track_data.get('likes'),
+                                        track_data.get('duration'))
     
     def _get_demo_tracks_for_query(self, query: str) -> List[Dict]:
         """Get demo tracks filtered by query"""
@@ -273,110 +249,61 @@ class MusicDiscoveryService:
     
     def download_track(self, track: Dict) -> Optional[str]:
         """Download music track to local storage"""
-        try:
+        return self.download_tracks([track])[0]
+    
+    def download_tracks(self, tracks: List[Dict]) -> List[Optional[str]]:
+        """Download tracks concurrently (resumable, stored by content hash); local paths, None where one failed"""
+        futures = []
+        for track in tracks:
             if not track.get('download_url'):
                 print(f"No download URL for track: {track.get('title')}")
-                return None
+                futures.append(None)
+                continue
+            futures.append(self.downloads.submit(self.download_key(track), track['download_url']))
+        
+        paths = []
+        for track, future in zip(tracks, futures):
+            if future is None:
+                paths.append(None)
+                continue
+            try:
+                stored = future.result()
+            except Exception as e:
+                print(f"❌ Download failed for {track.get('title', 'Unknown')}: {str(e)}")
+                paths.append(None)
+                continue
             
-            # Create safe filename
-            safe_title = "".join(c for c in track['title'] if c.isalnum() or c in (' ', '-', '_')).strip()
-            filename = f"{safe_title}_{track['external_id']}.mp3"
-            file_path = self.music_dir / filename
+            # Update track info and save to database
+            track['file_path'] = stored['path']
+            track['file_size'] = stored['size']
+            self._save_track_to_db(track)
             
-            # Download file
-            response = requests.get(track['download_url'], timeout=60)
-            if response.status_code == 200:
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
-                
-                # Update track info
-                track['file_path'] = str(file_path)
-                track['file_size'] = len(response.content)
-                
-                # Save to database
-                self._save_track_to_db(track)
-                
-                print(f"✅ Downloaded: {track['title']}")
-                return str(file_path)
-            else:
-                print(f"❌ Download failed for: {track['title']}")
-                return None
-                
-        except Exception as e:
-            print(f"Download error for {track.get('title', 'Unknown')}: {str(e)}")
-            return None
+            print(f"✅ Downloaded: {track['title']}")
+            paths.append(stored['path'])
+        return paths
+    
+    @staticmethod
+    def download_key(track: Dict) -> str:
+        return f"{track.get('source')}:{track.get('external_id')}"
+    
+    def download_progress(self, track: Dict) -> Optional[Dict]:
+        """State and byte counts of a track's download in this process (see download_manager.py)"""
+        return self.downloads.progress(self.download_key(track))
     
     def _save_track_to_db(self, track: Dict):
         """Save track information to database"""
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO music_tracks 
-            (source, external_id, title, artist, tags, download_url, preview_url,
-             duration, downloads, likes, file_path, file_size, genre, mood)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            track.get('source'),
-            track.get('external_id'),
-            track.get('title'),
-            track.get('artist'),
-            track.get('tags'),
-            track.get('download_url'),
-            track.get('preview_url'),
-            track.get('duration'),
-            track.get('downloads'),
-            track.get('likes'),
-            track.get('file_path'),
-            track.get('file_size'),
-            self._extract_genre(track.get('tags', '')),
-            self._extract_mood(track.get('tags', ''))
-        ))
-        
-        conn.commit()
-        conn.close()
-    
-    def _extract_genre(self, tags: str) -> str:
-        """Extract genre from tags"""
-        tags_lower = tags.lower()
-        genre_keywords = {
-            'jazz': ['jazz', 'swing', 'bebop'],
-            'blues': ['blues', 'blue'],
-            'classical': ['classical', 'piano', 'orchestra'],
-            'ambient': ['ambient', 'atmospheric', 'drone'],
-            'lofi': ['lofi', 'lo-fi', 'chill', 'study'],
-            'electronic': ['electronic', 'synth', 'techno'],
-            'folk': ['folk', 'acoustic', 'country'],
-            'rock': ['rock', 'guitar', 'electric']
-        }
-        
-        for genre, keywords in genre_keywords.items():
-            if any(keyword in tags_lower for keyword in keywords):
-                return genre
-        return 'unknown'
+        self.ingest_tracks([track])
     
-    def _extract_mood(self, tags: str) -> str:
-        """Extract mood from tags"""
-        tags_lower = tags.lower()
-        mood_keywords = {
-            'relaxing': ['relax', 'calm', 'peaceful', 'zen', 'meditation'],
-            'energetic': ['energy', 'upbeat', 'dynamic', 'active'],
-            'focus': ['focus', 'study', 'concentration', 'work'],
-            'romantic': ['romantic', 'love', 'intimate', 'soft'],
-            'melancholic': ['sad', 'melancholy', 'emotional', 'blue'],
-            'happy': ['happy', 'joy', 'cheerful', 'bright'],
-            'mysterious': ['mystery', 'dark', 'atmospheric', 'ambient']
-        }
+    def ingest_tracks(self, tracks: Iterable[Dict], batch_size: int = music_ingest.BATCH_SIZE) -> Dict[str, int]:
+        """UPSERT tracks (any iterable, e.g. a generator); genre, mood, quality score and tags are derived.
         
-        for mood, keywords in mood_keywords.items():
-            if any(keyword in tags_lower for keyword in keywords):
-                return mood
-        return 'neutral'
+        Returns inserted/updated/unchanged counts; see music_ingest.py.
+        """
+        return music_ingest.ingest_tracks(tracks, batch_size)
     
     def get_library_stats(self) -> Dict:
         """Get music library statistics"""
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
+        cursor = db.get_connection(db.MUSIC_DB).cursor()
         
         cursor.execute('SELECT COUNT(*) FROM music_tracks')
         total_tracks = cursor.fetchone()[0]
@@ -393,8 +320,6 @@ class MusicDiscoveryService:
         cursor.execute('SELECT genre, COUNT(*) FROM music_tracks GROUP BY genre ORDER BY COUNT(*) DESC LIMIT 5')
         top_genres = cursor.fetchall()
         
-        conn.close()
-        
         return {
             'total_tracks': total_tracks,
             'genres': genres,
@@ -403,75 +328,46 @@ class MusicDiscoveryService:
             'top_genres': top_genres
         }
     
-    def search_library(self, query: str, genre: str = None, mood: str = None) -> List[Dict]:
-        """Search local music library"""
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
-        
-        base_query = '''
-            SELECT * FROM music_tracks 
-            WHERE (title LIKE ? OR artist LIKE ? OR tags LIKE ?)
-        '''
-        params = [f'%{query}%', f'%{query}%', f'%{query}%']
-        
-        if genre:
-            base_query += ' AND genre = ?'
-            params.append(genre)
-        
-        if mood:
-            base_query += ' AND mood = ?'
-            params.append(mood)
-        
-        base_query += ' ORDER BY downloads DESC, likes DESC'
-        
-        cursor.execute(base_query, params)
+    def search_library(self, query: str, genre: str = None, mood: str = None, limit: int = 50) -> List[Dict]:
+        """Search local music library (full-text, ranked with popularity; see music_search.py)"""
+        matches = music_search.search_tracks(db.get_connection(db.MUSIC_DB), query, genre, mood, limit)
         tracks = []
         
-        for row in cursor.fetchall():
+        for track in matches:
             tracks.append({
-                'id': row[0],
-                'source': row[1],
-                'external_id': row[2],
-                'title': row[3],
-                'artist': row[4],
-                'tags': row[5],
-                'file_path': row[11],
-                'duration': row[8],
-                'downloads': row[9],
-                'likes': row[10],
-                'genre': row[16],
-                'mood': row[17]
+                'id': track['id'],
+                'source': track['source'],
+                'external_id': track['external_id'],
+                'title': track['title'],
+                'artist': track['artist'],
+                'tags': track['tags'],
+                'file_path': track['file_path'],
+                'duration': track['duration'],
+                'downloads': track['downloads'],
+                'likes': track['likes'],
+                'genre': track['genre'],
+                'mood': track['mood']
             })
         
-        conn.close()
         return tracks
     
+    def get_top_tracks(self, genre: str = None, mood: str = None, tag: str = None, limit: int = 50) -> List[Dict]:
+        """Best-quality tracks by genre, mood and/or tag, straight from the indexes (see track_tags.py)"""
+        return track_tags.top_tracks(db.get_connection(db.MUSIC_DB), genre, mood, tag, limit)
+    
     def create_playlist(self, name: str, track_ids: List[int], mood_tag: str = None) -> int:
-        """Create a new playlist"""
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
-        
-        track_ids_str = ','.join(map(str, track_ids))
-        
-        cursor.execute('''
-            INSERT INTO playlists (name, track_ids, mood_tag)
-            VALUES (?, ?, ?)
-        ''', (name, track_ids_str, mood_tag))
-        
-        playlist_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return playlist_id
+        """Create a new playlist (see playlists.py)"""
+        with db.transaction(db.MUSIC_DB) as conn:
+            return playlists.create_playlist(conn, name, track_ids, mood_tag=mood_tag)
     
     def get_premium_recommendations(self) -> List[Dict]:
         """Get premium music recommendations based on quality metrics"""
-        conn = sqlite3.connect('music_library.db')
-        cursor = conn.cursor()
+        cursor = db.get_connection(db.MUSIC_DB).cursor()
         
-        # Get tracks with high downloads and likes
+        # Get tracks with high downloads and likes (walks idx_music_tracks_popularity)
         cursor.execute('''
-            SELECT * FROM music_tracks 
+            SELECT id, title, artist, genre, mood, downloads, likes, file_path
+            FROM music_tracks 
             WHERE downloads >= 2000 
             ORDER BY (downloads * 1.0 + likes * 2.0) DESC 
             LIMIT 20
@@ -481,17 +377,16 @@ class MusicDiscoveryService:
         for row in cursor.fetchall():
             recommendations.append({
                 'id': row[0],
-                'title': row[3],
-                'artist': row[4],
-                'genre': row[16],
-                'mood': row[17],
-                'downloads': row[9],
-                'likes': row[10],
-                'quality_score': row[9] + (row[10] * 2),
-                'file_path': row[11]
+                'title': row[1],
+                'artist': row[2],
+                'genre': row[3],
+                'mood': row[4],
+                'downloads': row[5],
+                'likes': row[6],
+                'quality_score': row[5] + (row[6] * 2),
+                'file_path': row[7]
             })
         
-        conn.close()
         return recommendations
 
 def main():
@@ -509,8 +404,7 @@ def main():
     
     # Download top 5 tracks for testing
     print("\nDownloading top 5 tracks...")
-    for track in premium_tracks[:5]:
-        music_service.download_track(track)
+    music_service.download_tracks(premium_tracks[:5])
     
     # Show library stats
     stats = music_service.get_library_stats()
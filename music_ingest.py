@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Idempotent track ingest for the Heckx AI music library
+Tracks are UPSERTed on their (source, external_id) identity, which the
+music_tracks unique index enforces (migration 6). Re-ingesting a track
+updates its catalog fields in place and keeps its id, local file and
+Drive upload. A track whose fields all match is left untouched, so the
+search index triggers don't fire and it counts as unchanged.
+
+Genre and mood (unless given) and the quality score are derived here, and
+the track_tags index is rewritten for new tracks and changed tags only
+(see track_tags.py).
+
+Input is any iterable, including a generator. It is consumed BATCH_SIZE
+tracks at a time, one write transaction per batch, so memory stays flat
+however big the catalog is.
+
+Usage:
+    python music_ingest.py catalog.jsonl     # one JSON track per line (or .csv, or a .json list)
+"""
+
+import argparse
+import csv
+import json
+import time
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Tuple
+
+import db
+import migrations
+import track_tags
+
+BATCH_SIZE = 1000
+
+# Replaced by every ingest
+CATALOG_COLUMNS = ('title', 'artist', 'tags', 'download_url', 'preview_url', 'duration', 'downloads', 'likes',
+                   'quality_score')
+# Only replaced when the incoming track has a value: a catalog re-import must not forget downloads
+LOCAL_COLUMNS = ('file_path', 'file_size', 'genre', 'mood', 'bpm')
+COLUMNS = ('source', 'external_id') + CATALOG_COLUMNS + LOCAL_COLUMNS
+
+UPSERT_SQL = f'''
+    INSERT INTO music_tracks ({', '.join(COLUMNS)})
+    VALUES ({', '.join('?' for _ in COLUMNS)})
+    ON CONFLICT (source, external_id) DO UPDATE SET
+        {', '.join([f'{c} = excluded.{c}' for c in CATALOG_COLUMNS] +
+                   [f'{c} = COALESCE(excluded.{c}, {c})' for c in LOCAL_COLUMNS])}
+    WHERE {' OR '.join([f'{c} IS NOT excluded.{c}' for c in CATALOG_COLUMNS] +
+                       [f'(excluded.{c} IS NOT NULL AND {c} IS NOT excluded.{c})' for c in LOCAL_COLUMNS])}
+'''
+
+
+def _row(track: Dict) -> Tuple:
+    if not track.get('source') or track.get('external_id') in (None, ''):
+        raise ValueError(f"Track needs a source and an external_id: {track.get('title')!r}")
+    tags = track.get('tags') or ''
+    derived = {
+        'external_id': str(track['external_id']),
+        'genre': track.get('genre') or track_tags.extract_genre(tags),
+        'mood': track.get('mood') or track_tags.extract_mood(tags),
+        'quality_score': track_tags.quality_score(track.get('downloads'), track.get('likes'), track.get('duration'))
+    }
+    return tuple(derived[c] if c in derived else track.get(c) for c in COLUMNS)
+
+
+def _existing(conn, keys) -> Dict[Tuple[str, str], Tuple[int, str]]:
+    """(id, tags) of the (source, external_id) pairs of a batch already in the library"""
+    found = {}
+    by_source: Dict[str, list] = {}
+    for source, external_id in keys:
+        by_source.setdefault(source, []).append(external_id)
+    for source, external_ids in by_source.items():
+        for start in range(0, len(external_ids), 500):  # stay under SQLite's variable limit
+            chunk = external_ids[start:start + 500]
+            for source, external_id, track_id, tags in conn.execute(f'''
+                SELECT source, external_id, id, tags FROM music_tracks
+                WHERE source = ? AND external_id IN ({', '.join('?' for _ in chunk)})
+            ''', (source, *chunk)):
+                found[source, external_id] = (track_id, tags)
+    return found
+
+
+def ingest_tracks(tracks: Iterable[Dict], batch_size: int = BATCH_SIZE, path: str = None) -> Dict[str, int]:
+    """UPSERT tracks in batched transactions; counts of inserted, updated and unchanged tracks"""
+    path = path or db.MUSIC_DB
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    tracks = iter(tracks)
+    while True:
+        batch = list(islice(tracks, batch_size))
+        if not batch:
+            return counts
+        # The last copy of a track repeated within a batch wins
+        rows = list({row[:2]: row for row in map(_row, batch)}.values())
+        counts['unchanged'] += len(batch) - len(rows)
+
+        with db.transaction(path) as conn:
+            existing = _existing(conn, [row[:2] for row in rows])
+            # sqlite3_changes(): rows inserted or actually updated, without the index trigger writes
+            written = conn.executemany(UPSERT_SQL, rows).rowcount
+
+            tags_at, quality_at = COLUMNS.index('tags'), COLUMNS.index('quality_score')
+            retag = [row for row in rows if row[:2] not in existing or existing[row[:2]][1] != row[tags_at]]
+            if retag:
+                ids = {key: track_id for key, (track_id, _) in _existing(conn, [row[:2] for row in retag]).items()}
+                track_tags.write_tags(conn, ((ids[row[:2]], row[tags_at], row[quality_at]) for row in retag))
+
+        inserted = len(rows) - len(existing)
+        counts['inserted'] += inserted
+        counts['updated'] += written - inserted
+        counts['unchanged'] += len(rows) - written
+
+
+def read_catalog(path: str) -> Iterator[Dict]:
+    """Tracks from a JSON-lines, CSV or JSON-list file, streamed except for JSON lists"""
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(f)
+        elif path.endswith('.json'):
+            yield from json.load(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest a track catalog into the music library')
+    parser.add_argument('catalog')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    migrations.migrate_music()
+    started = time.perf_counter()
+    counts = ingest_tracks(read_catalog(args.catalog), args.batch_size)
+    took = time.perf_counter() - started
+    print(f"✅ Ingested {sum(counts.values()):,} tracks in {took:.1f} s: "
+          f"{counts['inserted']:,} new, {counts['updated']:,} updated, {counts['unchanged']:,} unchanged")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Music library search for Heckx AI
+Backed by music_tracks_fts (FTS5 over title/artist/tags, kept in sync by
+triggers; see migrations.py) and the popularity-ordered genre/mood indexes.
+
+Every whitespace-separated query term must match title, artist or tag text.
+Terms go to FTS5 as quoted phrases, so the unicode61 tokenizer splits them
+exactly like the indexed text (Thai included); nothing is split in Python.
+The last term also matches as a prefix (search-as-you-type), as does any
+term ending in '*'.
+Results blend text relevance with popularity:
+    score = -bm25 (title 10, artist 5, tags 2) + POPULARITY_WEIGHT * log10(1 + downloads + 2 * likes)
+
+FTS5 has to score every match before sorting, which is fine for a few
+thousand matches but takes most of a second for a word found in a third of
+a million tracks. So a query is first probed for more than RANK_ALL matches.
+  selective     every match is scored and blended in one query
+  unselective   relevance barely separates that many matches, so the
+                SCAN_LIMIT most popular tracks (through the genre/mood index
+                when filtered) are checked against the terms in Python,
+                tokenized the way unicode61 does, stopping at `limit`;
+                popularity is the score. Too few hits there and the first
+                RANK_ALL matches in rowid order (which FTS5 streams cheaply)
+                are scored and blended instead, like the selective case
+Without query words it is a popularity-ordered browse of the filters.
+
+Usage:
+    python music_search.py "smooth jaz" --genre jazz
+"""
+
+import argparse
+import math
+import re
+import sqlite3
+import time
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import db
+import migrations
+
+RANK_ALL = 2000           # matches scored with bm25, at most; past this the query counts as unselective
+SCAN_LIMIT = 2000         # popular tracks to check before falling back to scoring every match
+POPULARITY_WEIGHT = 1.0
+COLUMN_WEIGHTS = (10.0, 5.0, 2.0)  # title, artist, tags
+MAX_TERMS = 8
+
+# Combining accents unicode61 drops inside a token (remove_diacritics 2); other combining marks end a token
+DIACRITICS = frozenset('\u0300\u0301\u0302\u0303\u0304\u0306\u0307\u0308\u0309\u030a\u030b\u030c\u030f'
+                       '\u0311\u031b\u0323\u0324\u0325\u0326\u0327\u0328\u032d\u032e\u0330\u0331')
+
+POPULARITY = '(downloads * 1.0 + likes * 2.0)'  # same expression as the popularity indexes
+TRACK_COLUMNS = ('id', 'source', 'external_id', 'title', 'artist', 'tags', 'preview_url', 'download_url',
+                 'file_path', 'duration', 'downloads', 'likes', 'genre', 'mood')
+
+
+def tokens(text: str) -> List[str]:
+    """Split like the unicode61 tokenizer with remove_diacritics 2.
+
+    Tokens are runs of letters, digits and private-use characters, lowercased,
+    with accents taken off Latin letters; any other character, including
+    combining marks such as Thai vowel signs, ends a token. Characters newer
+    than SQLite's Unicode tables may still split differently.
+    """
+    text = text.lower()
+    if text.isascii():
+        return re.findall(r'[a-z0-9]+', text)
+    found, current = [], []
+    for char in text:
+        if char in DIACRITICS:
+            continue
+        code = ord(char)
+        if code < 0x250 or 0x1e00 <= code < 0x1f00:  # Latin: 'é' -> 'e'
+            base = ''.join(c for c in unicodedata.normalize('NFD', char) if c not in DIACRITICS)
+            char = base if len(base) == 1 else char
+        category = unicodedata.category(char)
+        if category[0] in 'LN' or category == 'Co':
+            current.append(char)
+        elif current:
+            found.append(''.join(current))
+            current = []
+    if current:
+        found.append(''.join(current))
+    return found
+
+
+def parse_query(query: str, prefix: bool = True) -> List[Tuple[str, bool]]:
+    """(term, is_prefix) pairs, one per whitespace-separated term; the last is a prefix when `prefix` is set"""
+    terms = []
+    for raw in (query or '').split():
+        term = raw.replace('"', '')
+        if tokens(term):  # a term of punctuation only has nothing to match
+            terms.append((term.rstrip('*'), term.endswith('*')))
+    terms = terms[:MAX_TERMS]
+    return [(term, star or (prefix and i == len(terms) - 1)) for i, (term, star) in enumerate(terms)]
+
+
+def match_expression(terms: List[Tuple[str, bool]]) -> str:
+    # Quoted so user input is never parsed as FTS5 syntax
+    return ' '.join(f'"{term}"' + ('*' if is_prefix else '') for term, is_prefix in terms)
+
+
+def popularity(downloads: Optional[int], likes: Optional[int]) -> float:
+    return math.log10(1 + max((downloads or 0) + 2 * (likes or 0), 0))
+
+
+def _has_phrase(words: List[str], phrase: List[str], is_prefix: bool) -> bool:
+    n = len(phrase)
+    for start in range(len(words) - n + 1):
+        if words[start:start + n - 1] == phrase[:-1]:
+            last = words[start + n - 1]
+            if last == phrase[-1] or (is_prefix and last.startswith(phrase[-1])):
+                return True
+    return False
+
+
+def _matches(track: Dict, terms: List[Tuple[str, bool]]) -> bool:
+    # A phrase has to sit inside one column, as in FTS5
+    columns = [tokens(track[c] or '') for c in ('title', 'artist', 'tags')]
+    return all(any(_has_phrase(words, tokens(term), is_prefix) for words in columns) for term, is_prefix in terms)
+
+
+def _filters(genre: Optional[str], mood: Optional[str], alias: str = '') -> Tuple[str, List[str]]:
+    sql, params = '', []
+    if genre:
+        sql += f' AND {alias}genre = ?'
+        params.append(genre)
+    if mood:
+        sql += f' AND {alias}mood = ?'
+        params.append(mood)
+    return sql, params
+
+
+def _track(row) -> Dict:
+    return dict(zip(TRACK_COLUMNS, row))
+
+
+def search_tracks(conn: sqlite3.Connection, query: str, genre: str = None, mood: str = None,
+                  limit: int = 20, prefix: bool = True) -> List[Dict]:
+    """Best tracks for `query` within the genre/mood filters, each with a 'score'"""
+    terms = parse_query(query, prefix)
+    columns = ', '.join(TRACK_COLUMNS)
+    filters, params = _filters(genre, mood)
+
+    if not terms:
+        rows = conn.execute(f'''
+            SELECT {columns} FROM music_tracks
+            WHERE 1{filters}
+            ORDER BY {POPULARITY} DESC
+            LIMIT ?
+        ''', [*params, limit])
+        tracks = [_track(row) for row in rows]
+        for track in tracks:
+            track['score'] = round(POPULARITY_WEIGHT * popularity(track['downloads'], track['likes']), 4)
+        return tracks
+
+    match = match_expression(terms)
+    # Cheap probe: FTS5 streams matches in rowid order, so this stops at match RANK_ALL + 1
+    unselective = conn.execute(
+        'SELECT rowid FROM music_tracks_fts WHERE music_tracks_fts MATCH ? LIMIT 1 OFFSET ?', (match, RANK_ALL)
+    ).fetchone() is not None
+
+    if unselective:
+        results = []
+        rows = conn.execute(f'''
+            SELECT {columns} FROM music_tracks
+            WHERE 1{filters}
+            ORDER BY {POPULARITY} DESC
+            LIMIT ?
+        ''', [*params, SCAN_LIMIT])
+        for row in rows:
+            track = _track(row)
+            if _matches(track, terms):
+                track['score'] = round(POPULARITY_WEIGHT * popularity(track['downloads'], track['likes']), 4)
+                results.append(track)
+                if len(results) == limit:
+                    return results
+        # Matches are mostly unpopular tracks: fall through and score the first RANK_ALL of them
+
+    alias_filters, alias_params = _filters(genre, mood, 't.')
+    # No ORDER BY bm25: that would score every match before the LIMIT; the blend is sorted below
+    rows = conn.execute(f'''
+        SELECT {', '.join('t.' + c for c in TRACK_COLUMNS)}, bm25(music_tracks_fts, ?, ?, ?)
+        FROM music_tracks_fts JOIN music_tracks t ON t.id = music_tracks_fts.rowid
+        WHERE music_tracks_fts MATCH ?{alias_filters}
+        ORDER BY music_tracks_fts.rowid
+        LIMIT ?
+    ''', [*COLUMN_WEIGHTS, match, *alias_params, RANK_ALL]).fetchall()
+
+    results = []
+    for row in rows:
+        track = _track(row)
+        track['score'] = round(-row[-1] + POPULARITY_WEIGHT * popularity(track['downloads'], track['likes']), 4)
+        results.append(track)
+    results.sort(key=lambda t: -t['score'])
+    return results[:limit]
+
+
+def rebuild(conn: sqlite3.Connection):
+    """Re-derive the whole index from music_tracks"""
+    conn.execute("INSERT INTO music_tracks_fts (music_tracks_fts) VALUES ('rebuild')")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search the music library')
+    parser.add_argument('query', nargs='?', default='')
+    parser.add_argument('--genre')
+    parser.add_argument('--mood')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the index from music_tracks')
+    args = parser.parse_args()
+
+    migrations.migrate_music()
+    if args.rebuild:
+        with db.transaction(db.MUSIC_DB) as conn:
+            rebuild(conn)
+        print("✅ Rebuilt music search index")
+        return
+
+    started = time.perf_counter()
+    tracks = search_tracks(db.get_connection(db.MUSIC_DB), args.query, args.genre, args.mood, args.limit)
+    took_ms = (time.perf_counter() - started) * 1000
+    print(f"🔎 {len(tracks)} tracks in {took_ms:.1f} ms")
+    for track in tracks:
+        print(f"  {track['score']:>7.2f}  {track['title']} — {track['artist']} [{track['genre']}/{track['mood']}]")
+
+
+if __name__ == '__main__':
+    main()
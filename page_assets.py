@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Pre-compressed page assets for Heckx AI
+The embedded HTML pages and their CSS/JS are encoded once at startup (gzip,
+plus brotli when the package is installed). Each asset gets a content-hash
+ETag. CSS/JS are served under fingerprinted URLs and cached for a year;
+HTML is revalidated on every visit, so a repeat visit costs a 304.
+"""
+
+import gzip
+import hashlib
+from typing import Dict, Optional
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HTML_CACHE_CONTROL = 'no-cache'  # always revalidate, but 304 when unchanged
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class Asset:
+    def __init__(self, content: str, mimetype: str, cache_control: str):
+        raw = content.encode('utf-8')
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(raw).hexdigest()[:16]
+        self.variants = {'identity': raw, 'gzip': gzip.compress(raw, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(raw, quality=11)
+
+    def etag(self, encoding: str) -> str:
+        # Strong ETags must differ per encoding; the digest part is shared
+        return self.digest if encoding == 'identity' else f'{self.digest}-{encoding}'
+
+    def sizes(self) -> Dict[str, int]:
+        return {encoding: len(body) for encoding, body in self.variants.items()}
+
+
+class AssetRegistry:
+    def __init__(self, url_prefix: str = '/assets'):
+        self.url_prefix = url_prefix
+        self._files: Dict[str, Asset] = {}
+
+    def add_file(self, name: str, extension: str, content: str, mimetype: str) -> str:
+        """Register a CSS/JS resource and return its fingerprinted URL"""
+        asset = Asset(content, mimetype, IMMUTABLE_CACHE_CONTROL)
+        filename = f'{name}.{asset.digest}.{extension}'
+        self._files[filename] = asset
+        return f'{self.url_prefix}/{filename}'
+
+    def add_page(self, name: str, html: str, css: str = None, js: str = None) -> Asset:
+        """Split a page into its HTML shell and fingerprinted CSS/JS files"""
+        if css is not None:
+            html = html.replace('{{css_url}}', self.add_file(name, 'css', css, 'text/css'))
+        if js is not None:
+            html = html.replace('{{js_url}}', self.add_file(name, 'js', js, 'application/javascript'))
+        return Asset(html, 'text/html', HTML_CACHE_CONTROL)
+
+    def get(self, filename: str) -> Optional[Asset]:
+        return self._files.get(filename)
+
+    @staticmethod
+    def serve(asset: Asset) -> Response:
+        """Best encoding the client accepts, or 304 when its copy is current"""
+        accepted = request.accept_encodings
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.variants and accepted[candidate] > 0:
+                encoding = candidate
+                break
+
+        etags = [asset.etag(variant) for variant in asset.variants]
+        if any(request.if_none_match.contains(etag) for etag in etags):
+            response = Response(status=304)
+        else:
+            response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(asset.etag(encoding))
+        response.headers['Cache-Control'] = asset.cache_control
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
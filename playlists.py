@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Playlist storage for the Heckx AI music library
+A playlist's tracks are rows of playlist_tracks (playlist_id, position,
+track_id), keyed by (playlist_id, position) so a playlist reads back in
+order straight from the primary key. playlists.track_count is kept by
+triggers on playlist_tracks (migration 8), so listing playlists never
+counts rows, and idx_playlist_tracks_track answers "which playlists hold
+this track" without touching any playlist.
+
+Positions in the API are 0-based indexes into the playlist. Stored
+positions only have to keep the order; a deleted track leaves a gap.
+"""
+
+import sqlite3
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional
+
+PLAYLIST_COLUMNS = ('id', 'name', 'description', 'mood_tag', 'track_count', 'play_count', 'created_date')
+TRACK_COLUMNS = ('id', 'title', 'artist', 'genre', 'mood', 'duration', 'preview_url', 'download_url',
+                 'file_path', 'quality_score')
+
+MAX_TRACKS_PER_CALL = 1000
+
+
+class PlaylistNotFound(LookupError):
+    """No playlist with that id"""
+
+
+def _track_ids(conn: sqlite3.Connection, track_ids: Iterable) -> List[int]:
+    """Validated track ids, in order; ValueError on a malformed or unknown id"""
+    try:
+        ids = [int(track_id) for track_id in track_ids]
+    except (TypeError, ValueError):
+        raise ValueError('track_ids must be a list of track ids')
+    if len(ids) > MAX_TRACKS_PER_CALL:
+        raise ValueError(f'At most {MAX_TRACKS_PER_CALL} tracks at a time')
+    distinct = list(set(ids))
+    known = set()
+    for start in range(0, len(distinct), 500):  # stay under SQLite's variable limit
+        chunk = distinct[start:start + 500]
+        known.update(row[0] for row in conn.execute(
+            f"SELECT id FROM music_tracks WHERE id IN ({', '.join('?' for _ in chunk)})", chunk))
+    unknown = [track_id for track_id in distinct if track_id not in known]
+    if unknown:
+        raise ValueError(f"Unknown track ids: {', '.join(map(str, sorted(unknown)))}")
+    return ids
+
+
+def _require(conn: sqlite3.Connection, playlist_id: int) -> int:
+    """The playlist's track count; PlaylistNotFound if it doesn't exist"""
+    row = conn.execute('SELECT track_count FROM playlists WHERE id = ?', (playlist_id,)).fetchone()
+    if row is None:
+        raise PlaylistNotFound(f'Playlist {playlist_id} not found')
+    return row[0]
+
+
+def _stored_position(conn: sqlite3.Connection, playlist_id: int, index: int) -> Optional[int]:
+    row = conn.execute('''
+        SELECT position FROM playlist_tracks WHERE playlist_id = ?
+        ORDER BY position LIMIT 1 OFFSET ?
+    ''', (playlist_id, index)).fetchone()
+    return row[0] if row else None
+
+
+def _shift(conn: sqlite3.Connection, playlist_id: int, start: int, delta: int):
+    """Move stored positions >= start by delta, in two passes so no step collides on the primary key"""
+    conn.execute('''
+        UPDATE playlist_tracks SET position = -(position + ?) - 1
+        WHERE playlist_id = ? AND position >= ?
+    ''', (delta, playlist_id, start))
+    conn.execute('''
+        UPDATE playlist_tracks SET position = -position - 1
+        WHERE playlist_id = ? AND position < 0
+    ''', (playlist_id,))
+
+
+def _index(value, name: str) -> int:
+    try:
+        index = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number')
+    if index < 0:
+        raise ValueError(f'{name} must not be negative')
+    return index
+
+
+def create_playlist(conn: sqlite3.Connection, name: str, track_ids: Iterable = (), description: str = None,
+                    mood_tag: str = None) -> int:
+    """Create a playlist holding track_ids in order; returns its id"""
+    ids = _track_ids(conn, track_ids)
+    playlist_id = conn.execute('INSERT INTO playlists (name, description, mood_tag) VALUES (?, ?, ?)',
+                               (name, description, mood_tag)).lastrowid
+    conn.executemany('INSERT INTO playlist_tracks (playlist_id, position, track_id) VALUES (?, ?, ?)',
+                     [(playlist_id, position, track_id) for position, track_id in enumerate(ids)])
+    return playlist_id
+
+
+def add_tracks(conn: sqlite3.Connection, playlist_id: int, track_ids: Iterable, position=None) -> int:
+    """Insert tracks before index `position` (default: append); returns the new track count"""
+    _require(conn, playlist_id)
+    ids = _track_ids(conn, track_ids)
+    start = None if position is None else _stored_position(conn, playlist_id, _index(position, 'position'))
+    if start is None:
+        start = conn.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM playlist_tracks WHERE playlist_id = ?',
+                             (playlist_id,)).fetchone()[0]
+    else:
+        _shift(conn, playlist_id, start, len(ids))
+    conn.executemany('INSERT INTO playlist_tracks (playlist_id, position, track_id) VALUES (?, ?, ?)',
+                     [(playlist_id, start + offset, track_id) for offset, track_id in enumerate(ids)])
+    return _require(conn, playlist_id)
+
+
+def remove_track(conn: sqlite3.Connection, playlist_id: int, position) -> int:
+    """Remove the track at index `position`; returns its track id"""
+    _require(conn, playlist_id)
+    stored = _stored_position(conn, playlist_id, _index(position, 'position'))
+    if stored is None:
+        raise ValueError(f'No track at position {position}')
+    track_id = conn.execute('DELETE FROM playlist_tracks WHERE playlist_id = ? AND position = ? RETURNING track_id',
+                            (playlist_id, stored)).fetchone()[0]
+    _shift(conn, playlist_id, stored + 1, -1)
+    return track_id
+
+
+def move_track(conn: sqlite3.Connection, playlist_id: int, from_position, to_position) -> int:
+    """Move the track at index from_position so it ends up at index to_position; returns its track id"""
+    from_index, to_index = _index(from_position, 'from_position'), _index(to_position, 'to_position')
+    track_id = remove_track(conn, playlist_id, from_index)
+    start = _stored_position(conn, playlist_id, to_index)
+    if start is None:
+        start = conn.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM playlist_tracks WHERE playlist_id = ?',
+                             (playlist_id,)).fetchone()[0]
+    else:
+        _shift(conn, playlist_id, start, 1)
+    conn.execute('INSERT INTO playlist_tracks (playlist_id, position, track_id) VALUES (?, ?, ?)',
+                 (playlist_id, start, track_id))
+    return track_id
+
+
+def delete_playlist(conn: sqlite3.Connection, playlist_id: int):
+    _require(conn, playlist_id)
+    conn.execute('DELETE FROM playlist_tracks WHERE playlist_id = ?', (playlist_id,))
+    conn.execute('DELETE FROM playlists WHERE id = ?', (playlist_id,))
+
+
+def list_playlists(conn: sqlite3.Connection, include_tracks: bool = False, track_id: int = None,
+                   playlist_id: int = None) -> List[Dict]:
+    """Playlists, newest first, with stored track counts and optionally their tracks, in one query.
+
+    track_id keeps only playlists holding that track; playlist_id picks one playlist.
+    """
+    filters, params = [], []
+    if track_id is not None:
+        filters.append('p.id IN (SELECT playlist_id FROM playlist_tracks WHERE track_id = ?)')
+        params.append(track_id)
+    if playlist_id is not None:
+        filters.append('p.id = ?')
+        params.append(playlist_id)
+    where = f"WHERE {' AND '.join(filters)}" if filters else ''
+    columns = ', '.join('p.' + c for c in PLAYLIST_COLUMNS)
+
+    if not include_tracks:
+        rows = conn.execute(f'''
+            SELECT {columns} FROM playlists p {where}
+            ORDER BY p.created_date DESC, p.id DESC
+        ''', params)
+        return [dict(zip(PLAYLIST_COLUMNS, row)) for row in rows]
+
+    rows = conn.execute(f'''
+        SELECT {columns}, pt.position, {', '.join('t.' + c for c in TRACK_COLUMNS)}
+        FROM playlists p
+        LEFT JOIN playlist_tracks pt ON pt.playlist_id = p.id
+        LEFT JOIN music_tracks t ON t.id = pt.track_id
+        {where}
+        ORDER BY p.created_date DESC, p.id DESC, pt.position
+    ''', params)
+    playlists = []
+    width = len(PLAYLIST_COLUMNS)
+    for _, group in groupby(rows, key=lambda row: row[0]):
+        group = list(group)
+        playlist = dict(zip(PLAYLIST_COLUMNS, group[0][:width]))
+        playlist['tracks'] = [dict(zip(TRACK_COLUMNS, row[width + 1:]), position=index)
+                              for index, row in enumerate(row for row in group if row[width] is not None)]
+        playlists.append(playlist)
+    return playlists
+
+
+def get_playlist(conn: sqlite3.Connection, playlist_id: int) -> Dict:
+    """One playlist with its tracks in order; PlaylistNotFound if it doesn't exist"""
+    found = list_playlists(conn, include_tracks=True, playlist_id=playlist_id)
+    if not found:
+        raise PlaylistNotFound(f'Playlist {playlist_id} not found')
+    return found[0]
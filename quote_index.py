@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Indexed quote sampling for Heckx AI
+Quotes are bucketed once by every combination of (language, theme, author),
+so a filtered random pick is one dict lookup plus one randrange, whatever
+the corpus size. Indexes are immutable; QuoteCatalog swaps in a rebuilt one
+in a single reference assignment, so readers never see a half-built index.
+"""
+
+import csv
+import hashlib
+import itertools
+import json
+import os
+import random
+import sqlite3
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+class QuoteIndex:
+    def __init__(self, entries: Iterable[Tuple[str, str, str, Any]]):
+        """entries: (language, theme, author, quote) tuples; quote is returned as-is by sample()"""
+        buckets: Dict[Tuple, List] = {}
+        for language, theme, author, quote in entries:
+            # Index under every wildcard combination, e.g. (language, None, None)
+            for key in itertools.product((language, None), (theme, None), (author, None)):
+                buckets.setdefault(key, []).append(quote)
+
+        self._buckets = MappingProxyType({key: tuple(quotes) for key, quotes in buckets.items()})
+        self.size = len(self._buckets.get((None, None, None), ()))
+        self.themes = MappingProxyType({
+            language: tuple(sorted(theme for lang, theme, author in self._buckets
+                                   if lang == language and theme is not None and author is None))
+            for language in {key[0] for key in self._buckets}
+        })
+
+    def sample(self, language: str = None, theme: str = None, author: str = None,
+               rng: random.Random = random) -> Optional[Any]:
+        """Uniform pick among quotes matching the given fields (None = any); None if there are none"""
+        bucket = self._buckets.get((language, theme, author))
+        if not bucket:
+            return None
+        return bucket[rng.randrange(len(bucket))]
+
+    def quotes(self, language: str = None, theme: str = None, author: str = None) -> Tuple:
+        """All matching quotes (a shared tuple, not a copy)"""
+        return self._buckets.get((language, theme, author), ())
+
+    def count(self, language: str = None, theme: str = None, author: str = None) -> int:
+        return len(self.quotes(language, theme, author))
+
+
+class QuoteCatalog:
+    """Holder for the current index; replace() rebuilds and swaps it atomically"""
+
+    def __init__(self, entries: Iterable[Tuple[str, str, str, Any]] = ()):
+        self.index = QuoteIndex(entries)
+
+    def replace(self, entries: Iterable[Tuple[str, str, str, Any]]) -> QuoteIndex:
+        index = QuoteIndex(entries)  # built off to the side, requests keep using the old one
+        self.index = index
+        return index
+
+    def sample(self, language: str = None, theme: str = None, author: str = None,
+               rng: random.Random = random) -> Optional[Any]:
+        return self.index.sample(language, theme, author, rng)
+
+
+class DailyPicker:
+    """Quote of the day: a hash of (date, language, theme) seeds a private RNG.
+
+    Every worker and thread picks the same quote for the same day without
+    touching the global random state; results are memoized for the current date.
+    """
+
+    def __init__(self, catalog: QuoteCatalog):
+        self.catalog = catalog
+        self._date = None
+        self._memo: Dict[Tuple, Any] = {}
+
+    def pick(self, date: str, language: str = None, theme: str = None) -> Optional[Any]:
+        index = self.catalog.index
+        if self._date != date:
+            self._memo, self._date = {}, date  # yesterday's picks are never asked for again
+        key = (language, theme)
+        cached = self._memo.get(key)
+        if cached is not None and cached[0] is index:
+            return cached[1]
+
+        digest = hashlib.sha256(f'{date}|{language}|{theme}'.encode('utf-8')).digest()
+        quote = index.sample(language, theme, rng=random.Random(int.from_bytes(digest[:8], 'big')))
+        self._memo[key] = (index, quote)  # tied to the index it came from, so a reload re-picks
+        return quote
+
+
+def _normalize(record: Dict, default_language: str) -> Dict:
+    """Accept both the app's (text, category) and the generator's (quote, theme) field names"""
+    quote = dict(record)
+    quote.setdefault('text', quote.get('quote', ''))
+    quote.setdefault('quote', quote['text'])
+    quote.setdefault('theme', quote.get('category', 'wisdom'))
+    quote.setdefault('category', quote['theme'])
+    quote.setdefault('author', 'Unknown')
+    quote.setdefault('language', default_language)
+    return quote
+
+
+def load_corpus(path: str, default_language: str = 'thai') -> List[Dict]:
+    """Read quotes from a JSON list, a CSV file with a header row or a SQLite `quotes` table into normalized dicts"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path, encoding='utf-8') as f:
+            records = json.load(f)
+    elif extension == '.csv':
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            records = [{key: value for key, value in row.items() if key and value} for row in csv.DictReader(f)]
+    else:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            conn.row_factory = sqlite3.Row
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(quotes)')}
+            wanted = [c for c in ('text', 'quote', 'author', 'category', 'theme', 'language') if c in columns]
+            records = [dict(row) for row in conn.execute(f"SELECT {', '.join(wanted)} FROM quotes")]
+        finally:
+            conn.close()
+    return [_normalize(record, default_language) for record in records]
+
+
+def entries_for(quotes: Iterable[Dict]) -> Iterable[Tuple[str, str, str, Dict]]:
+    """Index entries for normalized quote dicts"""
+    return ((q['language'], q['theme'], q['author'], q) for q in quotes)
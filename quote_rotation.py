@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Per-user no-repeat quote rotation for Heckx AI
+Each user's seen quote ids live in a compact set (a sorted uint32 array
+while sparse, a bitset once that is smaller) held in an in-memory LRU.
+Draws are uniform over the quotes the user has not seen in the requested
+category; when none are left the category starts over. Changed users are
+written to SQLite in the background, and read back on an LRU miss.
+
+A draw holds only that user's lock, so users draw in parallel; the shared
+lock covers the LRU and the list of evicted users, never a draw.
+
+Tuning:
+    HECKX_QUOTE_ROTATION          0 to disable and pick with plain random sampling (default 1)
+    HECKX_ROTATION_USERS          users kept in memory per worker (default 100000)
+    HECKX_ROTATION_FLUSH_S        seconds between background saves (default 5)
+"""
+
+import atexit
+import os
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+import background
+import db
+from quote_index import QuoteCatalog
+
+REJECTION_TRIES = 16  # beyond this the unseen share is under ~1/16, switch to an explicit list
+
+
+class SeenQuotes:
+    """Quote ids shown to one user"""
+
+    __slots__ = ('_sparse', '_dense', 'counts', 'tails', 'dirty', 'lock')
+
+    def __init__(self):
+        self.lock = threading.Lock()  # held while drawing for, or saving, this user
+        self._sparse: Optional[array] = array('I')
+        self._dense: Optional[bytearray] = None
+        self.counts: Dict[str, int] = {}  # seen quotes per category in the current corpus
+        self.tails: Optional[Dict[Optional[str], List[Dict]]] = None  # unseen lists for nearly exhausted scopes
+        self.dirty = False
+
+    def __contains__(self, quote_id: int) -> bool:
+        if self._dense is not None:
+            byte = quote_id >> 3
+            return byte < len(self._dense) and bool(self._dense[byte] & (1 << (quote_id & 7)))
+        i = bisect_left(self._sparse, quote_id)
+        return i < len(self._sparse) and self._sparse[i] == quote_id
+
+    def ids(self) -> Iterable[int]:
+        if self._dense is None:
+            return iter(self._sparse)
+        return (byte * 8 + bit for byte, value in enumerate(self._dense) if value
+                for bit in range(8) if value & (1 << bit))
+
+    def add(self, quote_id: int, category: str):
+        if self._dense is not None:
+            byte = quote_id >> 3
+            if byte >= len(self._dense):
+                self._dense.extend(bytes(byte + 1 - len(self._dense)))
+            self._dense[byte] |= 1 << (quote_id & 7)
+        else:
+            insort(self._sparse, quote_id)
+            # 4 bytes per id vs 1 bit per possible id: switch once the array is the bigger one
+            if len(self._sparse) * 32 > self._sparse[-1] + 8:
+                self._to_dense()
+        self.counts[category] = self.counts.get(category, 0) + 1
+        self.dirty = True
+
+    def forget(self, quote_ids: Iterable[int], category: Optional[str]):
+        """Drop ids (one category, or everything when category is None)"""
+        if category is None:
+            self._sparse, self._dense = array('I'), None
+            self.counts = {}
+        else:
+            for quote_id in quote_ids:
+                if self._dense is not None:
+                    byte = quote_id >> 3
+                    if byte < len(self._dense):
+                        self._dense[byte] &= ~(1 << (quote_id & 7)) & 0xFF
+                else:
+                    i = bisect_left(self._sparse, quote_id)
+                    if i < len(self._sparse) and self._sparse[i] == quote_id:
+                        del self._sparse[i]
+            self.counts.pop(category, None)
+        self.tails = None
+        self.dirty = True
+
+    def _to_dense(self):
+        dense = bytearray((self._sparse[-1] >> 3) + 1)
+        for quote_id in self._sparse:
+            dense[quote_id >> 3] |= 1 << (quote_id & 7)
+        self._sparse, self._dense = None, dense
+
+    def to_bytes(self) -> bytes:
+        if self._dense is not None:
+            return b'D' + bytes(self._dense)
+        return b'S' + self._sparse.tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, category_of: Dict[int, str]) -> 'SeenQuotes':
+        seen = cls()
+        if blob[:1] == b'D':
+            seen._sparse, seen._dense = None, bytearray(blob[1:])
+        else:
+            seen._sparse.frombytes(blob[1:])
+        for quote_id in seen.ids():
+            category = category_of.get(quote_id)
+            if category is not None:  # ids of quotes no longer in the corpus just stay unused
+                seen.counts[category] = seen.counts.get(category, 0) + 1
+        return seen
+
+
+class QuoteRotation:
+    def __init__(self, catalog: QuoteCatalog, capacity: int = 100000, flush_interval: float = 5.0,
+                 path: str = None, rng: random.Random = None):
+        self.catalog = catalog
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.path = path or db.CONVERSATIONS_DB
+        self.rng = rng or random.Random()
+
+        self._users: 'OrderedDict[str, SeenQuotes]' = OrderedDict()
+        self._evicted: Dict[str, SeenQuotes] = {}  # dirty users pushed out of the LRU, not saved yet
+        self._lock = threading.Lock()  # _users and _evicted only; each SeenQuotes has its own
+        self._category_of: Dict[int, str] = {}
+        self._category_index = None
+        self._thread = background.lazy_thread(self._run, 'quote-rotation')
+
+    def _ensure_started(self):
+        self._thread.get()
+
+    def _categories(self) -> Dict[int, str]:
+        index = self.catalog.index
+        if self._category_index is not index:
+            self._category_of = {q['quote_id']: q['category'] for q in index.quotes()}
+            self._category_index = index
+        return self._category_of
+
+    def _state(self, user_id: str) -> SeenQuotes:
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is not None:
+                self._users.move_to_end(user_id)
+                return state
+            # Not saved yet: take the same object back (flush() drops it from _evicted once saved)
+            state = self._evicted.get(user_id)
+            if state is not None:
+                return self._insert(user_id, state)
+
+        row = db.get_connection(self.path).execute(
+            'SELECT seen FROM user_seen_quotes WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        state = SeenQuotes.from_bytes(row[0], self._categories()) if row else SeenQuotes()
+
+        with self._lock:
+            existing = self._users.get(user_id) or self._evicted.get(user_id)
+            if existing is not None:  # another request loaded it meanwhile
+                state = existing
+            return self._insert(user_id, state)
+
+    def _insert(self, user_id: str, state: SeenQuotes) -> SeenQuotes:
+        # Called with _lock held; a state being drawn for can be evicted, its lock still guards it
+        self._users[user_id] = state
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.capacity:
+            old_user, old_state = self._users.popitem(last=False)
+            if old_state.dirty or old_state.lock.locked():
+                self._evicted[old_user] = old_state
+        return state
+
+    def next_quote(self, user_id: str, category: str = None,
+                   draw: Callable[[], Optional[Dict]] = None) -> Optional[Dict]:
+        """A quote this user has not seen in `category` (None or unknown = any category).
+
+        `draw` replaces the uniform proposal while most quotes are unseen, e.g.
+        a weighted sampler over the same scope; the final few are uniform.
+        """
+        self._ensure_started()
+        index = self.catalog.index
+        bucket = index.quotes(theme=category) if category else ()
+        if not bucket:
+            bucket, category = index.quotes(), None
+        if not bucket:
+            return None
+
+        while True:
+            state = self._state(user_id)
+            with state.lock:
+                with self._lock:
+                    # Evicted and dropped before we got its lock: a later load wouldn't see this draw
+                    live = self._users.get(user_id) is state or self._evicted.get(user_id) is state
+                if live:
+                    quote = self._draw(state, bucket, category, draw)
+                    state.add(quote['quote_id'], quote['category'])
+                    return quote
+
+    def _draw(self, state: SeenQuotes, bucket, scope: Optional[str], draw=None) -> Dict:
+        size = len(bucket)
+        seen_in_scope = sum(state.counts.values()) if scope is None else state.counts.get(scope, 0)
+        if seen_in_scope >= size:
+            state.forget((q['quote_id'] for q in bucket), scope)  # exhausted: start the rotation over
+
+        tail = state.tails.get(scope) if state.tails else None
+        if tail is None:
+            # Rejection sampling: uniform over unseen, O(1) expected while most are unseen
+            for _ in range(REJECTION_TRIES):
+                quote = (draw and draw()) or bucket[self.rng.randrange(size)]
+                if quote['quote_id'] not in state:
+                    return quote
+            if state.tails is None:
+                state.tails = {}
+            tail = state.tails[scope] = [q for q in bucket if q['quote_id'] not in state]
+
+        # Few left: pop uniformly from the explicit list; entries seen via other scopes are skipped
+        while tail:
+            i = self.rng.randrange(len(tail))
+            quote = tail[i]
+            tail[i] = tail[-1]
+            tail.pop()
+            if quote['quote_id'] not in state:
+                return quote
+
+        state.forget((q['quote_id'] for q in bucket), scope)
+        return bucket[self.rng.randrange(size)]
+
+    def flush(self):
+        """Save every changed user in one transaction"""
+        with self._lock:
+            evicted = list(self._evicted.items())
+            changed = [(user_id, state) for user_id, state in self._users.items() if state.dirty] + evicted
+        rows = []
+        for user_id, state in changed:
+            with state.lock:  # one user at a time, so draws for everyone else carry on
+                if state.dirty:
+                    rows.append((user_id, state.to_bytes()))
+                    state.dirty = False
+        if not rows:
+            return 0
+
+        now = int(time.time())
+        try:
+            with db.transaction(self.path) as conn:
+                conn.executemany('''
+                    INSERT INTO user_seen_quotes (user_id, seen, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET seen = excluded.seen, updated_at = excluded.updated_at
+                ''', [(user_id, blob, now) for user_id, blob in rows])
+        except Exception:
+            for _, state in changed:
+                state.dirty = True  # saved again next time; evicted ones are still in _evicted
+            raise
+        with self._lock:
+            for user_id, state in evicted:
+                # Drawn for again since it was saved: keep it for the next flush
+                if self._evicted.get(user_id) is state and not state.dirty and not state.lock.locked():
+                    del self._evicted[user_id]
+        return len(rows)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'users_in_memory': len(self._users), 'unsaved_evicted': len(self._evicted)}
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Saving quote rotation state failed: {e}")
+
+
+def create_rotation_from_env(catalog: QuoteCatalog) -> Optional[QuoteRotation]:
+    """Build the rotation unless HECKX_QUOTE_ROTATION=0, registering the shutdown save"""
+    if os.environ.get('HECKX_QUOTE_ROTATION', '1').lower() in ('0', 'false', 'no'):
+        return None
+
+    rotation = QuoteRotation(
+        catalog,
+        capacity=int(os.environ.get('HECKX_ROTATION_USERS', 100000)),
+        flush_interval=float(os.environ.get('HECKX_ROTATION_FLUSH_S', 5))
+    )
+    atexit.register(rotation.flush)
+    return rotation
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Full-text quote search for Heckx AI
+Backed by the quotes_fts table (FTS5, trigram tokenizer; see migrations.py).
+Trigrams index every 3-character substring, which suits Thai: there are no
+spaces between words, so word-based tokenizers and LIKE on words fail, but a
+substring index finds any phrase without a dictionary.
+
+Query terms are split on whitespace and must all match. Terms of 3+
+characters are looked up in the index; shorter ones (common in Thai, e.g.
+"ใจ") can't use trigrams and are checked with LIKE on the text or author of
+those rows, or of the quotes / the user's history when every term is short.
+Either way a term may match the text or the author, as in the index.
+
+Ranking: bm25 in FTS5 scores every match before sorting, which costs tens
+of ms once a term is in thousands of quotes. Instead the first
+RANK_CANDIDATES matches (in rowid order, which FTS5 streams cheaply) are
+ranked in Python by how much of the quote the terms cover. Since every
+candidate contains every term, that captures bm25's tf and length parts.
+Users with up to HISTORY_SCAN_ROWS history rows are searched by scanning
+their own rows, which beats probing every corpus match.
+
+Usage:
+    python quote_search.py "ความสุข"                  # search quotes
+    python quote_search.py "ความสุข" --user USER_ID   # search one user's history
+    python quote_search.py --rebuild                 # rebuild the index from the quotes table
+"""
+
+import argparse
+import html
+import re
+import sqlite3
+import time
+from typing import Dict, List, Tuple
+
+import db
+import migrations
+
+TRIGRAM = 3
+MAX_TERMS = 8
+RANK_CANDIDATES = 500
+HISTORY_SCAN_ROWS = 20000
+
+
+def split_terms(query: str) -> Tuple[List[str], List[str]]:
+    """(terms the trigram index can answer, shorter terms for LIKE)"""
+    terms = list(dict.fromkeys(query.split()))[:MAX_TERMS]
+    return [t for t in terms if len(t) >= TRIGRAM], [t for t in terms if len(t) < TRIGRAM]
+
+
+def match_expression(terms: List[str]) -> str:
+    # Each term as an FTS5 string, so user input is never parsed as query syntax
+    return ' AND '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def like_pattern(term: str) -> str:
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def highlight(text: str, terms: List[str]) -> str:
+    """HTML-escaped text with every term occurrence wrapped in <mark>"""
+    if not terms:
+        return html.escape(text)
+    pattern = re.compile('|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    parts, last = [], 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group())}</mark>')
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return ''.join(parts)
+
+
+def coverage(text: str, terms: List[str]) -> float:
+    """Share of the text covered by term occurrences (0..1)"""
+    lowered = text.lower()
+    covered = sum(lowered.count(term.lower()) * len(term) for term in terms)
+    return round(min(covered / max(len(text), 1), 1.0), 4)
+
+
+def _like_filters(terms: List[str], alias: str = 'q') -> Tuple[str, List[str]]:
+    # Each term in the text or the author, like the index (quotes_fts covers both)
+    sql = ''.join(f" AND ({alias}.text LIKE ? ESCAPE '\\' OR {alias}.author LIKE ? ESCAPE '\\')" for _ in terms)
+    return sql, [like_pattern(t) for t in terms for _ in range(2)]
+
+
+def _result(row, terms: List[str]) -> Dict:
+    quote_id, text, author, category = row[:4]
+    return {
+        'quote_id': quote_id,
+        'text': text,
+        'author': author,
+        'category': category,
+        'score': coverage(text, terms) + coverage(author, terms) / 2
+    }
+
+
+def _top(results: List[Dict], terms: List[str], limit: int, key) -> List[Dict]:
+    results.sort(key=key)
+    results = results[:limit]
+    for result in results:  # highlighting is the slow part, so only for the returned page
+        result['highlight'] = highlight(result['text'], terms)
+        result['author_highlight'] = highlight(result['author'], terms)
+    return results
+
+
+def search_quotes(conn: sqlite3.Connection, query: str, category: str = None, limit: int = 20) -> List[Dict]:
+    """Quotes matching every term, best coverage first"""
+    long_terms, short = split_terms(query)
+    terms = long_terms + short
+    if not terms:
+        return []
+    filters, params = _like_filters(short)
+    if category:
+        filters += ' AND q.category = ?'
+        params.append(category)
+
+    if long_terms:
+        rows = conn.execute(f'''
+            SELECT q.id, q.text, q.author, q.category
+            FROM quotes_fts JOIN quotes q ON q.id = quotes_fts.rowid
+            WHERE quotes_fts MATCH ?{filters}
+            ORDER BY quotes_fts.rowid
+            LIMIT ?
+        ''', [match_expression(long_terms), *params, RANK_CANDIDATES]).fetchall()
+    else:
+        rows = conn.execute(f'''
+            SELECT q.id, q.text, q.author, q.category
+            FROM quotes q
+            WHERE 1{filters}
+            ORDER BY q.id
+            LIMIT ?
+        ''', [*params, RANK_CANDIDATES]).fetchall()
+
+    return _top([_result(row, terms) for row in rows], terms, limit, lambda r: -r['score'])
+
+
+def search_history(conn: sqlite3.Connection, user_id: str, query: str, limit: int = 20) -> List[Dict]:
+    """Distinct quotes from one user's history matching every term, best coverage then most recent first"""
+    long_terms, short = split_terms(query)
+    terms = long_terms + short
+    if not terms:
+        return []
+
+    # Bounded probe instead of COUNT(*): stops after HISTORY_SCAN_ROWS index entries however long the history
+    long_history = conn.execute('SELECT 1 FROM conversations WHERE user_id = ? LIMIT 1 OFFSET ?',
+                                (user_id, HISTORY_SCAN_ROWS)).fetchone() is not None
+    if not long_history or not long_terms:
+        # The user's rows in (user_id, quote_id) order, so grouping needs no sort;
+        # a long history with only short terms ranks its first matches, like the index path
+        filters, params = _like_filters(terms)
+        rows = conn.execute(f'''
+            SELECT q.id, q.text, q.author, q.category, COUNT(*), MAX(c.created_at)
+            FROM conversations c JOIN quotes q ON q.id = c.quote_id
+            WHERE c.user_id = ?{filters}
+            GROUP BY c.quote_id
+            LIMIT ?
+        ''', [user_id, *params, RANK_CANDIDATES if long_history else -1]).fetchall()
+    else:
+        # Long history: walk the corpus matches, one index probe each for "has this user seen it".
+        # Plain ? placeholders continue after ?2, so the LIKE filters and the limit follow in order
+        filters, params = _like_filters(short)
+        rows = conn.execute(f'''
+            SELECT q.id, q.text, q.author, q.category,
+                   (SELECT COUNT(*) FROM conversations c WHERE c.user_id = ?1 AND c.quote_id = q.id),
+                   (SELECT MAX(c.created_at) FROM conversations c WHERE c.user_id = ?1 AND c.quote_id = q.id)
+            FROM quotes_fts JOIN quotes q ON q.id = quotes_fts.rowid
+            WHERE quotes_fts MATCH ?2{filters}
+              AND EXISTS (SELECT 1 FROM conversations c WHERE c.user_id = ?1 AND c.quote_id = q.id)
+            ORDER BY quotes_fts.rowid
+            LIMIT ?
+        ''', [user_id, match_expression(long_terms), *params, RANK_CANDIDATES]).fetchall()
+
+    results = []
+    for row in rows:
+        result = _result(row, terms)
+        result['times_seen'], result['last_seen'] = row[4], row[5]
+        results.append(result)
+    return _top(results, terms, limit, lambda r: (-r['score'], -r['last_seen']))
+
+
+def rebuild(conn: sqlite3.Connection):
+    """Re-derive the whole index from the quotes table"""
+    conn.execute("INSERT INTO quotes_fts (quotes_fts) VALUES ('rebuild')")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search quotes or a user history')
+    parser.add_argument('query', nargs='?')
+    parser.add_argument('--user', help='search this user\'s history instead of all quotes')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the index from the quotes table')
+    args = parser.parse_args()
+
+    migrations.migrate_conversations()
+
+    if args.rebuild:
+        with db.transaction() as conn:
+            rebuild(conn)
+        print("✅ Rebuilt quote search index")
+        return
+    if not args.query:
+        parser.error('query is required')
+
+    conn = db.get_connection()
+    started = time.perf_counter()
+    if args.user:
+        results = search_history(conn, args.user, args.query, args.limit)
+    else:
+        results = search_quotes(conn, args.query, limit=args.limit)
+    took_ms = (time.perf_counter() - started) * 1000
+
+    print(f"🔎 {len(results)} results in {took_ms:.1f} ms")
+    for result in results:
+        print(f"  [{result['category']}] {result['highlight']} — {result['author']}")
+
+
+if __name__ == '__main__':
+    main()
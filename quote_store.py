@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Compiled quote corpus for Heckx AI
+A read-only file every worker memory-maps, so the quote text lives once in
+the OS page cache instead of once per worker. Quotes are read field by field
+straight from the mapping. A watcher thread swaps in a new mapping when the
+file is replaced, with no restart.
+
+File layout (little-endian):
+    header    magic b'HQC1', record count, field count (uint32 each)
+    ids       one uint32 quote id per record
+    offsets   record count * field count + 1 uint32 offsets into the blob
+    blob      UTF-8 text of every field, back to back
+Fields are text, author, theme, language and extra (a JSON object of any
+other source columns, '' when there are none).
+
+Build one from JSON or CSV (columns text/quote, author, theme/category,
+language, optional id) and point the app at it:
+    python quote_store.py build quotes.csv quotes.hqc --db conversations.db
+    HECKX_QUOTE_CORPUS=quotes.hqc         checked every HECKX_CORPUS_POLL_S seconds (default 2)
+With --db the ids are the quotes-table row ids in that database (app.py needs
+this, so history rows can point at corpus quotes); without it they are the
+source ids, or the record number.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import background
+import db
+import migrations
+import quote_index
+
+MAGIC = b'HQC1'
+HEADER = struct.Struct('<4sII')
+FIELDS = ('text', 'author', 'theme', 'language', 'extra')
+FIELD_INDEX = {name: i for i, name in enumerate(FIELDS)}
+ALIASES = {'quote': 'text', 'category': 'theme'}  # the app and the generator name these differently
+STANDARD_KEYS = set(FIELDS) | set(ALIASES) | {'id', 'quote_id'}
+
+
+def _uint32s(raw) -> array:
+    values = array('I')
+    values.frombytes(raw)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+class StoredQuote(Mapping):
+    """A read-only quote dict whose fields are decoded from the mapping on access"""
+
+    __slots__ = ('_store', '_n', 'quote_id')
+
+    def __init__(self, store: 'QuoteStore', n: int, quote_id: int):
+        self._store = store
+        self._n = n
+        self.quote_id = quote_id
+
+    def __getitem__(self, key):
+        if key in ('quote_id', 'id'):
+            return self.quote_id
+        field = FIELD_INDEX.get(ALIASES.get(key, key))
+        if field is not None and key != 'extra':
+            return self._store.field(self._n, field)
+        return self._extra()[key]
+
+    def _extra(self) -> Dict:
+        raw = self._store.field(self._n, FIELD_INDEX['extra'])
+        return json.loads(raw) if raw else {}
+
+    def __iter__(self) -> Iterator[str]:
+        yield from ('text', 'quote', 'author', 'theme', 'category', 'language', 'quote_id')
+        yield from self._extra()
+
+    def __len__(self) -> int:
+        return 7 + len(self._extra())
+
+    def __repr__(self):
+        return f'StoredQuote({self.quote_id}, {self["text"][:30]!r})'
+
+
+class QuoteStore:
+    """Sequence of StoredQuote over one memory-mapped corpus file"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f'{path} is not a quote corpus (too short)')
+        magic, count, fields = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or fields != len(FIELDS):
+            raise ValueError(f'{path} is not a quote corpus (bad header)')
+
+        ids_at = HEADER.size
+        offsets_at = ids_at + 4 * count
+        self._blob_at = offsets_at + 4 * (count * fields + 1)
+        if len(self._map) < self._blob_at:
+            raise ValueError(f'{path} is truncated')
+        # Only the two small uint32 tables are copied; the text stays in the shared mapping
+        self._ids = _uint32s(self._map[ids_at:offsets_at])
+        self._offsets = _uint32s(self._map[offsets_at:self._blob_at])
+        if self._blob_at + self._offsets[-1] != len(self._map):
+            raise ValueError(f'{path} is truncated')
+        self.path = path
+        self.count = count
+
+    def field(self, n: int, field: int) -> str:
+        i = n * len(FIELDS) + field
+        start = self._blob_at + self._offsets[i]
+        return str(self._map[start:self._blob_at + self._offsets[i + 1]], 'utf-8')
+
+    def quote(self, n: int, quote_id: int = None) -> StoredQuote:
+        """Record n, optionally under another id (e.g. the app's quotes-table row id)"""
+        return StoredQuote(self, n, self._ids[n] if quote_id is None else quote_id)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, n: int) -> StoredQuote:
+        if not -self.count <= n < self.count:
+            raise IndexError(n)
+        return self.quote(n % self.count)
+
+    def __iter__(self) -> Iterator[StoredQuote]:
+        return (self.quote(n) for n in range(self.count))
+
+
+def assign_row_ids(quotes: List[Dict], db_path: str) -> List[Dict]:
+    """Set each quote's id to its row id in the quotes table of `db_path`, adding the rows that are missing"""
+    migrations.migrate(db_path, migrations.CONVERSATIONS_MIGRATIONS)
+    with db.transaction(db_path) as conn:
+        for quote in quotes:
+            row = (str(quote['theme']), str(quote['text']), str(quote['author']))
+            conn.execute('INSERT OR IGNORE INTO quotes (category, text, author) VALUES (?, ?, ?)', row)
+            quote['id'] = conn.execute('SELECT id FROM quotes WHERE category = ? AND text = ? AND author = ?',
+                                       row).fetchone()[0]
+    return quotes
+
+
+def build(quotes: Iterable[Dict], path: str, db_path: str = None) -> int:
+    """Compile normalized quote dicts (see quote_index.load_corpus) into `path`, replacing it atomically
+
+    With db_path the stored ids are that database's quotes-table row ids (see assign_row_ids).
+    """
+    if db_path is not None:
+        quotes = assign_row_ids(list(quotes), db_path)
+    ids = array('I')
+    offsets = array('I', [0])
+    blob = bytearray()
+    for n, quote in enumerate(quotes):
+        ids.append(int(quote.get('id') or n + 1))
+        extra = {key: value for key, value in quote.items() if key not in STANDARD_KEYS}
+        for name in FIELDS:
+            if name == 'extra':
+                value = json.dumps(extra, ensure_ascii=False, sort_keys=True) if extra else ''
+            else:
+                value = str(quote[name])
+            blob += value.encode('utf-8')
+            offsets.append(len(blob))
+    if len(blob) >= 2 ** 32:
+        raise ValueError('Corpus text is over 4 GB')
+
+    if sys.byteorder != 'little':
+        ids.byteswap()
+        offsets.byteswap()
+    count = len(ids)
+    # Written beside the target and renamed over it: workers still mapping the old
+    # file keep reading it, the watchers see a new inode and reload
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, count, len(FIELDS)))
+        f.write(ids.tobytes())
+        f.write(offsets.tobytes())
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+class CorpusWatcher:
+    """Calls on_load(QuoteStore) at startup and whenever the file is replaced or rewritten (never with an empty one)"""
+
+    def __init__(self, path: str, on_load: Callable[[QuoteStore], None], interval: float = 2.0):
+        self.path = path
+        self.on_load = on_load
+        self.interval = interval
+        self.store: Optional[QuoteStore] = None
+        self._version = None
+        self._thread = background.lazy_thread(self._run, 'corpus-watcher')
+
+    def ensure_started(self):
+        self._thread.get()
+
+    def check(self) -> bool:
+        """Load the file if it changed since the last attempt; True when a new store went in"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        version = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if version == self._version:
+            return False
+        self._version = version  # a broken file is reported once, not on every poll
+
+        store = QuoteStore(self.path)
+        if not store.count:
+            # A half-finished export shouldn't empty the catalog; the caller logs this and keeps the old one
+            raise ValueError(f'{self.path} has no quotes')
+        self.on_load(store)
+        # The old store is not closed: quotes handed out from it stay readable until released
+        self.store = store
+        print(f"📚 Loaded {len(store)} quotes from {self.path}")
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"❌ Reloading quote corpus {self.path} failed, keeping the current one: {e}")
+
+
+def watch_from_env(on_load: Callable[[QuoteStore], None]) -> Optional[CorpusWatcher]:
+    """Load HECKX_QUOTE_CORPUS once now and return its watcher; None when it isn't set"""
+    path = os.environ.get('HECKX_QUOTE_CORPUS')
+    if not path:
+        return None
+
+    watcher = CorpusWatcher(path, on_load, interval=float(os.environ.get('HECKX_CORPUS_POLL_S', 2)))
+    try:
+        if not watcher.check():
+            print(f"⚠️ Quote corpus {path} not found, using the built-in quotes until it appears")
+    except Exception as e:
+        print(f"❌ Loading quote corpus {path} failed, using the built-in quotes: {e}")
+    return watcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or inspect a compiled quote corpus')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_parser = sub.add_parser('build', help='compile a JSON or CSV file')
+    build_parser.add_argument('source')
+    build_parser.add_argument('output')
+    build_parser.add_argument('--language', default='thai', help='language for rows without one')
+    build_parser.add_argument('--db', help="store this database's quotes-table row ids (the app's conversations db)")
+    info_parser = sub.add_parser('info', help='summarize a compiled corpus')
+    info_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        quotes = quote_index.load_corpus(args.source, args.language)
+        count = build(quotes, args.output, args.db)
+        print(f"✅ Wrote {count} quotes to {args.output} ({os.path.getsize(args.output):,} bytes)")
+    else:
+        store = QuoteStore(args.path)
+        by_language: Dict[str, Dict[str, int]] = {}
+        for quote in store:
+            themes = by_language.setdefault(quote['language'], {})
+            themes[quote['theme']] = themes.get(quote['theme'], 0) + 1
+        print(f"📚 {args.path}: {len(store)} quotes, {os.path.getsize(args.path):,} bytes")
+        for language, themes in sorted(by_language.items()):
+            print(f"  {language}: " + ', '.join(f'{theme} {n}' for theme, n in sorted(themes.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Rating-weighted quote sampling for Heckx AI
+Each category gets a Walker alias table over its quotes, weighted by the
+quote's global rating average (shrunk towards a prior so a single vote
+counts for little). A user's draw first picks a category from a small alias
+table weighted by their own ratings per category and their
+user_preferences.favorite_category, then a quote from that category; both
+steps are O(1).
+
+Tables are rebuilt by a background thread: ratings made in this worker are
+applied as deltas every few seconds (only the touched categories are
+rebuilt), and everything is reloaded from SQLite now and then to pick up
+the other workers' ratings. User profiles are loaded in the background too;
+a user without one yet gets the global weights.
+
+Tuning:
+    HECKX_QUOTE_WEIGHTS          0 to disable weighted sampling (default 1)
+    HECKX_WEIGHTS_INTERVAL_S     seconds between incremental rebuilds (default 5)
+    HECKX_WEIGHTS_RELOAD_S       seconds between full reloads from SQLite (default 600)
+    HECKX_WEIGHTS_USERS          user profiles kept in memory per worker (default 10000)
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import background
+import db
+from quote_index import QuoteCatalog
+
+PRIOR_MEAN = 3.0      # ratings are 1-5 stars
+MIN_RATING, MAX_RATING = 1, 5
+PRIOR_COUNT = 5       # votes before a quote's own average outweighs the prior
+FAVORITE_BOOST = 2.0  # weight multiplier for the user's favorite category
+MAX_PENDING = 100000  # past this many queued deltas, wait for the next full reload instead
+
+GLOBAL_RATINGS_QUERY = '''
+    SELECT quote_id, SUM(rating), COUNT(rating)
+    FROM conversations
+    WHERE rating IS NOT NULL
+    GROUP BY quote_id
+'''
+
+USER_RATINGS_QUERY = '''
+    SELECT q.category, SUM(c.rating), COUNT(c.rating)
+    FROM conversations c
+    JOIN quotes q ON q.id = c.quote_id
+    WHERE c.user_id = ? AND c.rating IS NOT NULL
+    GROUP BY q.category
+'''
+
+
+def rating_factor(total: int, count: int) -> float:
+    """Bayesian average relative to the prior: 1.0 for unrated, 1/3 to 5/3 at the extremes"""
+    if count > 0:
+        # Out-of-range ratings stored before they were validated must not make a weight negative
+        total = min(max(total / count, MIN_RATING), MAX_RATING) * count
+    else:
+        total = 0
+    return (total + PRIOR_MEAN * PRIOR_COUNT) / (count + PRIOR_COUNT) / PRIOR_MEAN
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(n) to build, O(1) per weighted draw"""
+
+    __slots__ = ('items', '_prob', '_alias')
+
+    def __init__(self, items: Sequence, weights: Sequence[float]):
+        n = len(items)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError('AliasTable needs at least one positive weight')
+
+        scaled = [w * n / total for w in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s], alias[s] = scaled[s], l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left is 1.0 up to rounding error
+
+        self.items = tuple(items)
+        self._prob = prob
+        self._alias = alias
+
+    def sample(self, rng: random.Random = random):
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self._prob[i] else self.items[self._alias[i]]
+
+
+class Snapshot(NamedTuple):
+    """Everything one draw reads, published by a single assignment so it is never half-updated"""
+    tables: Dict[str, AliasTable]
+    weights: Dict[str, float]
+    category_table: Optional[AliasTable]
+    generation: int
+
+
+EMPTY = Snapshot({}, {}, None, 0)
+
+
+class UserProfile:
+    __slots__ = ('multipliers', 'built')
+
+    def __init__(self, multipliers: Dict[str, float]):
+        self.multipliers = multipliers  # per category; missing means 1.0
+        self.built: Tuple[int, Optional[AliasTable]] = (-1, None)  # (snapshot generation, table)
+
+
+class QuoteWeights:
+    def __init__(self, catalog: QuoteCatalog, path: str = None, interval: float = 5.0,
+                 reload_interval: float = 600.0, profile_capacity: int = 10000,
+                 rng: random.Random = None):
+        self.catalog = catalog
+        self.path = path or db.CONVERSATIONS_DB
+        self.interval = interval
+        self.reload_interval = reload_interval
+        self.profile_capacity = profile_capacity
+        self.rng = rng or random.Random()
+
+        # Replaced whole by the background thread; request threads read it once per draw
+        self._snapshot = EMPTY
+        self._built_for = None  # the QuoteIndex the tables belong to
+
+        self._ratings: Dict[int, List[int]] = {}  # quote_id -> [sum, count]
+        self._pending: List[Tuple[int, int, int]] = []  # (quote_id, d_sum, d_count)
+        self._users_to_load: Dict[str, None] = {}  # insertion-ordered set
+        self._profiles: 'OrderedDict[str, UserProfile]' = OrderedDict()
+        self._reloaded_at = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = background.lazy_thread(self._run, 'quote-weights')
+
+    def _ensure_started(self):
+        self._thread.get()
+
+    # --- request path ---------------------------------------------------------
+
+    def sample(self, user_id: str = None, category: str = None) -> Optional[Dict]:
+        """A rating-weighted quote; None until the first build finishes"""
+        self._ensure_started()
+        snapshot = self._snapshot
+        if category and category in snapshot.tables:
+            return snapshot.tables[category].sample(self.rng)
+
+        table = snapshot.category_table
+        if table is None:
+            return None
+        if user_id is not None:
+            table = self._user_table(user_id, snapshot) or table
+        return snapshot.tables[table.sample(self.rng)].sample(self.rng)
+
+    def _user_table(self, user_id: str, snapshot: Snapshot) -> Optional[AliasTable]:
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is None:
+                if user_id not in self._users_to_load:
+                    self._users_to_load[user_id] = None
+                    self._wake.set()
+                return None
+            self._profiles.move_to_end(user_id)
+
+        generation, table = profile.built
+        if generation != snapshot.generation:
+            # A handful of categories, so this stays cheap; redone only after a rebuild
+            weights = snapshot.weights
+            categories = list(weights)
+            table = AliasTable(categories, [weights[c] * profile.multipliers.get(c, 1.0) for c in categories])
+            profile.built = (snapshot.generation, table)
+        return table
+
+    def note_ratings(self, user_id: str, changes: Iterable[Tuple[int, Optional[int], Optional[int]]]):
+        """Queue (quote_id, old_rating, new_rating) changes for the next rebuild"""
+        deltas = []
+        for quote_id, old, new in changes:
+            d_sum = (new or 0) - (old or 0)
+            d_count = (new is not None) - (old is not None)
+            if d_sum or d_count:
+                deltas.append((quote_id, d_sum, d_count))
+        with self._lock:
+            if len(self._pending) < MAX_PENDING:
+                self._pending.extend(deltas)
+            if user_id in self._profiles:
+                self._users_to_load[user_id] = None
+
+    def note_preferences(self, user_id: str):
+        """The user's favorite category changed"""
+        with self._lock:
+            if user_id in self._profiles:
+                self._users_to_load[user_id] = None
+
+    # --- background -----------------------------------------------------------
+
+    def refresh(self, full: bool = False):
+        """Apply queued deltas, reloading everything when due; then load queued user profiles"""
+        index = self.catalog.index
+        due = self._reloaded_at is None or time.monotonic() - self._reloaded_at >= self.reload_interval
+        if full or due:
+            self._reload(index)
+        else:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            dirty = self._apply(pending)
+            if index is not self._built_for:
+                self._rebuild(index, None)
+            elif dirty:
+                self._rebuild(index, dirty)
+        self._load_profiles()
+
+    def _reload(self, index):
+        conn = db.get_connection(self.path)
+        with self._lock:
+            self._pending = []  # the reload already includes them
+        ratings = {quote_id: [total, count] for quote_id, total, count in conn.execute(GLOBAL_RATINGS_QUERY)}
+        self._ratings = ratings
+        self._reloaded_at = time.monotonic()
+        self._rebuild(index, None)
+
+    def _apply(self, pending) -> set:
+        touched = set()
+        for quote_id, d_sum, d_count in pending:
+            entry = self._ratings.setdefault(quote_id, [0, 0])
+            entry[0] += d_sum
+            entry[1] += d_count
+            touched.add(quote_id)
+        return touched
+
+    def _rebuild(self, index, touched: Optional[set]):
+        """Rebuild the category tables holding a touched quote (all of them when touched is None)"""
+        categories = sorted({theme for themes in index.themes.values() for theme in themes})
+        current = self._snapshot
+        tables = dict(current.tables) if index is self._built_for else {}
+        weights = dict(current.weights) if index is self._built_for else {}
+
+        for category in categories:
+            bucket = index.quotes(theme=category)
+            if category in tables and touched is not None and \
+                    not any(q['quote_id'] in touched for q in bucket):
+                continue
+            try:
+                quote_weights = []
+                for quote in bucket:
+                    total, count = self._ratings.get(quote['quote_id'], (0, 0))
+                    quote_weights.append(rating_factor(total, count))
+                tables[category] = AliasTable(bucket, quote_weights)
+                weights[category] = sum(quote_weights)
+            except Exception as e:
+                # One bad bucket keeps its previous table (or drops out) instead of failing every category
+                print(f"❌ Rebuilding quote weights for {category} failed: {e}")
+
+        for category in set(tables) - set(categories):
+            del tables[category], weights[category]
+        for category in set(weights) - set(tables):
+            del weights[category]
+
+        category_table = AliasTable(list(weights), list(weights.values())) if weights else None
+        self._snapshot = Snapshot(tables, weights, category_table, current.generation + 1)
+        self._built_for = index
+
+    def _load_profiles(self):
+        with self._lock:
+            users = list(self._users_to_load)
+            self._users_to_load.clear()
+        if not users:
+            return
+
+        conn = db.get_connection(self.path)
+        for user_id in users:
+            multipliers = {category: rating_factor(total, count)
+                           for category, total, count in conn.execute(USER_RATINGS_QUERY, (user_id,))}
+            row = conn.execute('SELECT favorite_category FROM user_preferences WHERE user_id = ?',
+                               (user_id,)).fetchone()
+            if row and row[0]:
+                multipliers[row[0]] = multipliers.get(row[0], 1.0) * FAVORITE_BOOST
+            with self._lock:
+                self._profiles[user_id] = UserProfile(multipliers)
+                self._profiles.move_to_end(user_id)
+                while len(self._profiles) > self.profile_capacity:
+                    self._profiles.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'categories': len(self._snapshot.tables),
+                'rated_quotes': len(self._ratings),
+                'pending_deltas': len(self._pending),
+                'profiles': len(self._profiles),
+                'generation': self._snapshot.generation
+            }
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Rebuilding quote weights failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+def create_weights_from_env(catalog: QuoteCatalog) -> Optional[QuoteWeights]:
+    """Build the weighted sampler unless HECKX_QUOTE_WEIGHTS=0"""
+    if os.environ.get('HECKX_QUOTE_WEIGHTS', '1').lower() in ('0', 'false', 'no'):
+        return None
+
+    return QuoteWeights(
+        catalog,
+        interval=float(os.environ.get('HECKX_WEIGHTS_INTERVAL_S', 5)),
+        reload_interval=float(os.environ.get('HECKX_WEIGHTS_RELOAD_S', 600)),
+        profile_capacity=int(os.environ.get('HECKX_WEIGHTS_USERS', 10000))
+    )
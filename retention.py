@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+History deletion and retention for Heckx AI
+Deletes run in bounded chunks, each in its own short write transaction, with
+a pause between chunks so /api/quote inserts interleave with a large delete
+instead of queueing behind it.
+
+Retention is off unless HECKX_RETENTION_DAYS is set:
+    HECKX_RETENTION_DAYS        age in days after which history rows leave conversations (default 0 = keep)
+    HECKX_RETENTION_ARCHIVE     1 to move aged rows into conversations_archive instead of deleting (default 0)
+    HECKX_RETENTION_INTERVAL_S  seconds between background passes (default 3600)
+    HECKX_DELETE_CHUNK          rows per delete transaction (default 500)
+    HECKX_DELETE_PAUSE_MS       pause between chunks (default 5)
+    HECKX_VACUUM_PAGES          free pages released per incremental vacuum transaction (default 256)
+
+Usage:
+    python retention.py run                # one retention pass now
+    python retention.py clear USER_ID      # chunked delete of one user's history
+    python retention.py enable-vacuum      # switch an existing database to incremental auto-vacuum
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import background
+import db
+import migrations
+import user_stats
+
+DELETE_CHUNK = int(os.environ.get('HECKX_DELETE_CHUNK', 500))
+DELETE_PAUSE = int(os.environ.get('HECKX_DELETE_PAUSE_MS', 5)) / 1000.0
+VACUUM_PAGES = int(os.environ.get('HECKX_VACUUM_PAGES', 256))
+
+USER_CHUNK_QUERY = '''
+    SELECT c.id, c.user_id, q.category, c.rating
+    FROM conversations c JOIN quotes q ON q.id = c.quote_id
+    WHERE c.user_id = ? ORDER BY c.created_at DESC, c.id DESC LIMIT ?
+'''
+
+AGED_CHUNK_QUERY = '''
+    SELECT c.id, c.user_id, q.category, c.rating
+    FROM conversations c JOIN quotes q ON q.id = c.quote_id
+    WHERE c.created_at < ? ORDER BY c.created_at LIMIT ?
+'''
+
+
+def _delete_rows(conn, rows: List[Tuple], archive: bool):
+    """Remove (id, user_id, category, rating) rows and keep user_stats in step"""
+    ids = [(row[0],) for row in rows]
+    if archive:
+        conn.executemany('''
+            INSERT OR REPLACE INTO conversations_archive (id, user_id, quote_id, created_at, rating, archived_at)
+            SELECT id, user_id, quote_id, created_at, rating, CAST(strftime('%s', 'now') AS INTEGER)
+            FROM conversations WHERE id = ?
+        ''', ids)
+    conn.executemany('DELETE FROM conversations WHERE id = ?', ids)
+    user_stats.record_deletions(conn, [row[1:] for row in rows])
+
+
+def delete_in_chunks(query: str, params: Tuple, archive: bool = False,
+                     chunk_size: int = None, pause: float = None) -> int:
+    """Delete the rows `query` selects, chunk_size rows per transaction; returns the count"""
+    chunk_size = chunk_size or DELETE_CHUNK
+    pause = DELETE_PAUSE if pause is None else pause
+    deleted = 0
+    while True:
+        with db.transaction() as conn:
+            rows = conn.execute(query, params + (chunk_size,)).fetchall()
+            if rows:
+                _delete_rows(conn, rows, archive)
+        deleted += len(rows)
+        if len(rows) < chunk_size:
+            return deleted
+        time.sleep(pause)  # let queued writers take the lock (a cooperative yield under gevent)
+
+
+def clear_user_history(user_id: str, chunk_size: int = None) -> int:
+    """Delete every conversation of one user without holding the write lock throughout"""
+    return delete_in_chunks(USER_CHUNK_QUERY, (user_id,), chunk_size=chunk_size)
+
+
+def age_out(days: int, archive: bool = False, chunk_size: int = None) -> int:
+    """Delete (or archive) rows older than `days`"""
+    cutoff = int(time.time()) - days * 86400
+    return delete_in_chunks(AGED_CHUNK_QUERY, (cutoff,), archive=archive, chunk_size=chunk_size)
+
+
+def incremental_vacuum(pages_per_step: int = None, pause: float = None) -> int:
+    """Return free pages to the filesystem a few hundred at a time; returns pages released"""
+    pages_per_step = pages_per_step or VACUUM_PAGES
+    pause = DELETE_PAUSE if pause is None else pause
+    released = 0
+    while True:
+        with db.transaction() as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                return released  # full/none mode: see `retention.py enable-vacuum`
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            step = min(free, pages_per_step)
+            # Python's sqlite3 steps a pragma once, and each step frees one page
+            for _ in range(step):
+                conn.execute('PRAGMA incremental_vacuum(1)')
+        released += step
+        if step < pages_per_step:
+            return released
+        time.sleep(pause)
+
+
+def enable_incremental_vacuum() -> bool:
+    """Switch an existing database to auto_vacuum=INCREMENTAL (rewrites the file once)"""
+    conn = db.get_connection()
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    return True
+
+
+class RetentionJob:
+    """Background thread that ages out history and vacuums on an interval"""
+
+    def __init__(self, days: int, archive: bool = False, interval: float = 3600):
+        self.days = days
+        self.archive = archive
+        self.interval = interval
+        self.last_run: Optional[Dict] = None
+        self._thread = background.lazy_thread(self._run, 'history-retention')
+
+    def ensure_started(self):
+        self._thread.get()
+
+    def run_once(self) -> Dict:
+        started = time.time()
+        removed = age_out(self.days, archive=self.archive)
+        released = incremental_vacuum()
+        self.last_run = {
+            'finished_at': time.time(),
+            'duration_ms': round((time.time() - started) * 1000, 1),
+            'archived' if self.archive else 'deleted': removed,
+            'vacuumed_pages': released
+        }
+        if removed or released:
+            print(f"🧹 Retention: {removed} rows {'archived' if self.archive else 'deleted'}, {released} pages vacuumed")
+        return self.last_run
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"❌ Retention pass failed: {e}")
+            finally:
+                db.release()
+            time.sleep(self.interval)
+
+    def status(self) -> Dict:
+        return {
+            'enabled': True,
+            'days': self.days,
+            'archive': self.archive,
+            'interval_s': self.interval,
+            'last_run': self.last_run
+        }
+
+
+def create_job_from_env() -> Optional[RetentionJob]:
+    """Build the retention job when HECKX_RETENTION_DAYS is set"""
+    days = int(os.environ.get('HECKX_RETENTION_DAYS', 0))
+    if days <= 0:
+        return None
+    return RetentionJob(
+        days,
+        archive=os.environ.get('HECKX_RETENTION_ARCHIVE', '0').lower() in ('1', 'true', 'yes'),
+        interval=float(os.environ.get('HECKX_RETENTION_INTERVAL_S', 3600))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chunked history deletion and retention')
+    parser.add_argument('command', choices=['run', 'clear', 'enable-vacuum'])
+    parser.add_argument('user_id', nargs='?')
+    parser.add_argument('--days', type=int, default=int(os.environ.get('HECKX_RETENTION_DAYS', 0)))
+    parser.add_argument('--archive', action='store_true')
+    args = parser.parse_args()
+    migrations.migrate_conversations()
+
+    if args.command == 'run':
+        if args.days <= 0:
+            print("❌ Set --days or HECKX_RETENTION_DAYS")
+            return 1
+        print(json.dumps(RetentionJob(args.days, archive=args.archive).run_once(), indent=2))
+    elif args.command == 'clear':
+        if not args.user_id:
+            print("❌ clear needs a USER_ID")
+            return 1
+        print(f"✅ Deleted {clear_user_history(args.user_id)} conversations of {args.user_id}")
+    elif args.command == 'enable-vacuum':
+        if enable_incremental_vacuum():
+            print("✅ Incremental auto-vacuum enabled")
+        else:
+            print("✅ Incremental auto-vacuum was already enabled")
+        return 0
+
+    for name, metrics in db.lock_metrics().items():
+        print(f"🔒 {name}: {metrics['transactions']} write transactions, "
+              f"longest lock hold {metrics['max_hold_ms']} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
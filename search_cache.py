@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Shared cache for external music searches (Pixabay) for Heckx AI
+Results live in the search_cache table of the music database, so every
+gunicorn worker shares them. Keys are the normalized query and parameters.
+
+An entry is
+  fresh     for HECKX_SEARCH_TTL_S after it was fetched: served as is
+  stale     until HECKX_SEARCH_STALE_S: served as is, and one worker
+            refreshes it in the background (stale-while-revalidate)
+  negative  when the fetch failed and nothing is cached: the failure is
+            replayed for HECKX_SEARCH_NEGATIVE_TTL_S instead of hitting the
+            API again; a failed refresh keeps serving the stale results
+Lookups of the same key share one fetch: threads in a worker wait for the
+thread already fetching, and workers take a lease (refresh_at) in the table
+and poll for the lease holder's result.
+
+    HECKX_SEARCH_CACHE=0 turns it off
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import background
+import db
+
+POLL_INTERVAL = 0.05   # seconds between checks while another worker fetches
+PRUNE_EVERY = 100      # stores between deletes of entries past stale_until
+PRUNE_BATCH = 500
+REFRESH_WORKERS = 2
+
+LOOKUP_QUERY = '''
+    SELECT payload, error, fresh_until, stale_until, refresh_at FROM search_cache WHERE key = ?
+'''
+
+
+class SearchFailed(Exception):
+    """A cached failure replayed during its negative TTL"""
+
+
+def cache_key(namespace: str, query: str, **params) -> str:
+    """Case- and whitespace-insensitive key for one search"""
+    normalized = ' '.join((query or '').lower().split())
+    return json.dumps([namespace, normalized, sorted(params.items())], ensure_ascii=False)
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SearchCache:
+    def __init__(self, path: str = None, ttl: float = 600.0, stale_ttl: float = 86400.0,
+                 negative_ttl: float = 60.0, lease: float = 35.0):
+        self.path = path or db.MUSIC_DB
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.negative_ttl = negative_ttl
+        self.lease = lease  # longer than the slowest fetch (requests timeout is 30 s)
+
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._refresher = background.PerProcess(
+            lambda: ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix='search-refresh'))
+        self._stores = 0
+        self._counts = {'hits': 0, 'stale': 0, 'negative': 0, 'misses': 0, 'coalesced': 0,
+                        'waited': 0, 'fetches': 0, 'failures': 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    # --- lookups ------------------------------------------------------------
+
+    def get(self, key: str, fetch: Callable[[], List]) -> List:
+        """Cached results for `key`, calling fetch() on a miss; raises SearchFailed during a negative TTL"""
+        row = self._read(key)
+        now = time.time()
+        if row is not None:
+            payload, error, fresh_until, stale_until, refresh_at = row
+            if now < fresh_until:
+                if payload is not None:
+                    self._count('hits')
+                    return json.loads(payload)
+                if error is not None:
+                    self._count('negative')
+                    raise SearchFailed(error)
+            if payload is not None and now < stale_until:
+                self._count('stale')
+                if self._claim(key, now):
+                    self._refresher.get().submit(self._refresh_in_background, key, fetch)
+                return json.loads(payload)
+
+        self._count('misses')
+        return self._single_flight(key, fetch)
+
+    def _single_flight(self, key: str, fetch: Callable[[], List]) -> List:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            self._count('coalesced')
+            if flight.done.wait(self.lease):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+            return fetch()  # the leader is stuck; don't queue behind it
+
+        try:
+            flight.value = self._fetch_shared(key, fetch)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _fetch_shared(self, key: str, fetch: Callable[[], List]) -> List:
+        """Fetch under the cross-worker lease, or wait for the worker holding it"""
+        now = time.time()
+        if not self._claim(key, now):
+            self._count('waited')
+            deadline = now + self.lease
+            while time.time() < deadline:
+                time.sleep(POLL_INTERVAL)
+                row = self._read(key)
+                if row is None:
+                    break
+                payload, error, fresh_until, _, refresh_at = row
+                if time.time() < fresh_until:
+                    if payload is not None:
+                        return json.loads(payload)
+                    if error is not None:
+                        raise SearchFailed(error)
+                if refresh_at is None:
+                    break  # the other worker gave up without storing anything usable
+        return self._fetch_and_store(key, fetch, keep_stale=False)
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], List]):
+        try:
+            self._fetch_and_store(key, fetch, keep_stale=True)
+        except Exception as e:
+            print(f"⚠️ Refreshing cached search failed, serving stale results: {e}")
+
+    def _fetch_and_store(self, key: str, fetch: Callable[[], List], keep_stale: bool) -> List:
+        self._count('fetches')
+        try:
+            results = fetch()
+        except Exception as e:
+            self._count('failures')
+            self._store_failure(key, f'{type(e).__name__}: {e}', keep_stale)
+            raise
+        self._store(key, results)
+        return results
+
+    # --- table ----------------------------------------------------------------
+
+    def _read(self, key: str):
+        return db.get_connection(self.path).execute(LOOKUP_QUERY, (key,)).fetchone()
+
+    def _claim(self, key: str, now: float) -> bool:
+        """Take the refresh lease for `key` unless another worker holds it"""
+        with db.transaction(self.path) as conn:
+            conn.execute('''
+                INSERT INTO search_cache (key, refresh_at) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE SET refresh_at = excluded.refresh_at
+                WHERE search_cache.refresh_at IS NULL OR search_cache.refresh_at < ?
+            ''', (key, now + self.lease, now))
+            return conn.execute('SELECT changes()').fetchone()[0] > 0
+
+    def _store(self, key: str, results: List):
+        now = time.time()
+        payload = json.dumps(results, ensure_ascii=False)
+        with db.transaction(self.path) as conn:
+            conn.execute('''
+                INSERT INTO search_cache (key, payload, error, fetched_at, fresh_until, stale_until, refresh_at)
+                VALUES (?, ?, NULL, ?, ?, ?, NULL)
+                ON CONFLICT (key) DO UPDATE SET
+                    payload = excluded.payload, error = NULL, fetched_at = excluded.fetched_at,
+                    fresh_until = excluded.fresh_until, stale_until = excluded.stale_until, refresh_at = NULL
+            ''', (key, payload, now, now + self.ttl, now + self.stale_ttl))
+            self._maybe_prune(conn, now)
+
+    def _store_failure(self, key: str, error: str, keep_stale: bool):
+        now = time.time()
+        with db.transaction(self.path) as conn:
+            if keep_stale:
+                # Keep serving the stale results; the lease doubles as retry backoff
+                conn.execute('UPDATE search_cache SET error = ?, refresh_at = ? WHERE key = ?',
+                             (error, now + self.negative_ttl, key))
+            else:
+                until = now + self.negative_ttl
+                conn.execute('''
+                    INSERT INTO search_cache (key, payload, error, fetched_at, fresh_until, stale_until, refresh_at)
+                    VALUES (?, NULL, ?, ?, ?, ?, NULL)
+                    ON CONFLICT (key) DO UPDATE SET
+                        payload = NULL, error = excluded.error, fetched_at = excluded.fetched_at,
+                        fresh_until = excluded.fresh_until, stale_until = excluded.stale_until, refresh_at = NULL
+                ''', (key, error, now, until, until))
+
+    def _maybe_prune(self, conn, now: float):
+        with self._lock:
+            self._stores += 1
+            due = self._stores % PRUNE_EVERY == 0
+        if due:
+            conn.execute('''
+                DELETE FROM search_cache WHERE key IN (
+                    SELECT key FROM search_cache WHERE stale_until < ? LIMIT ?
+                ) AND (refresh_at IS NULL OR refresh_at < ?)
+            ''', (now, PRUNE_BATCH, now))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+            counts['in_flight'] = len(self._flights)
+        lookups = counts['hits'] + counts['stale'] + counts['negative'] + counts['misses']
+        counts['hit_rate'] = round((lookups - counts['misses']) / lookups, 3) if lookups else None
+        return counts
+
+
+def create_cache_from_env() -> Optional[SearchCache]:
+    """Build the search cache unless HECKX_SEARCH_CACHE=0"""
+    if os.environ.get('HECKX_SEARCH_CACHE', '1').lower() in ('0', 'false', 'no'):
+        return None
+
+    return SearchCache(
+        ttl=float(os.environ.get('HECKX_SEARCH_TTL_S', 600)),
+        stale_ttl=float(os.environ.get('HECKX_SEARCH_STALE_S', 86400)),
+        negative_ttl=float(os.environ.get('HECKX_SEARCH_NEGATIVE_TTL_S', 60))
+    )
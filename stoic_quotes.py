@@ -7,6 +7,9 @@ import random
 import json
 from datetime import datetime
 
+from quote_index import DailyPicker, QuoteCatalog, load_corpus
+from quote_store import QuoteStore, watch_from_env
+
 class StoicQuotesGenerator:
     def __init__(self):
         self.thai_quotes = [
@@ -110,29 +113,70 @@ class StoicQuotesGenerator:
             "calm": "meditation_bells.mp3",
             "energetic": "motivational_beat.mp3"
         }
+        
+        self.catalog = QuoteCatalog()
+        self.daily = DailyPicker(self.catalog)
+        self.rebuild_index()
+        # Compiled corpus named by HECKX_QUOTE_CORPUS replaces the lists above and is reloaded on change
+        self.corpus_watcher = watch_from_env(self.use_store)
+
+    def rebuild_index(self):
+        """Re-index after thai_quotes / english_quotes change (swapped in atomically)"""
+        entries = [("thai", q.get("theme"), q["author"], q) for q in self.thai_quotes]
+        entries += [("english", q.get("theme"), q["author"], q) for q in self.english_quotes]
+        self.catalog.replace(entries)
+
+    def use_store(self, store):
+        """Index a compiled corpus (see quote_store.py); the text stays in the memory-mapped file"""
+        thai = [q for q in store if q["language"] == "thai"]
+        english = [q for q in store if q["language"] != "thai"]
+        self.thai_quotes = thai or self.thai_quotes
+        self.english_quotes = english or self.english_quotes
+        self.rebuild_index()
+        return len(store)
+
+    def load_corpus(self, path):
+        """Replace the built-in quotes with a compiled, JSON, CSV or SQLite corpus"""
+        if path.endswith(".hqc"):
+            return self.use_store(QuoteStore(path))
+        quotes = load_corpus(path)
+        for quote in quotes:
+            quote.setdefault("color", "#2C3E50")
+            quote.setdefault("background", "mountain")
+        thai = [q for q in quotes if q["language"] == "thai"]
+        english = [q for q in quotes if q["language"] != "thai"]
+        self.thai_quotes = thai or self.thai_quotes
+        self.english_quotes = english or self.english_quotes
+        self.rebuild_index()
+        return len(quotes)
 
-    def get_random_quote(self, language="thai", theme=None):
-        """Get a random quote with optional theme filter"""
-        quotes = self.thai_quotes if language == "thai" else self.english_quotes
+    def get_random_quote(self, language="thai", theme=None, author=None):
+        """Get a random quote with optional theme/author filter"""
+        if self.corpus_watcher is not None:
+            self.corpus_watcher.ensure_started()
+        index = self.catalog.index
+        quote = index.sample("thai" if language == "thai" else "english", theme or None, author)
         
-        if theme:
-            quotes = [q for q in quotes if q.get("theme") == theme]
+        if quote is None:
+            quote = index.sample("thai")  # fallback
             
-        if not quotes:
-            quotes = self.thai_quotes  # fallback
-            
-        return random.choice(quotes)
+        return quote
     
     def get_quote_by_theme(self, theme="resilience", language="thai"):
         """Get quote by specific theme"""
         return self.get_random_quote(language, theme)
     
-    def get_daily_quote(self):
-        """Get today's quote (deterministic based on date)"""
+    def get_daily_quote(self, language="thai", theme=None):
+        """Get today's quote (deterministic based on date, no global RNG seeding)"""
+        if self.corpus_watcher is not None:
+            self.corpus_watcher.ensure_started()
         today = datetime.now().strftime("%Y-%m-%d")
-        random.seed(today)  # Make it consistent for the day
-        quote = self.get_random_quote()
-        random.seed()  # Reset random seed
+        language = "thai" if language == "thai" else "english"
+        quote = self.daily.pick(today, language, theme or None)
+        
+        if quote is None:
+            quote = self.daily.pick(today, "thai")  # fallback
+            
         return quote
     
     def create_video_config(self, quote_data):
@@ -140,7 +184,7 @@ class StoicQuotesGenerator:
         config = {
             "quote": quote_data,
             "video": {
-                "background": self.video_backgrounds.get(quote_data["background"], "mountain"),
+                "background": self.video_backgrounds.get(quote_data.get("background", "mountain"), "mountain"),
                 "duration": 15,  # seconds
                 "resolution": "1920x1080",
                 "fps": 30
@@ -154,7 +198,7 @@ class StoicQuotesGenerator:
             "text": {
                 "font": "NotoSansThai-Bold.ttf",
                 "size": 48,
-                "color": quote_data["color"],
+                "color": quote_data.get("color", "#2C3E50"),
                 "shadow": True,
                 "animation": "fade_in"
             },
@@ -174,8 +218,8 @@ class StoicQuotesGenerator:
             "author": quote_data["author"],
             "theme": quote_data["theme"],
             "style": {
-                "color": quote_data["color"],
-                "background": quote_data["background"]
+                "color": quote_data.get("color", "#2C3E50"),
+                "background": quote_data.get("background", "mountain")
             },
             "video_ready": True,
             "timestamp": datetime.now().isoformat()
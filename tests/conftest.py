@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db
+import migrations
+
+
+@pytest.fixture
+def conversations_db(tmp_path):
+    """Path of a freshly migrated conversations database"""
+    path = str(tmp_path / 'conversations.db')
+    migrations.migrate(path, migrations.CONVERSATIONS_MIGRATIONS)
+    return path
+
+
+@pytest.fixture
+def music_db(tmp_path):
+    """Path of a freshly migrated music library"""
+    path = str(tmp_path / 'music_library.db')
+    migrations.migrate(path, migrations.MUSIC_MIGRATIONS)
+    return path
+
+
+@pytest.fixture(scope='session')
+def app_dir(tmp_path_factory):
+    """Working directory holding the default databases (db.CONVERSATIONS_DB, db.MUSIC_DB), migrated"""
+    if os.path.isabs(db.CONVERSATIONS_DB) or os.path.isabs(db.MUSIC_DB):
+        pytest.skip('HECKX_CONVERSATIONS_DB / HECKX_MUSIC_DB point outside the test directory')
+    path = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(path)
+        migrations.migrate(db.CONVERSATIONS_DB, migrations.CONVERSATIONS_MIGRATIONS)
+        yield path
+    db.close_all()
+
+
+@pytest.fixture(scope='session')
+def client(app_dir):
+    """Flask test client for app.py, on the app_dir databases"""
+    import app
+    return app.app.test_client()
@@ -0,0 +1,47 @@
+"""/api/history paging: next_cursor walks back through every row once, since= returns only new rows"""
+import db
+
+
+def add_rows(user_id, created_at, count):
+    with db.transaction() as conn:
+        quote_id = conn.execute('SELECT id FROM quotes ORDER BY id LIMIT 1').fetchone()[0]
+        return [conn.execute('INSERT INTO conversations (user_id, quote_id, created_at) VALUES (?, ?, ?)',
+                             (user_id, quote_id, created_at)).lastrowid for _ in range(count)]
+
+
+def history(client, **params):
+    response = client.get('/api/history', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_cursor_pages_cover_every_row_once(client):
+    # Several rows per second, so pages have to split ties on created_at by id
+    ids = [row_id for second in range(6) for row_id in add_rows('hist-pages', 1700000000 + second, 4)]
+    seen, cursor = [], None
+    while True:
+        page = history(client, user_id='hist-pages', limit=5, **({'cursor': cursor} if cursor else {}))
+        assert page['count'] <= 5
+        seen += [row['id'] for row in page['conversations']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+
+
+def test_sync_cursor_returns_only_rows_added_since(client):
+    add_rows('hist-sync', 1700000000, 3)
+    first = history(client, user_id='hist-sync', limit=2)
+    assert history(client, user_id='hist-sync', since=first['sync_cursor'])['count'] == 0
+
+    # Same second as the newest row the client has, and a later one
+    new = add_rows('hist-sync', 1700000000, 2) + add_rows('hist-sync', 1700000001, 1)
+    synced = history(client, user_id='hist-sync', since=first['sync_cursor'])
+    assert [row['id'] for row in synced['conversations']] == new[::-1]
+    assert not synced['has_more']
+    assert history(client, user_id='hist-sync', since=synced['sync_cursor'])['count'] == 0
+
+
+def test_bad_cursors_are_rejected(client):
+    assert client.get('/api/history', query_string={'cursor': 'not-a-cursor'}).status_code == 400
+    assert client.get('/api/history', query_string={'since': 'bm9wZQ'}).status_code == 400
@@ -0,0 +1,57 @@
+"""Playlist track order: inserts, removals and moves renumber positions without primary-key clashes"""
+import pytest
+
+import db
+import playlists
+
+
+@pytest.fixture
+def conn(music_db):
+    with db.transaction(music_db) as conn:
+        conn.executemany('INSERT INTO music_tracks (source, external_id, title, artist) VALUES (?, ?, ?, ?)',
+                         [('test', str(n), f'track {n}', 'A') for n in range(1, 7)])
+        yield conn
+
+
+def order(conn, playlist_id):
+    return [track['id'] for track in playlists.get_playlist(conn, playlist_id)['tracks']]
+
+
+def test_shift_moves_a_contiguous_run_both_ways(conn):
+    playlist_id = playlists.create_playlist(conn, 'shift', [1, 2, 3, 4])
+    playlists._shift(conn, playlist_id, 1, 2)
+    assert conn.execute('SELECT position FROM playlist_tracks WHERE playlist_id = ? ORDER BY position',
+                        (playlist_id,)).fetchall() == [(0,), (3,), (4,), (5,)]
+    playlists._shift(conn, playlist_id, 3, -2)
+    assert order(conn, playlist_id) == [1, 2, 3, 4]
+
+
+def test_add_remove_and_move_keep_order(conn):
+    playlist_id = playlists.create_playlist(conn, 'mix', [1, 2, 3])
+    assert playlists.add_tracks(conn, playlist_id, [4, 5], position=1) == 5
+    assert order(conn, playlist_id) == [1, 4, 5, 2, 3]
+    assert playlists.add_tracks(conn, playlist_id, [6]) == 6
+    assert playlists.remove_track(conn, playlist_id, 0) == 1
+    assert order(conn, playlist_id) == [4, 5, 2, 3, 6]
+
+
+@pytest.mark.parametrize('from_position,to_position,expected', [
+    (0, 4, [2, 3, 4, 5, 1]),
+    (4, 0, [5, 1, 2, 3, 4]),
+    (1, 3, [1, 3, 4, 2, 5]),
+    (3, 1, [1, 4, 2, 3, 5]),
+    (2, 2, [1, 2, 3, 4, 5]),
+    (0, 9, [2, 3, 4, 5, 1]),
+])
+def test_move_track(conn, from_position, to_position, expected):
+    playlist_id = playlists.create_playlist(conn, 'move', [1, 2, 3, 4, 5])
+    assert playlists.move_track(conn, playlist_id, from_position, to_position) == from_position + 1
+    assert order(conn, playlist_id) == expected
+    assert playlists.get_playlist(conn, playlist_id)['track_count'] == 5
+
+
+def test_move_from_an_empty_position_is_rejected(conn):
+    playlist_id = playlists.create_playlist(conn, 'short', [1, 2])
+    with pytest.raises(ValueError):
+        playlists.move_track(conn, playlist_id, 5, 0)
+    assert order(conn, playlist_id) == [1, 2]
@@ -0,0 +1,53 @@
+"""
+Every hot query must be answered from an index on a freshly migrated database
+Runs migrations.migrate() on temporary database files, then EXPLAIN QUERY PLAN
+for each entry of migrations.HOT_QUERIES. A plan step that scans a whole table
+(SCAN without USING ... INDEX; FTS5 lookups excepted) or sorts in a temp
+b-tree fails the test.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db
+import migrations
+
+DATABASES = {
+    'conversations': migrations.CONVERSATIONS_MIGRATIONS,
+    'music': migrations.MUSIC_MIGRATIONS,
+}
+
+
+@pytest.fixture(scope='module')
+def connections(tmp_path_factory):
+    root = tmp_path_factory.mktemp('plans')
+    conns = {}
+    for label, steps in DATABASES.items():
+        path = str(root / f'{label}.db')
+        assert migrations.migrate(path, steps) == [number for number, _, _ in steps]
+        conns[label] = db.get_connection(path)
+    return conns
+
+
+def _plan(conn, sql, params):
+    return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+@pytest.mark.parametrize('label,name,sql,params', [
+    pytest.param(label, name, sql, params, id=f'{label}: {name}')
+    for label, queries in migrations.HOT_QUERIES.items()
+    for name, sql, params in queries
+])
+def test_hot_query_uses_index(connections, label, name, sql, params):
+    plan = _plan(connections[label], sql, params)
+    scans = [step for step in plan
+             if step.startswith('SCAN ') and 'USING' not in step and 'VIRTUAL TABLE INDEX' not in step]
+    assert not scans, f'{label} / {name} scans a table: {plan}'
+    assert not [step for step in plan if 'TEMP B-TREE' in step], f'{label} / {name} sorts in a temp b-tree: {plan}'
+
+
+def test_plan_check_agrees():
+    assert migrations.check_plans() == []
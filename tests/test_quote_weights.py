@@ -0,0 +1,61 @@
+"""Rating-weighted sampling: clamped ratings and snapshots that survive a catalog swap"""
+import random
+import threading
+
+import quote_index
+import quote_weights
+
+
+def catalog_of(categories, per_category=20):
+    return [('thai', category, 'Seneca', {'quote_id': n * 100 + i, 'category': category, 'text': f'{category} {i}'})
+            for n, category in enumerate(categories) for i in range(per_category)]
+
+
+def make_weights(conversations_db, categories):
+    catalog = quote_index.QuoteCatalog(catalog_of(categories))
+    weights = quote_weights.QuoteWeights(catalog, path=conversations_db, rng=random.Random(1))
+    weights._ensure_started = lambda: None  # refreshed by hand below
+    weights.refresh(full=True)
+    return catalog, weights
+
+
+def test_out_of_range_ratings_keep_weights_positive():
+    assert quote_weights.rating_factor(-50, 2) > 0
+    assert quote_weights.rating_factor(0, 0) == 1.0
+    assert quote_weights.rating_factor(500, 1) == quote_weights.rating_factor(5, 1)
+
+
+def test_sample_only_returns_current_categories(conversations_db):
+    catalog, weights = make_weights(conversations_db, ['a', 'b', 'c'])
+    assert {weights.sample()['category'] for _ in range(200)} == {'a', 'b', 'c'}
+
+    catalog.replace(catalog_of(['a']))
+    weights.refresh()
+    assert {weights.sample()['category'] for _ in range(200)} == {'a'}
+    assert weights.sample(category='b')['category'] == 'a'  # unknown category falls back to any
+
+
+def test_sample_during_category_removal(conversations_db):
+    catalog, weights = make_weights(conversations_db, ['a', 'b', 'c', 'd'])
+    weights.sample(user_id='u1')
+    weights.refresh()  # loads u1's profile, so draws also go through the per-user table
+    errors, stop = [], threading.Event()
+
+    def draw():
+        try:
+            while not stop.is_set():
+                assert weights.sample(user_id='u1') is not None
+                assert weights.sample() is not None
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=draw) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for n in range(200):
+        catalog.replace(catalog_of(['a', 'b', 'c', 'd'][:1 + n % 4]))
+        weights.refresh()
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert errors == []
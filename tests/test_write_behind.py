@@ -0,0 +1,73 @@
+"""Write-behind history inserts: id blocks, commit order, the pending view and dropped rows"""
+import db
+import write_behind
+
+
+def quote_id():
+    with db.transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO quotes (category, text, author) VALUES ('wisdom', 'q', 'Seneca')")
+        return conn.execute("SELECT id FROM quotes WHERE text = 'q'").fetchone()[0]
+
+
+def committed(user_id):
+    return [row[0] for row in db.get_connection().execute(
+        'SELECT id FROM conversations WHERE user_id = ? ORDER BY created_at, id', (user_id,))]
+
+
+def paused_buffer(**options):
+    """A buffer whose writer only starts once `resume` is called, so queued rows stay pending"""
+    buffer = write_behind.QuoteWriteBuffer(**options)
+    buffer._ensure_started = lambda: None
+
+    def resume():
+        del buffer._ensure_started
+        buffer._ensure_started()
+    return buffer, resume
+
+
+def test_ids_stay_unique_across_blocks_and_workers(app_dir):
+    first, second = write_behind.ConversationIdAllocator(3), write_behind.ConversationIdAllocator(3)
+    ids = [allocator.allocate() for _ in range(10) for allocator in (first, second)]
+    assert len(set(ids)) == len(ids)
+
+    with db.transaction() as conn:
+        plain = conn.execute('INSERT INTO conversations (user_id, quote_id, created_at) VALUES (?, ?, 0)',
+                             ('alloc', quote_id())).lastrowid
+    assert plain not in ids
+    later = [first.allocate() for _ in range(5)]
+    assert not set(later) & set(ids) and plain not in later
+
+
+def test_pending_rows_visible_until_flushed_in_submit_order(app_dir):
+    qid = quote_id()
+    buffer, resume = paused_buffer(flush_interval_ms=10, batch_size=2, id_block_size=4)
+    entries = [buffer.submit('wb-order', qid, f'quote {n}', 'wisdom') for n in range(5)]
+
+    pending, rows = buffer.read_with_pending('wb-order', lambda: committed('wb-order'))
+    assert [entry['id'] for entry in pending] == [entry['id'] for entry in entries]
+    assert rows == [] and buffer.has_pending('wb-order')
+
+    resume()
+    buffer.flush()
+    pending, rows = buffer.read_with_pending('wb-order', lambda: committed('wb-order'))
+    assert pending == [] and not buffer.has_pending('wb-order')
+    assert rows == [entry['id'] for entry in entries]
+
+    more = buffer.submit('wb-order', qid, 'quote 5', 'wisdom')
+    buffer.flush()
+    assert committed('wb-order') == rows + [more['id']]
+
+
+def test_failing_row_is_dropped_and_the_rest_of_its_batch_commits(app_dir, monkeypatch):
+    monkeypatch.setattr(write_behind, 'MAX_FLUSH_ATTEMPTS', 1)
+    qid = quote_id()
+    buffer, resume = paused_buffer(flush_interval_ms=50, batch_size=10)
+    good = buffer.submit('wb-drop', qid, 'ok', 'wisdom')
+    bad = buffer.submit('wb-drop', None, 'no quote', 'wisdom')  # conversations.quote_id is NOT NULL
+    after = buffer.submit('wb-drop', qid, 'ok too', 'wisdom')
+
+    resume()
+    buffer.flush()
+    assert committed('wb-drop') == [good['id'], after['id']]
+    assert bad['id'] not in committed('wb-drop')
+    assert not buffer.has_pending('wb-drop')
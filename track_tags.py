@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Derived track fields and the tag index for the Heckx AI music library
+Genre, mood and quality score are derived once at ingest (music_ingest.py)
+and stored in indexed columns. Tags are split into the track_tags table
+(tag -> track), which also carries the track's quality score, so these are
+all index range scans:
+    top tracks by quality          idx_music_tracks_quality
+    ... of a genre / a mood        idx_music_tracks_genre_quality / _mood_quality
+    ... with a tag                 idx_track_tags_quality
+"""
+
+import sqlite3
+from typing import Dict, Iterable, List, Tuple
+
+GENRE_KEYWORDS = {
+    'jazz': ['jazz', 'swing', 'bebop'],
+    'blues': ['blues', 'blue'],
+    'classical': ['classical', 'piano', 'orchestra'],
+    'ambient': ['ambient', 'atmospheric', 'drone'],
+    'lofi': ['lofi', 'lo-fi', 'chill', 'study'],
+    'electronic': ['electronic', 'synth', 'techno'],
+    'folk': ['folk', 'acoustic', 'country'],
+    'rock': ['rock', 'guitar', 'electric']
+}
+
+MOOD_KEYWORDS = {
+    'relaxing': ['relax', 'calm', 'peaceful', 'zen', 'meditation'],
+    'energetic': ['energy', 'upbeat', 'dynamic', 'active'],
+    'focus': ['focus', 'study', 'concentration', 'work'],
+    'romantic': ['romantic', 'love', 'intimate', 'soft'],
+    'melancholic': ['sad', 'melancholy', 'emotional', 'blue'],
+    'happy': ['happy', 'joy', 'cheerful', 'bright'],
+    'mysterious': ['mystery', 'dark', 'atmospheric', 'ambient']
+}
+
+TRACK_COLUMNS = ('id', 'source', 'external_id', 'title', 'artist', 'tags', 'preview_url', 'download_url',
+                 'file_path', 'duration', 'downloads', 'likes', 'genre', 'mood', 'quality_score')
+
+
+def normalize_tags(tags: str) -> List[str]:
+    """Distinct lowercase tags from a comma-separated string"""
+    return [tag for tag in dict.fromkeys(' '.join(part.split()).lower() for part in (tags or '').split(',')) if tag]
+
+
+def _first_match(tags: str, keywords: Dict[str, List[str]], default: str) -> str:
+    tags_lower = (tags or '').lower()
+    for name, words in keywords.items():
+        if any(word in tags_lower for word in words):
+            return name
+    return default
+
+
+def extract_genre(tags: str) -> str:
+    return _first_match(tags, GENRE_KEYWORDS, 'unknown')
+
+
+def extract_mood(tags: str) -> str:
+    return _first_match(tags, MOOD_KEYWORDS, 'neutral')
+
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def quality_score(downloads, likes, duration) -> int:
+    """Downloads, likes counted double, and a little credit for length"""
+    return int(_number(downloads) * 1.0 + _number(likes) * 2.0 + _number(duration) * 0.1)
+
+
+def write_tags(conn: sqlite3.Connection, tracks: Iterable[Tuple[int, str, int]]):
+    """Replace the index entries of (track_id, tags, quality_score) tracks"""
+    tracks = list(tracks)
+    conn.executemany('DELETE FROM track_tags WHERE track_id = ?', [(track_id,) for track_id, _, _ in tracks])
+    conn.executemany('INSERT OR IGNORE INTO track_tags (tag, track_id, quality_score) VALUES (?, ?, ?)', [
+        (tag, track_id, quality) for track_id, tags, quality in tracks for tag in normalize_tags(tags)
+    ])
+
+
+def top_tracks(conn: sqlite3.Connection, genre: str = None, mood: str = None, tag: str = None,
+               limit: int = 20) -> List[Dict]:
+    """Best-quality tracks with every given filter, walking the matching index in quality order"""
+    columns = ', '.join('t.' + c for c in TRACK_COLUMNS)
+    filters, params = '', []
+    if genre:
+        filters += ' AND t.genre = ?'
+        params.append(genre)
+    if mood:
+        filters += ' AND t.mood = ?'
+        params.append(mood)
+
+    if tag:
+        rows = conn.execute(f'''
+            SELECT {columns} FROM track_tags g JOIN music_tracks t ON t.id = g.track_id
+            WHERE g.tag = ?{filters}
+            ORDER BY g.quality_score DESC
+            LIMIT ?
+        ''', [' '.join(tag.split()).lower(), *params, limit])
+    else:
+        rows = conn.execute(f'''
+            SELECT {columns} FROM music_tracks t
+            WHERE t.quality_score IS NOT NULL{filters}
+            ORDER BY t.quality_score DESC
+            LIMIT ?
+        ''', [*params, limit])
+    return [dict(zip(TRACK_COLUMNS, row)) for row in rows]
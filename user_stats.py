@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Per-user quote statistics for Heckx AI
+One summary row per user, kept in step with the conversations table so
+/api/stats is a single primary-key lookup.
+
+Usage:
+    python user_stats.py rebuild   # recompute every row from conversations
+    python user_stats.py check     # compare summary rows with conversations
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import db
+
+
+def create_table(conn: sqlite3.Connection):
+    """Create the summary table inside the caller's transaction"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id TEXT PRIMARY KEY,
+            total_quotes INTEGER NOT NULL DEFAULT 0,
+            category_counts TEXT NOT NULL DEFAULT '{}',
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rating_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def load(conn: sqlite3.Connection, user_id: str) -> Dict:
+    """Raw summary row for one user (zeros when missing)"""
+    row = conn.execute('''
+        SELECT total_quotes, category_counts, rating_sum, rating_count
+        FROM user_stats WHERE user_id = ?
+    ''', (user_id,)).fetchone()
+
+    if not row:
+        return {'total_quotes': 0, 'category_counts': {}, 'rating_sum': 0, 'rating_count': 0}
+    return {
+        'total_quotes': row[0],
+        'category_counts': json.loads(row[1]),
+        'rating_sum': row[2],
+        'rating_count': row[3]
+    }
+
+
+def _store(conn: sqlite3.Connection, user_id: str, stats: Dict):
+    conn.execute('''
+        INSERT INTO user_stats (user_id, total_quotes, category_counts, rating_sum, rating_count)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            total_quotes = excluded.total_quotes,
+            category_counts = excluded.category_counts,
+            rating_sum = excluded.rating_sum,
+            rating_count = excluded.rating_count
+    ''', (user_id, stats['total_quotes'], json.dumps(stats['category_counts'], sort_keys=True),
+          stats['rating_sum'], stats['rating_count']))
+
+
+def record_quotes(conn: sqlite3.Connection, user_id: str, categories: List[str]):
+    """Count newly inserted conversation rows (call inside the insert's transaction)"""
+    stats = load(conn, user_id)
+    counts = stats['category_counts']
+    for category in categories:
+        counts[category] = counts.get(category, 0) + 1
+    stats['total_quotes'] += len(categories)
+    _store(conn, user_id, stats)
+
+
+def record_quote(conn: sqlite3.Connection, user_id: str, category: str):
+    """Count one newly inserted conversation row"""
+    record_quotes(conn, user_id, [category])
+
+
+def record_ratings(conn: sqlite3.Connection, user_id: str,
+                   changes: List[Tuple[Optional[int], Optional[int]]]):
+    """Apply (old, new) rating changes on the user's rows (call inside the update's transaction)"""
+    stats = load(conn, user_id)
+    for old_rating, new_rating in changes:
+        if old_rating is not None:
+            stats['rating_sum'] -= old_rating
+            stats['rating_count'] -= 1
+        if new_rating is not None:
+            stats['rating_sum'] += new_rating
+            stats['rating_count'] += 1
+    _store(conn, user_id, stats)
+
+
+def record_rating(conn: sqlite3.Connection, user_id: str,
+                  old_rating: Optional[int], new_rating: Optional[int]):
+    """Apply a rating change on one row"""
+    record_ratings(conn, user_id, [(old_rating, new_rating)])
+
+
+def record_deletions(conn: sqlite3.Connection, rows: List[Tuple[str, str, Optional[int]]]):
+    """Subtract deleted (user_id, category, rating) rows (call inside the delete's transaction)"""
+    by_user: Dict[str, List[Tuple[str, Optional[int]]]] = {}
+    for user_id, category, rating in rows:
+        by_user.setdefault(user_id, []).append((category, rating))
+
+    for user_id, deleted in by_user.items():
+        stats = load(conn, user_id)
+        counts = stats['category_counts']
+        for category, rating in deleted:
+            counts[category] = counts.get(category, 0) - 1
+            if rating is not None:
+                stats['rating_sum'] -= rating
+                stats['rating_count'] -= 1
+        stats['total_quotes'] -= len(deleted)
+        if stats['total_quotes'] <= 0 and not stats['rating_count']:
+            reset(conn, user_id)
+        else:
+            _store(conn, user_id, stats)
+
+
+def reset(conn: sqlite3.Connection, user_id: str):
+    """Drop a user's summary after all of their rows were deleted"""
+    conn.execute('DELETE FROM user_stats WHERE user_id = ?', (user_id,))
+
+
+def summarize(stats: Dict, pending_categories: List[str] = ()) -> Dict:
+    """Shape a summary row the way /api/stats reports it, counting uncommitted rows too"""
+    counts = {category: n for category, n in stats['category_counts'].items() if n > 0}
+    for category in pending_categories:
+        counts[category] = counts.get(category, 0) + 1
+    favorite_category = max(counts, key=counts.get) if counts else 'None'
+    avg_rating = stats['rating_sum'] / stats['rating_count'] if stats['rating_count'] else 0
+
+    return {
+        'total_quotes': stats['total_quotes'] + len(pending_categories),
+        'total_conversations': len(counts),
+        'favorite_category': favorite_category,
+        'avg_rating': round(avg_rating, 1)
+    }
+
+
+def get_stats(conn: sqlite3.Connection, user_id: str) -> Dict:
+    """Statistics for one user via a primary-key lookup"""
+    return summarize(load(conn, user_id))
+
+
+def _compute_from_conversations(conn: sqlite3.Connection) -> Dict[str, Dict]:
+    """Aggregate the raw conversations table into summary rows"""
+    computed = {}
+    rows = conn.execute('''
+        SELECT c.user_id, q.category, COUNT(*), COALESCE(SUM(c.rating), 0), COUNT(c.rating)
+        FROM conversations c
+        JOIN quotes q ON q.id = c.quote_id
+        GROUP BY c.user_id, q.category
+    ''')
+    for user_id, category, total, rating_sum, rating_count in rows:
+        stats = computed.setdefault(user_id, {
+            'total_quotes': 0, 'category_counts': {}, 'rating_sum': 0, 'rating_count': 0
+        })
+        stats['total_quotes'] += total
+        stats['category_counts'][category] = total
+        stats['rating_sum'] += rating_sum
+        stats['rating_count'] += rating_count
+    return computed
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Recompute every summary row from conversations (call inside a transaction)"""
+    computed = _compute_from_conversations(conn)
+    conn.execute('DELETE FROM user_stats')
+    for user_id, stats in computed.items():
+        _store(conn, user_id, stats)
+    return len(computed)
+
+
+def check(conn: sqlite3.Connection) -> List[str]:
+    """List users whose summary row disagrees with the conversations table"""
+    computed = _compute_from_conversations(conn)
+    stored = {row[0]: load(conn, row[0]) for row in conn.execute('SELECT user_id FROM user_stats').fetchall()}
+
+    problems = []
+    for user_id in sorted(set(computed) | set(stored), key=str):
+        expected = computed.get(user_id)
+        actual = stored.get(user_id)
+        if expected is None:
+            if actual['total_quotes'] or actual['rating_count']:
+                problems.append(f"{user_id}: summary row without conversations")
+            continue
+        if actual is None:
+            problems.append(f"{user_id}: missing summary row")
+            continue
+
+        actual_counts = {k: v for k, v in actual['category_counts'].items() if v}
+        for field in ('total_quotes', 'rating_sum', 'rating_count'):
+            if expected[field] != actual[field]:
+                problems.append(f"{user_id}: {field} expected {expected[field]}, found {actual[field]}")
+        if expected['category_counts'] != actual_counts:
+            problems.append(f"{user_id}: category_counts expected {expected['category_counts']}, found {actual_counts}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the user_stats summary table')
+    parser.add_argument('command', choices=['rebuild', 'check'])
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        with db.transaction() as conn:
+            create_table(conn)
+            users = rebuild(conn)
+        print(f"✅ Rebuilt statistics for {users} users")
+        return 0
+
+    with db.transaction(mode='DEFERRED') as conn:
+        problems = check(conn)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        return 1
+    print("✅ user_stats is consistent with conversations")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Write-behind buffer for quote history inserts
+Requests enqueue rows; a background writer group-commits them in batches.
+Row ids are handed out up front from blocks reserved in sqlite_sequence, so
+/api/quote can return the id /api/rate will later update. Ids from different
+workers' blocks don't follow commit order, so created_at is stamped when the
+batch commits, under the write lock: it never goes backwards across workers,
+which is what /api/history?since= relies on.
+
+A batch that keeps failing is retried MAX_FLUSH_ATTEMPTS times, then its
+rows are written one by one and any row that still fails is dropped, so one
+bad row can't hold back every row queued after it.
+
+Enable with HECKX_WRITE_BEHIND=1. Tuning:
+    HECKX_WRITE_BEHIND_FLUSH_MS     max time a row waits before commit (default 50)
+    HECKX_WRITE_BEHIND_BATCH        max rows per transaction (default 200)
+    HECKX_WRITE_BEHIND_MAX_PENDING  queue bound before callers block (default 10000)
+    HECKX_WRITE_BEHIND_PUT_TIMEOUT  seconds a caller may block on a full queue (default 2)
+    HECKX_WRITE_BEHIND_ID_BLOCK     conversation ids reserved per block (default 100)
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import background
+import db
+import user_stats
+
+
+MAX_FLUSH_ATTEMPTS = 10
+
+
+class WriteBufferFull(Exception):
+    """Raised when the queue stayed full for the whole put timeout"""
+
+
+class ConversationIdAllocator:
+    """Hi/lo allocator for conversations.id.
+
+    Each block is reserved by advancing the table's AUTOINCREMENT counter,
+    which SQLite never hands out again, so blocks are unique across workers
+    and never collide with ids assigned by plain inserts. Ids left unused
+    when a worker exits are simply skipped.
+    """
+
+    def __init__(self, block_size: int = 100):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._high = -1
+        self._pid = None
+
+    def _reserve_block(self):
+        with db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM sqlite_sequence WHERE name = 'conversations'").fetchone() is None:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('conversations', 0)")
+            conn.execute('''
+                UPDATE sqlite_sequence
+                SET seq = MAX(seq, (SELECT COALESCE(MAX(id), 0) FROM conversations)) + ?
+                WHERE name = 'conversations'
+            ''', (self.block_size,))
+            high = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'conversations'").fetchone()[0]
+        self._next = high - self.block_size + 1
+        self._high = high
+
+    def allocate(self) -> int:
+        with self._lock:
+            if self._pid != os.getpid() or self._next > self._high:
+                # A forked worker must not share its parent's block
+                self._reserve_block()
+                self._pid = os.getpid()
+            conversation_id = self._next
+            self._next += 1
+            return conversation_id
+
+
+class QuoteWriteBuffer:
+    def __init__(self, flush_interval_ms: int = 50, batch_size: int = 200,
+                 max_pending: int = 10000, put_timeout: float = 2.0,
+                 id_block_size: int = 100):
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.ids = ConversationIdAllocator(id_block_size)
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Dict]] = {}
+        # Even while idle, odd while a batch is committing (see read_with_pending)
+        self._commit_seq = 0
+        self._thread = background.lazy_thread(self._run, 'quote-writer')
+
+    def _ensure_started(self):
+        self._thread.get()
+
+    def submit(self, user_id: str, quote_id: int, message: str, category: str) -> Dict:
+        """Queue one conversation row, blocking up to put_timeout when full.
+
+        message and category are only kept for read-your-writes merging;
+        the stored row references the quote by id.
+        """
+        self._ensure_started()
+        created_at = int(time.time())  # provisional, for the pending view; the row gets its commit time
+        entry = {
+            'id': self.ids.allocate(),
+            'user_id': user_id,
+            'quote_id': quote_id,
+            'message': message,
+            'category': category,
+            'created_at': created_at,
+            # Same format /api/history renders committed rows in
+            'timestamp': datetime.fromtimestamp(created_at, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+        with self._lock:
+            self._pending.setdefault(user_id, []).append(entry)
+        try:
+            self._queue.put(entry, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._forget([entry])
+            raise WriteBufferFull('Quote history queue is full, try again shortly')
+        return entry
+
+    def read_with_pending(self, user_id: str, read_db: Callable[[], object]) -> Tuple[List[Dict], object]:
+        """Run `read_db` and snapshot the user's uncommitted rows consistently.
+
+        A batch that commits between the two reads would otherwise be seen
+        twice (or not at all), so retry until no commit overlapped.
+        """
+        while True:
+            with self._lock:
+                seq = self._commit_seq
+                pending = list(self._pending.get(user_id, ()))
+            if seq % 2 == 0:
+                result = read_db()
+                with self._lock:
+                    if self._commit_seq == seq:
+                        return pending, result
+            time.sleep(0.001)
+
+    def has_pending(self, user_id: str) -> bool:
+        """Whether any of the user's rows are still uncommitted"""
+        with self._lock:
+            return user_id in self._pending
+
+    def queue_stats(self) -> Dict:
+        """Rows waiting for the writer and the queue bound"""
+        return {'queued': self._queue.qsize(), 'max_pending': self._queue.maxsize}
+
+    def flush(self):
+        """Block until every queued row is committed"""
+        if self._thread.started():
+            self._queue.join()
+
+    def stop(self):
+        """Flush on shutdown"""
+        self.flush()
+
+    def _forget(self, entries: List[Dict]):
+        for entry in entries:
+            rows = self._pending.get(entry['user_id'])
+            if rows is None:
+                continue
+            rows.remove(entry)
+            if not rows:
+                del self._pending[entry['user_id']]
+
+    def _next_batch(self) -> List[Dict]:
+        """Wait for a first row, then gather up to batch_size within flush_interval"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict]):
+        with db.transaction() as conn:
+            created_at = int(time.time())  # taken holding the write lock, so it follows commit order
+            conn.executemany('''
+                INSERT INTO conversations (id, user_id, quote_id, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', [(e['id'], e['user_id'], e['quote_id'], created_at) for e in batch])
+
+            by_user: Dict[str, List[str]] = {}
+            for entry in batch:
+                by_user.setdefault(entry['user_id'], []).append(entry['category'])
+            for user_id, categories in by_user.items():
+                user_stats.record_quotes(conn, user_id, categories)
+
+            # Readers must not trust pending rows once COMMIT starts
+            with self._lock:
+                self._commit_seq += 1
+
+    def _commit(self, batch: List[Dict], attempts: int) -> bool:
+        for attempt in range(1, attempts + 1):
+            try:
+                self._write(batch)
+            except Exception as e:
+                with self._lock:
+                    if self._commit_seq % 2:
+                        self._commit_seq += 1  # rolled back, pending rows still valid
+                print(f"❌ Quote history flush failed (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    time.sleep(min(0.1 * attempt, 2.0))
+            else:
+                # Drop the rows from the pending view in the same step readers check
+                with self._lock:
+                    self._forget(batch)
+                    self._commit_seq += 1
+                return True
+        return False
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not self._commit(batch, MAX_FLUSH_ATTEMPTS):
+                # Most likely one bad row: write the rest one by one and drop what still fails
+                for entry in batch:
+                    if not self._commit([entry], 1):
+                        with self._lock:
+                            self._forget([entry])
+                        print(f"❌ Dropped quote history row {entry['id']} of user {entry['user_id']}")
+            for _ in batch:
+                self._queue.task_done()
+
+
+def create_buffer_from_env() -> Optional[QuoteWriteBuffer]:
+    """Build the buffer when HECKX_WRITE_BEHIND is on, registering the shutdown flush"""
+    if os.environ.get('HECKX_WRITE_BEHIND', '0').lower() not in ('1', 'true', 'yes'):
+        return None
+
+    buffer = QuoteWriteBuffer(
+        flush_interval_ms=int(os.environ.get('HECKX_WRITE_BEHIND_FLUSH_MS', 50)),
+        batch_size=int(os.environ.get('HECKX_WRITE_BEHIND_BATCH', 200)),
+        max_pending=int(os.environ.get('HECKX_WRITE_BEHIND_MAX_PENDING', 10000)),
+        put_timeout=float(os.environ.get('HECKX_WRITE_BEHIND_PUT_TIMEOUT', 2)),
+        id_block_size=int(os.environ.get('HECKX_WRITE_BEHIND_ID_BLOCK', 100))
+    )
+    atexit.register(buffer.stop)
+    return buffer